@@ -0,0 +1,87 @@
+"""
+Benchmark del backend de agregaciones: pandas groupby contra DuckDB embebido
+sobre las mismas consultas que hacen las secciones.
+
+Uso (desde la raíz del repo, requiere duckdb instalado):
+    python -m benchmarks.bench_backend_agregaciones --filas 1000000 5000000 10000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import backend_utils
+from utils.backend_utils import sumar_pandas, sumar_duckdb
+
+# Consultas de las secciones (llaves de groupby sobre el dataset de compras)
+CONSULTAS = [
+    ["division"],
+    ["mes_nombre", "sucursal"],
+    ["sucursal", "mes_nombre", "division"],
+    ["codigo_normalizado", "sucursal", "abreviatura"],
+    ["mes_nombre", "cuenta_sucursal", "sucursal", "division"],
+]
+
+
+def generar_dataset(filas, semilla=0):
+    """Dataset sintético con las columnas del dataset preparado (etiquetas compartidas, como la vista)."""
+    with open("config_colores.json", encoding="utf-8") as f:
+        config = json.load(f)
+    rng = np.random.default_rng(semilla)
+    sucursales = np.array(list(config["sucursales"]), dtype=object)
+    codigos, divisiones, abreviaturas = [], [], []
+    for division, datos in config["divisiones"].items():
+        for cod in datos["codigos"]:
+            codigos.append(cod)
+            divisiones.append(division)
+            abreviaturas.append(datos["abreviatura"])
+    codigos, divisiones, abreviaturas = (np.array(x, dtype=object) for x in (codigos, divisiones, abreviaturas))
+    meses = np.array([f"Mes {i}" for i in range(84)], dtype=object)
+
+    i_suc = rng.integers(len(sucursales), size=filas)
+    i_cod = rng.integers(len(codigos), size=filas)
+    cuentas = np.array([f"{c} ({a}) - {s}" for c, a in zip(codigos, abreviaturas) for s in sucursales], dtype=object)
+    return pd.DataFrame({
+        "sucursal": sucursales[i_suc],
+        "codigo_normalizado": codigos[i_cod],
+        "division": divisiones[i_cod],
+        "abreviatura": abreviaturas[i_cod],
+        "cuenta_sucursal": cuentas[i_cod * len(sucursales) + i_suc],
+        "mes_nombre": meses[rng.integers(len(meses), size=filas)],
+        "monto": rng.integers(100, 10_000_000, size=filas) / 100,
+    })
+
+
+def cronometrar(funcion, repeticiones):
+    funcion()  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000_000, 5_000_000, 10_000_000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    if backend_utils.duckdb is None:
+        raise SystemExit("duckdb no está instalado (pip install duckdb)")
+
+    for filas in args.filas:
+        df = generar_dataset(filas)
+        print(f"\nFilas: {filas:,}")
+        print(f"  {'llaves':58}{'pandas':>10}{'duckdb':>10}{'x':>7}")
+        for llaves in CONSULTAS:
+            t_pandas, r_pandas = cronometrar(lambda: sumar_pandas(df, llaves), args.repeticiones)
+            t_duckdb, r_duckdb = cronometrar(lambda: sumar_duckdb(df, llaves), args.repeticiones)
+            pd.testing.assert_series_equal(r_pandas, r_duckdb, check_exact=False)
+            print(f"  {', '.join(llaves):58}{t_pandas * 1000:8.0f}ms{t_duckdb * 1000:8.0f}ms{t_pandas / t_duckdb:6.1f}x")
+        del df
+
+
+if __name__ == "__main__":
+    main()
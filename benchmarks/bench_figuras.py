@@ -0,0 +1,144 @@
+"""
+Benchmark de construcción de figuras: graph_objects / plotly express (validación por
+atributo) contra las figuras rápidas de utils.charts_utils (dicts sin validación).
+Mide lo que paga cada rerun: armar la figura y serializarla como lo hace st.plotly_chart.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_figuras --figuras 12 50 --categorias 16 60
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from utils.charts_utils import grafica_barras, grafica_sunburst
+
+HOVER_BARRAS = (
+    "<b>Sucursal:</b> %{customdata[0]}<br>"
+    "<b>Monto:</b> $%{customdata[1]:,.2f}<br>"
+    "<b>Porcentaje:</b> %{customdata[2]:.1f}%<extra></extra>"
+)
+
+
+def generar_barras(categorias, semilla=0):
+    """Montos de un mes por sucursal, con texto y colores (lo que recibe cada gráfica mensual)."""
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        "sucursal": [f"Sucursal {i:03d}" for i in range(categorias)],
+        "monto": rng.integers(100, 10_000_000, size=categorias) / 100,
+    })
+    df["porcentaje"] = df["monto"] / df["monto"].sum() * 100
+    df["texto"] = "$" + df["monto"].map("{:,.2f}".format) + "<br>(" + df["porcentaje"].map("{:.1f}".format) + "%)"
+    colores = {s: f"#{rng.integers(0, 0xFFFFFF):06x}" for s in df["sucursal"]}
+    return df, colores
+
+
+def generar_nodos(categorias, cuentas_por_sucursal=8, semilla=0):
+    """Nodos de un sunburst sucursal -> cuenta como los arma estado_cuenta_utils."""
+    rng = np.random.default_rng(semilla)
+    sucursales = [f"Sucursal {i:03d}" for i in range(categorias)]
+    montos = rng.integers(100, 10_000_000, size=(categorias, cuentas_por_sucursal)) / 100
+    ids, parents, values, labels = [], [], [], []
+    for i, suc in enumerate(sucursales):
+        ids.append(f"S|{suc}")
+        parents.append("")
+        values.append(montos[i].sum())
+        labels.append(suc)
+        for j in range(cuentas_por_sucursal):
+            ids.append(f"A|{suc}|{j}")
+            parents.append(f"S|{suc}")
+            values.append(montos[i, j])
+            labels.append(f"{j} - {suc}")
+    n = len(ids)
+    return {
+        "ids": ids, "parents": parents, "values": values, "labels": labels,
+        "colors": ["#808080"] * n, "text": [f"${v:,.2f}" for v in values], "hovertext": labels,
+    }
+
+
+# ---------- constructores actuales ----------
+def barras_px(df, colores):
+    fig = px.bar(
+        df, x="sucursal", y="monto", title="Compras en Enero 2025",
+        labels={"monto": "Total Comprado", "sucursal": "Sucursal"},
+        color="sucursal", color_discrete_map=colores, text="texto",
+        custom_data=["sucursal", "monto", "porcentaje"]
+    )
+    fig.update_traces(textposition="inside", texttemplate="%{text}", hovertemplate=HOVER_BARRAS)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def sunburst_go(nodos):
+    fig = go.Figure(go.Sunburst(
+        ids=nodos["ids"], parents=nodos["parents"], values=nodos["values"], labels=nodos["labels"],
+        text=nodos["text"], textinfo="label+text", insidetextorientation="horizontal",
+        marker=dict(colors=nodos["colors"], line=dict(color="white", width=1)),
+        branchvalues="total", hovertext=nodos["hovertext"], hovertemplate="%{hovertext}<extra></extra>"
+    ))
+    fig.update_layout(
+        title={"text": "Distribución por cuenta", "x": 0.5, "xanchor": "center", "yanchor": "top"},
+        title_font=dict(size=18, color="#E1E1EC", family="Arial"),
+        template="plotly_white", margin=dict(t=60, l=0, r=0, b=0)
+    )
+    return fig
+
+
+# ---------- constructores rápidos ----------
+def barras_rapidas(df, colores):
+    return grafica_barras(
+        df["sucursal"], df["monto"], df["sucursal"].map(colores), df["texto"], HOVER_BARRAS,
+        customdata=df[["sucursal", "monto", "porcentaje"]].to_numpy(dtype=object),
+        texto_titulo="Compras en Enero 2025", titulo_x="Sucursal", titulo_y="Total Comprado"
+    )
+
+
+def sunburst_rapido(nodos):
+    return grafica_sunburst(nodos, "Distribución por cuenta")
+
+
+def serializar(fig):
+    # Lo mismo que hace st.plotly_chart con una go.Figure
+    return pio.to_json(fig.to_dict(), validate=False)
+
+
+def cronometrar(funcion, figuras, repeticiones):
+    funcion()  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for _ in range(figuras):
+            tamaño = len(serializar(funcion()))
+    return (time.perf_counter() - inicio) / repeticiones, tamaño
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--figuras", type=int, nargs="+", default=[12, 50], help="figuras por página")
+    parser.add_argument("--categorias", type=int, nargs="+", default=[16, 60], help="sucursales por figura")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"  {'gráfica':10}{'figuras':>8}{'categ.':>8}{'actual':>11}{'rápida':>11}{'x':>7}{'JSON act.':>12}{'JSON ráp.':>12}")
+    for categorias in args.categorias:
+        df, colores = generar_barras(categorias)
+        nodos = generar_nodos(categorias)
+        casos = [
+            ("barras", lambda: barras_px(df, colores), lambda: barras_rapidas(df, colores)),
+            ("sunburst", lambda: sunburst_go(nodos), lambda: sunburst_rapido(nodos)),
+        ]
+        for figuras in args.figuras:
+            for nombre, actual, rapida in casos:
+                t_actual, b_actual = cronometrar(actual, figuras, args.repeticiones)
+                t_rapida, b_rapida = cronometrar(rapida, figuras, args.repeticiones)
+                print(
+                    f"  {nombre:10}{figuras:8d}{categorias:8d}{t_actual * 1000:9.0f}ms{t_rapida * 1000:9.0f}ms"
+                    f"{t_actual / t_rapida:6.1f}x{b_actual:12,d}{b_rapida:12,d}"
+                )
+
+
+if __name__ == "__main__":
+    main()
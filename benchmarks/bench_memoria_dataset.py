@@ -0,0 +1,107 @@
+"""
+Benchmark de memoria del dataset de compras.
+
+Compara la representación original (un string por fila en cada columna de texto,
+copiada por sesión con st.cache_data) contra la representación compacta
+(códigos int16/int32 + tablas de dimensión) compartida por el proceso.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_memoria_dataset --filas 500000 --sesiones 5
+"""
+import argparse
+import gc
+import json
+import pickle
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from utils.data_utils import preparar_dataset, compactar_dataset, expandir_dataset
+
+
+def generar_payload(filas, semilla=0):
+    """JSON sintético con la forma de /datos (al parsearlo cada fila trae sus propios strings)."""
+    with open("config_colores.json", encoding="utf-8") as f:
+        config = json.load(f)
+    rng = np.random.default_rng(semilla)
+    sucursales = np.array(list(config["sucursales"]))
+    codigos = np.array([c for d in config["divisiones"].values() for c in d["codigos"]])
+    meses = pd.date_range("2019-01-01", "2025-12-01", freq="MS").strftime("%Y-%m-%d").to_numpy()
+    datos = pd.DataFrame({
+        "sucursal": sucursales[rng.integers(len(sucursales), size=filas)],
+        "mes": meses[rng.integers(len(meses), size=filas)],
+        "monto": rng.integers(100, 10_000_000, size=filas) / 100,
+        "codigo_normalizado": codigos[rng.integers(len(codigos), size=filas)],
+        "ligado_sistema": rng.integers(2, size=filas),
+    })
+    return datos.to_json(orient="records"), config
+
+
+def memoria_retenida(construir):
+    """Bytes que quedan asignados (según tracemalloc) por el objeto que regresa construir()."""
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    objeto = construir()
+    gc.collect()
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return objeto, despues - antes
+
+
+def mb(n):
+    return f"{n / 2**20:10.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=500_000)
+    parser.add_argument("--sesiones", type=int, default=5)
+    args = parser.parse_args()
+
+    payload, config = generar_payload(args.filas)
+
+    def original():
+        return preparar_dataset(pd.DataFrame(json.loads(payload)), config)
+
+    def compacto():
+        return compactar_dataset(original())
+
+    df_original, mem_original = memoria_retenida(original)
+    datos_compactos, mem_compacto = memoria_retenida(compacto)
+    vista, mem_vista = memoria_retenida(lambda: expandir_dataset(datos_compactos))
+    pd.testing.assert_frame_equal(df_original, vista)
+
+    # Por sesión: st.cache_data regresa una copia (pickle) en cada acierto;
+    # con cache_resource cada sesión sólo toma una copia superficial de la vista.
+    _, mem_sesion_original = memoria_retenida(
+        lambda: [pickle.loads(pickle.dumps(df_original)) for _ in range(args.sesiones)]
+    )
+    _, mem_sesion_compacto = memoria_retenida(
+        lambda: [vista.copy(deep=False) for _ in range(args.sesiones)]
+    )
+
+    proceso_original = mem_original
+    proceso_compacto = mem_compacto + mem_vista
+    print(f"Filas: {args.filas:,}   sesiones: {args.sesiones}")
+    print(f"  hechos compactos: {datos_compactos['hechos'].dtypes.astype(str).to_dict()}")
+    print(f"  dimensiones: { {k: len(v) for k, v in datos_compactos['dimensiones'].items()} }")
+    print()
+    print(f"{'':32}{'original':>13}{'compacto':>13}{'reducción':>11}")
+    print(f"{'Por proceso (dataset)':32}{mb(proceso_original)}   {mb(proceso_compacto)}"
+          f"{1 - proceso_compacto / proceso_original:10.0%}")
+    print(f"{'   hechos + dimensiones':32}{'':13}   {mb(mem_compacto)}")
+    print(f"{'   vista decodificada':32}{'':13}   {mb(mem_vista)}")
+    por_sesion_original = mem_sesion_original / args.sesiones
+    por_sesion_compacto = mem_sesion_compacto / args.sesiones
+    print(f"{'Por sesión (copia por rerun)':32}{mb(por_sesion_original)}   {mb(por_sesion_compacto)}"
+          f"{1 - por_sesion_compacto / por_sesion_original:10.0%}")
+    total_original = proceso_original + mem_sesion_original
+    total_compacto = proceso_compacto + mem_sesion_compacto
+    print(f"{f'Total con {args.sesiones} sesiones':32}{mb(total_original)}   {mb(total_compacto)}"
+          f"{1 - total_compacto / total_original:10.0%}")
+
+
+if __name__ == "__main__":
+    main()
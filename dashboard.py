@@ -5,7 +5,9 @@ import streamlit_authenticator as stauth
 
 # ------------------- IMPORTS PROPIOS -------------------
 from utils.config import cargar_config
-from utils.api_utils import obtener_datos_api, mostrar_fecha_actualizacion
+from utils.api_utils import mostrar_fecha_actualizacion
+from utils.data_utils import cargar_dataset, filtrar_por_periodo, rango_fechas
+from utils.cache_utils import derivar_version
 from utils.helpers import meses_es
 
 # Configuración de la página
@@ -29,39 +31,10 @@ name, authentication_status, username = authenticator.login("Iniciar Sesión", "
 if authentication_status:
     st.session_state["user_name"] = name
     config = cargar_config()
-    df = obtener_datos_api()
-
-    if not df.empty:
-        df = df.dropna(subset=["sucursal"])
-        df["mes_dt"] = pd.to_datetime(df["mes"])
-        df["mes_nombre"] = df["mes_dt"].dt.month_name().map(meses_es) + " " + df["mes_dt"].dt.year.astype(str)
-        df["mes_period"] = df["mes_dt"].dt.to_period("M")
-        df = df.sort_values("mes_dt")
-
-        # ------------------- DIVISIONES Y COLORES -------------------
-        divisiones = config["divisiones"]
-        mapa_codigos = {}
-        colores_divisiones = {}
-        codigo_division_map = {}
-        for division, datos in divisiones.items():
-            colores_divisiones[division] = datos["color"]
-            for cod in datos["codigos"]:
-                mapa_codigos[cod] = division
-                codigo_division_map[cod] = {
-                    "color": datos["color"],
-                    "abreviatura": datos["abreviatura"],
-                    "division": division
-                }
-
-        df["division"] = df["codigo_normalizado"].map(mapa_codigos)
-        df_divisiones = df.dropna(subset=["division"]).copy()
-        df_divisiones["mes_dt"] = pd.to_datetime(df_divisiones["mes"])
-        df_divisiones["mes_nombre"] = (
-            df_divisiones["mes_dt"].dt.month_name().map(meses_es)
-            + " "
-            + df_divisiones["mes_dt"].dt.year.astype(str)
-        )
-        colores_sucursales_map = {suc: data["color"] for suc, data in config["sucursales"].items()}
+    # Dataset compartido (solo lectura); cada vista recibe una copia superficial Copy-on-Write
+    # (la copia se marca con la misma versión para que sigan valiendo los caches)
+    dataset = cargar_dataset()
+    df = derivar_version(dataset.copy(deep=False), dataset)
 
     # ------------------- SIDEBAR -------------------
     with st.sidebar:
@@ -79,21 +52,19 @@ if authentication_status:
         st.markdown("---")
 
         # ------------------- MÉTRICAS DE TOTALES -------------------
-        if "fecha" not in df.columns:
-            df["fecha"] = pd.to_datetime(df["mes"])
-
         ahora = datetime.now()
         ahora_pd = pd.Timestamp(ahora)
         mes_actual_period = ahora_pd.to_period("M")
         mes_actual_esp = meses_es.get(ahora.strftime("%B"), "") + " " + str(ahora.year)
 
-        df_natural = df[df["fecha"].dt.year == 2025]
+        # Rangos por búsqueda binaria sobre el índice de meses (slices sin copia, cacheados)
+        df_natural, _ = filtrar_por_periodo(df, "Año Natural", 2025)
         total_anual_natural = df_natural["monto"].sum()
-        total_mes_actual = df_natural[df_natural["mes_period"] == mes_actual_period]["monto"].sum()
+        total_mes_actual = rango_fechas(
+            df_natural, mes_actual_period.start_time, (mes_actual_period + 1).start_time
+        )["monto"].sum()
 
-        inicio_fiscal = pd.Timestamp(2024, 11, 1)
-        fin_fiscal = pd.Timestamp(2025, 10, 31)
-        df_fiscal = df[(df["fecha"] >= inicio_fiscal) & (df["fecha"] <= fin_fiscal)]
+        df_fiscal, _ = filtrar_por_periodo(df, "Año Fiscal", 2025)
         total_anual_fiscal = df_fiscal["monto"].sum()
 
         st.markdown(f"""
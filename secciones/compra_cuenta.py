@@ -1,13 +1,13 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
 import json
 import itertools
-import io
+from functools import partial
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode, ColumnsAutoSizeMode, AgGridTheme
-from utils.api_utils import obtener_datos_api
-from utils.helpers import meses_es
+from utils.data_utils import filtrar_por_periodo, obtener_años_disponibles
+from utils.excel_utils import boton_excel, libro_excel, clave_excel
+from utils.charts_utils import figura, traza, titulo, clave_figura, figura_cacheada
 
 def mostrar(df_filtrado, config):
     st.title("Compra por Cuenta")
@@ -37,19 +37,7 @@ def mostrar(df_filtrado, config):
                 "division": division
             }
 
-    # Asignar división
-    df_filtrado["division"] = df_filtrado["codigo_normalizado"].map(mapa_codigos)
-
-    # Filtrar válidos
-    df_divisiones = df_filtrado.dropna(subset=["division"]).copy()
-
-    # Agregar columnas de fecha/mes
-    df_divisiones["mes_dt"] = pd.to_datetime(df_divisiones["mes"])
-    df_divisiones["mes_nombre"] = (
-        df_divisiones["mes_dt"].dt.month_name().map(meses_es)
-        + " "
-        + df_divisiones["mes_dt"].dt.year.astype(str)
-    )
+    # division, abreviatura, cuenta_sucursal y columnas de mes ya vienen del dataset compartido
 
     # Diccionario plano solo con colores por sucursal
     colores_sucursales_map = {
@@ -61,84 +49,81 @@ def mostrar(df_filtrado, config):
     periodo = st.radio("Selecciona periodo", opciones_periodo, horizontal=True)
 
     # Detectar años disponibles
-    df_filtrado["fecha"] = pd.to_datetime(df_filtrado["mes"])  # asegúrate de tener columna 'mes' en formato fecha
-    años_disponibles = sorted(df_filtrado["fecha"].dt.year.unique())
+    años_disponibles = obtener_años_disponibles(df_filtrado)
     año_seleccionado = st.selectbox("Selecciona el año", años_disponibles, index=len(años_disponibles)-1)
 
-    # Filtrar por periodo
-    if periodo == "Año Natural":
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.year == año_seleccionado]
-        titulo_periodo = f"{año_seleccionado}"
-
-    elif periodo == "Año Fiscal":
-        # Año fiscal: 1 nov (año_seleccionado-1) -> 31 oct (año_seleccionado)
-        inicio_fiscal = pd.Timestamp(año_seleccionado-1, 11, 1)
-        fin_fiscal = pd.Timestamp(año_seleccionado, 10, 31)
-        df_filtrado = df_filtrado[(df_filtrado["fecha"] >= inicio_fiscal) & (df_filtrado["fecha"] <= fin_fiscal)]
-        titulo_periodo = f"Fiscal {año_seleccionado}"
+    # Filtrar por periodo (cacheado por versión de datos, sin hashear el DataFrame)
+    df_filtrado, titulo_periodo = filtrar_por_periodo(df_filtrado, periodo, año_seleccionado)
     st.markdown("<br><br>", unsafe_allow_html=True)
     # Usar df_filtrado en lugar del df original
     df_divisiones_filtrado = df_filtrado.dropna(subset=["division"])
 
+    # Figuras cacheadas por (sección, gráfica, periodo, año, selecciones, versión de datos del periodo)
+    df_periodo = df_filtrado
+
+    def clave(grafica, *selecciones):
+        return clave_figura("compra_cuenta", grafica, df_periodo, periodo, año_seleccionado, *selecciones)
+
     #-------------------------------------- GRAFICO DE BARRAS HORIZONTAL ----------------------------------------------------------------
     
-    # 1️⃣ Agregar división antes de agrupar
-    df_filtrado["division"] = df_filtrado["codigo_normalizado"].map(mapa_codigos)
-
-    # 2️⃣ Agrupar por cuenta y sucursal
-    df_cta = df_filtrado.groupby(
-        ["codigo_normalizado", "sucursal", "division"],
-        as_index=False
-    )["monto"].sum()
-
-    # Crear etiqueta tipo "1234 - Monterrey"
-    df_cta["cuenta_sucursal"] = df_cta["codigo_normalizado"] + " - " + df_cta["sucursal"]
-
-    # Ordenar de mayor a menor
-    df_cta = df_cta.sort_values("monto", ascending=False)
-
-    # ✅ Columna de texto formateada
-    df_cta["monto_fmt"] = df_cta["monto"].apply(lambda x: f"${x:,.2f}")
-
-    # Gráfico de barras usando la columna formateada
-    fig = px.bar(
-        df_cta,
-        x="monto",
-        y="cuenta_sucursal",
-        color="division",
-        color_discrete_map=colores_divisiones,
-        orientation="h",
-        labels={
-            "monto": "Monto",
-            "cuenta_sucursal": "Cuenta - Sucursal",
-            "division": "División"
-        },
-        text="monto_fmt",          # ⚡ texto formateado afuera
-        hover_data={"monto_fmt": True, "monto": False}  # ⚡ hover con formato
-    )
+    def construir_barras_cuentas():
+        # Agrupar por cuenta y sucursal
+        df_cta = df_filtrado.groupby(
+            ["codigo_normalizado", "sucursal", "division"],
+            as_index=False
+        )["monto"].sum()
+
+        # Crear etiqueta tipo "1234 - Monterrey"
+        df_cta["cuenta_sucursal"] = df_cta["codigo_normalizado"] + " - " + df_cta["sucursal"]
+
+        # Ordenar de mayor a menor
+        df_cta = df_cta.sort_values("monto", ascending=False)
+
+        # ✅ Columna de texto formateada
+        df_cta["monto_fmt"] = df_cta["monto"].apply(lambda x: f"${x:,.2f}")
+
+        # Gráfico de barras usando la columna formateada
+        fig = px.bar(
+            df_cta,
+            x="monto",
+            y="cuenta_sucursal",
+            color="division",
+            color_discrete_map=colores_divisiones,
+            orientation="h",
+            labels={
+                "monto": "Monto",
+                "cuenta_sucursal": "Cuenta - Sucursal",
+                "division": "División"
+            },
+            text="monto_fmt",          # ⚡ texto formateado afuera
+            hover_data={"monto_fmt": True, "monto": False}  # ⚡ hover con formato
+        )
 
-    # Ajustar trazas
-    fig.update_traces(
-        textposition="outside",
-        cliponaxis=False
-    )
+        # Ajustar trazas
+        fig.update_traces(
+            textposition="outside",
+            cliponaxis=False
+        )
 
-    # Layout
-    fig.update_layout(
-        xaxis_title="Monto (MXN)",
-        yaxis_title="Cuenta - Sucursal",
-        margin=dict(r=70),
-        template="plotly_dark",
-        yaxis={'categoryorder': 'total ascending'},
-        height=800,
-        legend=dict(
-            orientation="h",
-            yanchor="top",
-            y=-0.15,
-            xanchor="center",
-            x=0.5
+        # Layout
+        fig.update_layout(
+            xaxis_title="Monto (MXN)",
+            yaxis_title="Cuenta - Sucursal",
+            margin=dict(r=70),
+            template="plotly_dark",
+            yaxis={'categoryorder': 'total ascending'},
+            height=800,
+            legend=dict(
+                orientation="h",
+                yanchor="top",
+                y=-0.15,
+                xanchor="center",
+                x=0.5
+            )
         )
-    )
+        return fig
+
+    fig = figura_cacheada(clave("barras_cuentas"), construir_barras_cuentas)
 
     st.markdown("### Monto Total Anual por Cuenta")
     st.markdown("<div style='margin-top:-30px'></div>", unsafe_allow_html=True)
@@ -149,32 +134,17 @@ def mostrar(df_filtrado, config):
     st.title(f"Compra mensual por Cuenta ({titulo_periodo})")
     st.markdown("<div style='margin-top:-5px'></div>", unsafe_allow_html=True)
 
-    # --- Función para obtener abreviatura ---
-    def obtener_abreviatura(codigo):
-        for division, info in divisiones.items():
-            if codigo in info["codigos"]:
-                return info["abreviatura"]
-        return ""
-
-    if "mes_dt" not in df_filtrado.columns:
-        df_filtrado["mes_dt"] = pd.to_datetime(df_filtrado["mes"])
-
-    # Preparar tabla
-    df_filtrado["abreviatura"] = df_filtrado["codigo_normalizado"].apply(obtener_abreviatura)
-    df_filtrado["cuenta_sucursal"] = df_filtrado["codigo_normalizado"] + " (" + df_filtrado["abreviatura"] + ") - " + df_filtrado["sucursal"]
-
-    df_filtrado["mes_anio"] = df_filtrado["mes_dt"].dt.month_name().map(meses_es) + " " + df_filtrado["mes_dt"].dt.year.astype(str)
-    df_filtrado["orden_mes"] = df_filtrado["mes_dt"].dt.to_period("M")
-
+    # Preparar tabla (cuenta_sucursal y mes_nombre vienen del dataset compartido)
     tabla_compras = df_filtrado.pivot_table(
         index="cuenta_sucursal",
-        columns="mes_anio",
+        columns="mes_nombre",
         values="monto",
         aggfunc="sum",
         fill_value=0
     )
+    tabla_compras.columns.name = "mes_anio"
 
-    orden_columnas = df_filtrado.drop_duplicates("mes_anio").sort_values("orden_mes")["mes_anio"].tolist()
+    orden_columnas = df_filtrado.drop_duplicates("mes_nombre").sort_values("mes_period")["mes_nombre"].tolist()
     tabla_compras = tabla_compras[orden_columnas]
 
     # Agregar totales
@@ -392,52 +362,23 @@ def mostrar(df_filtrado, config):
         enable_enterprise_modules=False
     )
 
-    # --- Descargar Excel ---
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        tabla_compras.to_excel(writer, sheet_name='Compras')
-    processed_data = output.getvalue()
-
-    st.download_button(
-        label="📥 Descargar tabla en Excel",
-        data=processed_data,
-        file_name="compras_por_mes_por_cuenta.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # --- Descargar Excel (se arma al hacer clic, cacheado por periodo y versión de datos) ---
+    boton_excel(
+        "📥 Descargar tabla en Excel",
+        "compras_por_mes_por_cuenta.xlsx",
+        clave_excel("compra_cuenta", df_filtrado),
+        partial(libro_excel, tabla_compras, "Compras")
     )
     st.markdown("<br><br>", unsafe_allow_html=True)
 
     #-------------------- GRÁFICO DE LÍNEAS: COMPRAS MENSUALES POR CUENTA --------------------------------------------------------------------------
-    # Asegúrate de que la columna mes_dt exista en df_divisiones_filtra
-    if "mes_dt" not in df_divisiones_filtrado.columns:
-        df_divisiones_filtrado["mes_dt"] = pd.to_datetime(df_divisiones_filtrado["fecha"]).dt.to_period("M").dt.to_timestamp()
-
-    # Crear columnas mes_nombre y mes_anio en español
-    df_divisiones_filtrado["mes_nombre"] = df_divisiones_filtrado["mes_dt"].dt.month_name().map(meses_es)
-    df_divisiones_filtrado["mes_anio"] = df_divisiones_filtrado["mes_nombre"] + " " + df_divisiones_filtrado["mes_dt"].dt.year.astype(str)
-
-    # Función para obtener abreviatura de la división
-    def obtener_abreviatura(codigo):
-        codigo_str = str(codigo).strip()
-        for division, info in divisiones.items():
-            if codigo_str in info["codigos"]:
-                return info["abreviatura"]
-        return ""
-
-    # Crear columnas abreviatura y cuenta_sucursal
-    df_divisiones_filtrado["abreviatura"] = df_divisiones_filtrado["codigo_normalizado"].apply(obtener_abreviatura)
-    df_divisiones_filtrado["cuenta_sucursal"] = (
-        df_divisiones_filtrado["codigo_normalizado"].astype(str) + " (" +
-        df_divisiones_filtrado["abreviatura"] + ") - " +
-        df_divisiones_filtrado["sucursal"]
-    )
-
-    # Agrupar datos para plotly (long-form)
+    # Agrupar datos para plotly (long-form); mes_nombre ya incluye el año ("Enero 2025")
     df_grafico = df_divisiones_filtrado.groupby(
-        ["mes_anio", "cuenta_sucursal", "abreviatura"], as_index=False
-    )["monto"].sum()
+        ["mes_nombre", "cuenta_sucursal", "abreviatura"], as_index=False
+    )["monto"].sum().rename(columns={"mes_nombre": "mes_anio"})
 
     # Definir el orden de los meses
-    orden_meses = df_divisiones_filtrado.drop_duplicates("mes_anio").sort_values("mes_dt")["mes_anio"].tolist()
+    orden_meses = df_divisiones_filtrado.drop_duplicates("mes_nombre").sort_values("mes_dt")["mes_nombre"].tolist()
 
     # Obtener lista de cuentas únicas
     cuentas = df_grafico["cuenta_sucursal"].unique()
@@ -489,33 +430,37 @@ def mostrar(df_filtrado, config):
         st.warning("No hay datos para mostrar con las cuentas seleccionadas.")
         st.dataframe(df_grafico.head(10))
     else:
-        # Crear gráfico de líneas con customdata incluyendo abreviatura
-        fig = px.line(
-            df_filtrado,
-            x="mes_anio",
-            y="monto",
-            color="cuenta_sucursal",
-            markers=True,
-            custom_data=["mes_anio", "cuenta_sucursal", "monto", "abreviatura"],
-            color_discrete_map=color_map  # <-- aquí el truco
-        )
+        def construir_lineas():
+            # Crear gráfico de líneas con customdata incluyendo abreviatura
+            fig = px.line(
+                df_filtrado,
+                x="mes_anio",
+                y="monto",
+                color="cuenta_sucursal",
+                markers=True,
+                custom_data=["mes_anio", "cuenta_sucursal", "monto", "abreviatura"],
+                color_discrete_map=color_map  # <-- aquí el truco
+            )
 
-        # Formato de hovertemplate mostrando abreviatura
-        fig.update_traces(
-            hovertemplate=(
-                "<b>Mes:</b> %{customdata[0]}<br>"
-                "<b>Cuenta - Sucursal:</b> %{customdata[1]}<br>"
-                "<b>Monto:</b> $%{customdata[2]:,.2f}<br>"
-                "<b>División:</b> %{customdata[3]}<extra></extra>"
+            # Formato de hovertemplate mostrando abreviatura
+            fig.update_traces(
+                hovertemplate=(
+                    "<b>Mes:</b> %{customdata[0]}<br>"
+                    "<b>Cuenta - Sucursal:</b> %{customdata[1]}<br>"
+                    "<b>Monto:</b> $%{customdata[2]:,.2f}<br>"
+                    "<b>División:</b> %{customdata[3]}<extra></extra>"
+                )
             )
-        )
 
-        fig.update_layout(
-            xaxis_title="Mes",
-            yaxis_title="Monto (MXN)",
-            yaxis_tickformat=",",
-            legend_title="Cuenta - Sucursal"
-        )
+            fig.update_layout(
+                xaxis_title="Mes",
+                yaxis_title="Monto (MXN)",
+                yaxis_tickformat=",",
+                legend_title="Cuenta - Sucursal"
+            )
+            return fig
+
+        fig = figura_cacheada(clave("lineas_cuentas", sorted(sucursales_seleccionadas)), construir_lineas)
 
         config = {
             "scrollZoom": True,
@@ -533,28 +478,6 @@ def mostrar(df_filtrado, config):
     if df_divisiones_filtrado.empty:
         st.warning("No hay datos disponibles.")
     else:
-        # --- Crear columnas necesarias en df_divisiones_filtrado ---
-        def obtener_abreviatura(codigo):
-            codigo_str = str(codigo).strip()
-            for division, info in divisiones.items():
-                if codigo_str in info["codigos"]:
-                    return info["abreviatura"]
-            return ""
-
-        df_divisiones_filtrado["abreviatura"] = df_divisiones_filtrado["codigo_normalizado"].apply(obtener_abreviatura)
-        df_divisiones_filtrado["cuenta_sucursal"] = (
-            df_divisiones_filtrado["codigo_normalizado"].astype(str) + " (" +
-            df_divisiones_filtrado["abreviatura"] + ") - " +
-            df_divisiones_filtrado["sucursal"]
-        )
-        df_divisiones_filtrado["sucursal_nombre"] = df_divisiones_filtrado["cuenta_sucursal"].str.split(" - ").str[-1]
-
-        # Crear columna mes_nombre en español
-        df_divisiones_filtrado["mes_nombre"] = (
-            df_divisiones_filtrado["mes_dt"].dt.month_name().map(meses_es) + " " +
-            df_divisiones_filtrado["mes_dt"].dt.year.astype(str)
-        )
-
         # --- Agrupar datos por mes y cuenta ---
         df_barras = df_divisiones_filtrado.groupby(["mes_nombre", "cuenta_sucursal"], as_index=False)["monto"].sum()
 
@@ -567,7 +490,10 @@ def mostrar(df_filtrado, config):
         df_barras = df_barras.set_index(["mes_nombre", "cuenta_sucursal"]).reindex(idx, fill_value=0).reset_index()
 
         # Añadir sucursal_nombre mediante merge
-        df_sucursales = df_divisiones_filtrado.drop_duplicates("cuenta_sucursal")[["cuenta_sucursal", "sucursal_nombre"]]
+        df_sucursales = (
+            df_divisiones_filtrado.drop_duplicates("cuenta_sucursal")[["cuenta_sucursal", "sucursal"]]
+            .rename(columns={"sucursal": "sucursal_nombre"})
+        )
         df_barras = df_barras.merge(df_sucursales, on="cuenta_sucursal", how="left")
 
         # Convertir mes_nombre en categoría ordenada
@@ -580,40 +506,37 @@ def mostrar(df_filtrado, config):
                 continue
 
             df_mes = df_mes.sort_values("monto", ascending=False)
-            df_mes["cuenta_sucursal"] = pd.Categorical(df_mes["cuenta_sucursal"], categories=df_mes["cuenta_sucursal"], ordered=True)
-            df_mes["texto_monto"] = df_mes["monto"].apply(lambda x: f"${x:,.2f}")
-
-            fig = go.Figure()
-
-            for i, row in df_mes.iterrows():
-                fig.add_trace(go.Bar(
-                    y=[row["cuenta_sucursal"]],
-                    x=[row["monto"]],
-                    orientation='h',
-                    name=row["sucursal_nombre"],
-                    marker_color=colores_sucursales.get(row["sucursal_nombre"], {}).get("color", "#CCCCCC"),
-                    text=row["texto_monto"],
-                    textposition="outside",
-                    cliponaxis=False,
-                    hovertemplate=f"{row['cuenta_sucursal']}<br>Monto: $%{{x:,.2f}}<extra></extra>"
-                ))
-
-            altura_por_barra = 40
-            numero_barras = len(df_mes)
-            altura_total = max(600, numero_barras * altura_por_barra)
-
-            fig.update_layout(
-                title=f"Compras por Cuenta - {mes}",
-                xaxis_title="Monto de compra (MXN)",
-                yaxis_title="Cuenta",
-                xaxis_tickformat=",",
-                legend_title="Sucursal",
-                barmode="stack",
-                margin=dict(r=70),
-                showlegend=False,
-                height=altura_total,
-                bargap=0.15,
-                bargroupgap=0.1
-            )
+            def construir_mes():
+                colores_barras = df_mes["sucursal_nombre"].map(colores_sucursales_map).fillna("#CCCCCC")
+
+                # Una sola traza horizontal: color, texto y etiqueta de cada cuenta como arreglos
+                altura_por_barra = 40
+                altura_total = max(600, len(df_mes) * altura_por_barra)
+
+                return figura(
+                    [traza(
+                        "bar",
+                        y=df_mes["cuenta_sucursal"],
+                        x=df_mes["monto"],
+                        orientation="h",
+                        marker={"color": colores_barras.to_numpy()},
+                        text=df_mes["monto"].map("${:,.2f}".format),
+                        textposition="outside",
+                        cliponaxis=False,
+                        hovertemplate="%{y}<br>Monto: $%{x:,.2f}<extra></extra>",
+                    )],
+                    {
+                        "title": titulo(f"Compras por Cuenta - {mes}"),
+                        "xaxis": {"title": titulo("Monto de compra (MXN)")},
+                        "yaxis": {"title": titulo("Cuenta")},
+                        "margin": {"r": 70},
+                        "showlegend": False,
+                        "height": altura_total,
+                        "bargap": 0.15,
+                    },
+                    base="barras_h",
+                )
+
+            fig = figura_cacheada(clave("compras_cuenta_mes", mes), construir_mes)
 
             st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
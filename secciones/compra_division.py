@@ -1,13 +1,17 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 import plotly.express as px
 import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib.ticker as mtick
 import json
 from datetime import datetime
-from utils.api_utils import obtener_datos_api
+from functools import partial
+from utils.data_utils import filtrar_por_periodo, obtener_años_disponibles, cargar_agregados_mensuales
+from utils.agregaciones_utils import PlanAgregaciones
+from utils.table_utils import html_cacheado, formatear, celdas, renglones, encabezado, degradado_azul
+from utils.charts_utils import clave_figura, figura_cacheada, imagen_cacheada
 
 
 def mostrar(df_filtrado, config):
@@ -40,59 +44,62 @@ def mostrar(df_filtrado, config):
     periodo = st.radio("Selecciona periodo", opciones_periodo, horizontal=True)
 
     # Detectar años disponibles
-    df_filtrado["fecha"] = pd.to_datetime(df_filtrado["mes"])  # asegúrate de tener columna 'mes' en formato fecha
-    años_disponibles = sorted(df_filtrado["fecha"].dt.year.unique())
+    años_disponibles = obtener_años_disponibles(df_filtrado)
     año_seleccionado = st.selectbox("Selecciona el año", años_disponibles, index=len(años_disponibles)-1)
     st.markdown("<br><br>", unsafe_allow_html=True)
 
-    # Filtrar por periodo
-    if periodo == "Año Natural":
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.year == año_seleccionado]
-        titulo_periodo = f"{año_seleccionado}"
-
-    elif periodo == "Año Fiscal":
-        # Año fiscal: 1 nov (año_seleccionado-1) -> 31 oct (año_seleccionado)
-        inicio_fiscal = pd.Timestamp(año_seleccionado-1, 11, 1)
-        fin_fiscal = pd.Timestamp(año_seleccionado, 10, 31)
-        df_filtrado = df_filtrado[(df_filtrado["fecha"] >= inicio_fiscal) & (df_filtrado["fecha"] <= fin_fiscal)]
-        titulo_periodo = f"Fiscal {año_seleccionado}"
+    # Filtrar por periodo (cacheado por versión de datos, sin hashear el DataFrame)
+    df_filtrado, titulo_periodo = filtrar_por_periodo(df_filtrado, periodo, año_seleccionado)
+    mensual, _ = filtrar_por_periodo(cargar_agregados_mensuales(), periodo, año_seleccionado)
     st.markdown("<br><br>", unsafe_allow_html=True)
 
-    # Usar df_filtrado en lugar del df original
-    df_divisiones_filtrado = df_filtrado.dropna(subset=["division"])
+    # Todas las agregaciones de la vista salen de la suma por sucursal, mes y división
+    # (sólo filas con división); se calcula una vez desde los agregados mensuales
+    # y el resto se re-agrega desde ella
+    plan = PlanAgregaciones(df_filtrado, mensual).declarar(
+        "sucursal_mes_division", ["sucursal", "mes_nombre", "division"], filtro="con_division"
+    )
 
     #------------------------- GRÁFICO DE PASTEL ---------------------------------------------------------
-    df_agrupado = df_divisiones_filtrado.groupby("division")["monto"].sum().reset_index()
-
-    fig_pie = px.pie(
-        df_agrupado,
-        values="monto",
-        names="division",
-        color="division",
-        color_discrete_map=colores_divisiones,
-        hole=0.4
-    )
+    df_agrupado = plan.suma(["division"], filtro="con_division").reset_index()
+
+    # Figuras cacheadas por (sección, gráfica, periodo, año, versión de datos)
+    def clave(grafica, *selecciones):
+        return clave_figura("compra_division", grafica, df_filtrado, periodo, año_seleccionado, *selecciones)
+
+    def construir_pastel():
+        fig_pie = px.pie(
+            df_agrupado,
+            values="monto",
+            names="division",
+            color="division",
+            color_discrete_map=colores_divisiones,
+            hole=0.4
+        )
 
-    fig_pie.update_traces(
-        textinfo="percent+label",
-        textposition="inside",
-        hovertemplate=(
-            "<b>División:</b> %{label}<br>"
-            "<b>Monto:</b> $%{value:,.2f}<br>"
-            "<b>Porcentaje:</b> %{percent}<extra></extra>"
+        fig_pie.update_traces(
+            textinfo="percent+label",
+            textposition="inside",
+            hovertemplate=(
+                "<b>División:</b> %{label}<br>"
+                "<b>Monto:</b> $%{value:,.2f}<br>"
+                "<b>Porcentaje:</b> %{percent}<extra></extra>"
+            )
         )
-    )
 
-    fig_pie.update_layout(
-        height=500,
-        legend=dict(
-            orientation="h",
-            yanchor="top",
-            y=-0.2,
-            xanchor="center",
-            x=0.5
+        fig_pie.update_layout(
+            height=500,
+            legend=dict(
+                orientation="h",
+                yanchor="top",
+                y=-0.2,
+                xanchor="center",
+                x=0.5
+            )
         )
-    )
+        return fig_pie
+
+    fig_pie = figura_cacheada(clave("pastel"), construir_pastel)
 
     # 👇 Título con Markdown y menos espacio debajo
     st.markdown("### Distribución del total anual comprado por División")
@@ -119,35 +126,39 @@ def mostrar(df_filtrado, config):
     st.markdown("<br><br>", unsafe_allow_html=True)
 
     # --------------- GRÁFICO DE BARRAS DEL TOTAL ANUAL COMPRADO POR DIVISIÓN ----------------------------------------------
-    df_agrupado["porcentaje"] = df_agrupado["monto"] / df_agrupado["monto"].sum() * 100
-    df_agrupado["texto_barra"] = df_agrupado.apply(
-        lambda row: f"${row['monto']:,.0f}<br>{row['porcentaje']:.1f}%", axis=1
-    )
+    def construir_barras():
+        df_agrupado["porcentaje"] = df_agrupado["monto"] / df_agrupado["monto"].sum() * 100
+        df_agrupado["texto_barra"] = df_agrupado.apply(
+            lambda row: f"${row['monto']:,.0f}<br>{row['porcentaje']:.1f}%", axis=1
+        )
 
-    fig_bar = px.bar(
-        df_agrupado,
-        x="division",
-        y="monto",
-        color="division",
-        text="texto_barra",
-        custom_data=["division", "porcentaje"],  # ← para usar en hovertemplate
-        color_discrete_map=colores_divisiones,
-        labels={"monto": "Monto Comprado", "division": "División"}
-    )
+        fig_bar = px.bar(
+            df_agrupado,
+            x="division",
+            y="monto",
+            color="division",
+            text="texto_barra",
+            custom_data=["division", "porcentaje"],  # ← para usar en hovertemplate
+            color_discrete_map=colores_divisiones,
+            labels={"monto": "Monto Comprado", "division": "División"}
+        )
 
-    fig_bar.update_traces(
-        textposition="inside",
-        texttemplate="%{text}",
-        hovertemplate=(
-            "<b>División:</b> %{customdata[0]}<br>"
-            "<b>Monto:</b> $%{y:,.2f}<br>"
-            "<b>Porcentaje:</b> %{customdata[1]:.1f}%<extra></extra>"
+        fig_bar.update_traces(
+            textposition="inside",
+            texttemplate="%{text}",
+            hovertemplate=(
+                "<b>División:</b> %{customdata[0]}<br>"
+                "<b>Monto:</b> $%{y:,.2f}<br>"
+                "<b>Porcentaje:</b> %{customdata[1]:.1f}%<extra></extra>"
+            )
         )
-    )
 
-    fig_bar.update_layout(
-        showlegend=False
-    )
+        fig_bar.update_layout(
+            showlegend=False
+        )
+        return fig_bar
+
+    fig_bar = figura_cacheada(clave("barras_division"), construir_barras)
 
     # 👇 Título con Markdown y menos espacio debajo
     st.markdown("### Monto total anual por División")
@@ -157,13 +168,7 @@ def mostrar(df_filtrado, config):
 
     # ---------------- TABLA: TOTAL MENSUAL COMPRADO POR DIVISIÓN ---------------------------------------------------------------------------
     # Crear tabla pivote
-    tabla_pivot = df_divisiones_filtrado.pivot_table(
-        index="division",
-        columns="mes_nombre",
-        values="monto",
-        aggfunc="sum",
-        fill_value=0
-    )
+    tabla_pivot = plan.pivote("division", "mes_nombre", filtro="con_division", fill_value=0)
 
     # Reordenar columnas según el orden cronológico (solo las que existan)
     meses_validos = [m for m in orden_meses if m in tabla_pivot.columns]
@@ -276,68 +281,35 @@ def mostrar(df_filtrado, config):
         </style>
         """
 
-        # Calcular totales por fila (división)
-        df['Total'] = df[meses_validos].sum(axis=1)
-
-        # Calcular totales por columna (meses + total)
-        totales_columna = df[meses_validos + ['Total']].sum()
-
-        # Añadimos columna Total a orden_meses para pintar totales por columna
-        columnas_completas = meses_validos + ['Total']
+        # Todo por columnas: totales, formato y degradado azul por renglón (y el de la fila de totales)
+        valores = df[meses_validos].to_numpy(dtype=float)
+        total_fila = valores.sum(axis=1)
+        totales_columna = np.append(valores.sum(axis=0), total_fila.sum())
+
+        division = df["División"].astype(str)
+        clase_div = np.select(
+            [
+                division.str.contains("Agrícola", regex=False),
+                division.str.contains("Construcción", regex=False),
+                division.str.contains("Jardinería", regex=False) | division.str.contains("Golf", regex=False),
+            ],
+            ["agricola", "construccion", "jardineria"],
+            ""
+        ).astype(object)
+        estilos = degradado_azul(valores)
+        estilos_total = degradado_azul([totales_columna])[0]
 
         html = estilos_css + "<div class='tabla-wrapper'><table class='tabla-divisiones'>"
-        html += "<thead><tr>"
-        for col in df.columns:
-            html += f"<th>{col}</th>"
-        html += "</tr></thead><tbody>"
-
-        for _, row in df.iterrows():
-            html += "<tr>"
-
-            # Estilo para División
-            division = row["División"]
-            clase_div = ""
-            if "Agrícola" in division:
-                clase_div = "agricola"
-            elif "Construcción" in division:
-                clase_div = "construccion"
-            elif "Jardinería" in division or "Golf" in division:
-                clase_div = "jardineria"
-            html += f"<td class='{clase_div}'>{division}</td>"
-
-            # Valores por fila (incluyendo total)
-            valores_fila = [row[col] for col in meses_validos]
-            max_val = max(valores_fila)
-            min_val = min(valores_fila)
-            rango = max_val - min_val if max_val != min_val else 1
-
-            # Mostrar celdas de meses con degradado azul por fila
-            for col in meses_validos:
-                val = row[col]
-                ratio = (val - min_val) / rango
-                azul = int(255 - (ratio * 120))
-                color_fondo = f"rgb({azul},{azul + 20},255)"
-                html += f"<td class='grad' style='background-color:{color_fondo}'>{val:,.2f}</td>"
-
-            # Mostrar total por fila (sin degradado, con color fijo)
-            total_fila = row['Total']
-            html += f"<td class='celda-total'>{total_fila:,.2f}</td>"
-
-            html += "</tr>"
+        html += encabezado(list(df.columns) + ["Total"]) + "<tbody>"
+        html += renglones(
+            celdas(division, clase_div),
+            *[celdas(formatear(valores[:, k], "{:,.2f}"), "grad", estilos[:, k]) for k in range(len(meses_validos))],
+            celdas(formatear(total_fila, "{:,.2f}"), "celda-total"),
+        )
 
         # Fila totales por columna
-        html += "<tr>"
-        html += "<td class='celda-total'>Total</td>"
-        max_total = totales_columna.max()
-        min_total = totales_columna.min()
-        rango_total = max_total - min_total if max_total != min_total else 1
-
-        for col in columnas_completas:
-            val = totales_columna[col]
-            ratio = (val - min_total) / rango_total
-            azul = int(255 - (ratio * 120))
-            color_fondo = f"rgb({azul},{azul + 20},255)"
-            html += f"<td class='celda-total' style='background-color:{color_fondo}'>{val:,.2f}</td>"
+        html += "<tr><td class='celda-total'>Total</td>"
+        html += "".join(celdas(formatear(totales_columna, "{:,.2f}"), "celda-total", estilos_total))
         html += "</tr>"
 
         html += "</tbody></table></div>"
@@ -345,41 +317,48 @@ def mostrar(df_filtrado, config):
 
     # Mostrar tabla
     st.markdown("### Comparativo por división")
-    st.markdown(construir_tabla_divisiones_html(tabla_pivot), unsafe_allow_html=True)
+    st.markdown(
+        html_cacheado("divisiones_mes", df_filtrado, lambda: construir_tabla_divisiones_html(tabla_pivot)),
+        unsafe_allow_html=True
+    )
     st.markdown("<br><br>", unsafe_allow_html=True)
 
     # ------------ GRÁFICA DE BARRAS AGRUPADAS: EVOLUCIÓN MENSUAL COMPRADO POR DIVISIÓN ------------------------------------------------------------
-    df_mes_div = df_divisiones_filtrado.groupby(["mes_nombre", "division"])["monto"].sum().reset_index()
-    df_mes_div["mes_nombre"] = pd.Categorical(df_mes_div["mes_nombre"], categories=orden_meses, ordered=True)
-    df_mes_div = df_mes_div.sort_values("mes_nombre")
-
-    fig_mes_div = px.bar(
-        df_mes_div,
-        x="mes_nombre",
-        y="monto",
-        color="division",
-        text="monto",
-        custom_data=["division"],         
-        color_discrete_map=colores_divisiones,
-        labels={"mes_nombre":"Mes","monto":"Total Comprado","division":"División"}
-    )
+    def construir_mes_division():
+        df_mes_div = plan.suma(["mes_nombre", "division"], filtro="con_division").reset_index()
+        df_mes_div["mes_nombre"] = pd.Categorical(df_mes_div["mes_nombre"], categories=orden_meses, ordered=True)
+        df_mes_div = df_mes_div.sort_values("mes_nombre")
+
+        fig_mes_div = px.bar(
+            df_mes_div,
+            x="mes_nombre",
+            y="monto",
+            color="division",
+            text="monto",
+            custom_data=["division"],         
+            color_discrete_map=colores_divisiones,
+            labels={"mes_nombre":"Mes","monto":"Total Comprado","division":"División"}
+        )
 
-    fig_mes_div.update_traces(
-        texttemplate="$%{y:,.0f}",
-        textposition="inside",
-        hovertemplate=(
-            "<b>Mes:</b> %{x}<br>"
-            "<b>División:</b> %{customdata[0]}<br>"
-            "<b>Total Comprado:</b> $%{y:,.2f}<extra></extra>"
+        fig_mes_div.update_traces(
+            texttemplate="$%{y:,.0f}",
+            textposition="inside",
+            hovertemplate=(
+                "<b>Mes:</b> %{x}<br>"
+                "<b>División:</b> %{customdata[0]}<br>"
+                "<b>Total Comprado:</b> $%{y:,.2f}<extra></extra>"
+            )
         )
-    )
 
-    fig_mes_div.update_layout(
-        barmode="stack",  # usa 'group' si quieres barras agrupadas en lugar de apiladas
-        xaxis=dict(tickangle=-45),
-        margin=dict(t=60, b=100),
-        legend=dict(orientation="h", yanchor="bottom", y=-0.6, xanchor="center", x=0.5)
-    )
+        fig_mes_div.update_layout(
+            barmode="stack",  # usa 'group' si quieres barras agrupadas en lugar de apiladas
+            xaxis=dict(tickangle=-45),
+            margin=dict(t=60, b=100),
+            legend=dict(orientation="h", yanchor="bottom", y=-0.6, xanchor="center", x=0.5)
+        )
+        return fig_mes_div
+
+    fig_mes_div = figura_cacheada(clave("mes_division"), construir_mes_division)
 
     st.markdown("### Evolución mensual de compras por División")
     st.markdown("<div style='margin-top:-10px'></div>", unsafe_allow_html=True)
@@ -403,35 +382,39 @@ def mostrar(df_filtrado, config):
     )
 
     #----------------- GRÁFICA DE BARRAS AGRUPADAS: COMPRA POR SUCURSAL Y DIVISIÓN ------------------------------------------------------------
-    df_suc_div = df_divisiones_filtrado.groupby(["sucursal", "division"])["monto"].sum().reset_index()
-
-    fig_suc_div = px.bar(
-        df_suc_div,
-        x="sucursal",
-        y="monto",
-        color="division",
-        text="monto",
-        custom_data=["division"],  # ← aquí mandamos la división como dato adicional
-        color_discrete_map=colores_divisiones,
-        labels={"sucursal": "Sucursal", "monto": "Total Comprado", "division": "División"}
-    )
+    def construir_sucursal_division():
+        df_suc_div = plan.suma(["sucursal", "division"], filtro="con_division").reset_index()
+
+        fig_suc_div = px.bar(
+            df_suc_div,
+            x="sucursal",
+            y="monto",
+            color="division",
+            text="monto",
+            custom_data=["division"],  # ← aquí mandamos la división como dato adicional
+            color_discrete_map=colores_divisiones,
+            labels={"sucursal": "Sucursal", "monto": "Total Comprado", "division": "División"}
+        )
 
-    fig_suc_div.update_traces(
-        texttemplate="$%{y:,.0f}",
-        textposition="inside",
-        hovertemplate=(
-            "<b>Sucursal:</b> %{x}<br>"
-            "<b>División:</b> %{customdata[0]}<br>"
-            "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
+        fig_suc_div.update_traces(
+            texttemplate="$%{y:,.0f}",
+            textposition="inside",
+            hovertemplate=(
+                "<b>Sucursal:</b> %{x}<br>"
+                "<b>División:</b> %{customdata[0]}<br>"
+                "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
+            )
         )
-    )
 
-    fig_suc_div.update_layout(
-        barmode="stack",  # usa 'group' si prefieres barras agrupadas
-        xaxis_tickangle=-45,
-        margin=dict(t=60, b=100),
-        legend=dict(orientation="h", yanchor="bottom", y=-0.6, xanchor="center", x=0.5)
-    )
+        fig_suc_div.update_layout(
+            barmode="stack",  # usa 'group' si prefieres barras agrupadas
+            xaxis_tickangle=-45,
+            margin=dict(t=60, b=100),
+            legend=dict(orientation="h", yanchor="bottom", y=-0.6, xanchor="center", x=0.5)
+        )
+        return fig_suc_div
+
+    fig_suc_div = figura_cacheada(clave("sucursal_division"), construir_sucursal_division)
 
     st.markdown("### Compra anual por Sucursal y División")
     st.markdown("<div style='margin-top:-10px'></div>", unsafe_allow_html=True)
@@ -440,15 +423,7 @@ def mostrar(df_filtrado, config):
 
 
     #----------------------- Tabla de compra por division y sucursal ----------------------------------
-    tabla_sucursal_division = pd.pivot_table(
-        df_divisiones_filtrado,   # ✅ aquí aplicamos el filtrado
-        values="monto",
-        index="division",
-        columns="sucursal",
-        aggfunc="sum",
-        margins=True,
-        margins_name="Total",
-    )
+    tabla_sucursal_division = plan.pivote("division", "sucursal", filtro="con_division", margins_name="Total")
 
     # Renombrar índice
     tabla_sucursal_division.index.rename("División", inplace=True)
@@ -551,46 +526,37 @@ def mostrar(df_filtrado, config):
         </style>
         """
 
-        html = estilos_css + "<div class='tabla-wrapper'><table class='tabla-divisiones'>"
-        html += "<thead><tr><th>División</th>"
-        for col in columnas_sucursales:
-            html += f"<th>{col}</th>"
-        html += "</tr></thead><tbody>"
-
-        for i, row in df.iterrows():
-            division = row["División"]
-            es_total_fila = division == "Total"
-            color_fondo_div = "#0B083D" if es_total_fila else colores_div.get(division, "#eeeeee")
-            color_texto = "white" if es_total_fila else ("black" if color_fondo_div != "#FFDE00" else "black")
-
-            html += f"<tr><td style='background-color:{color_fondo_div}; color:{color_texto}'>{division}</td>"
-            columnas_sucursales = [col for col in df.columns if col not in ("División", "Total")]
-
-            if not es_total_fila:
-                valores = [row[col] for col in columnas_sucursales]
-                max_val = max(valores)
-                min_val = min(valores)
-                rango = max_val - min_val if max_val != min_val else 1
-
-            for col in columnas_sucursales + ["Total"]:
-                val = row[col]
-                if es_total_fila or col == "Total":
-                    clase = "celda-total"
-                    html += f"<td class='{clase}'>{val:,.0f}</td>"
-                else:
-                    ratio = (val - min_val) / rango
-                    azul = int(255 - (ratio * 120))
-                    color_fondo = f"rgb({azul},{azul + 20},255)"
-                    html += f"<td class='grad' style='background-color:{color_fondo}'>{val:,.0f}</td>"
-
-            html += "</tr>"
+        # Fondo de la división por renglón; degradado azul entre sucursales (sin la fila ni la columna Total)
+        division = df["División"].astype(str)
+        es_total_fila = (division == "Total").to_numpy()
+        color_fondo_div = np.where(es_total_fila, "#0B083D", division.map(colores_div).fillna("#eeeeee")).astype(object)
+        color_texto = np.where(es_total_fila, "white", "black").astype(object)
+
+        columnas = [col for col in df.columns if col not in ("División", "Total")]
+        valores = df[columnas].to_numpy(dtype=float)
+        estilos = degradado_azul(valores)
+
+        def celdas_sucursal(k):
+            texto = formatear(valores[:, k], "{:,.0f}")
+            grad = celdas(texto, "grad", estilos[:, k])
+            return grad.where(~es_total_fila, celdas(texto, "celda-total"))
 
+        html = estilos_css + "<div class='tabla-wrapper'><table class='tabla-divisiones'>"
+        html += encabezado(["División"] + list(columnas_sucursales)) + "<tbody>"
+        html += renglones(
+            celdas(division, estilo="background-color:" + color_fondo_div + "; color:" + color_texto),
+            *[celdas_sucursal(k) for k in range(len(columnas))],
+            celdas(formatear(df["Total"], "{:,.0f}"), "celda-total"),
+        )
         html += "</tbody></table></div>"
         return html
     
     st.subheader("Monto anual comprado por sucursal y división")
     st.markdown(
-        construir_tabla_sucursal_division_html(tabla_sucursal_division, sucursales),
+        html_cacheado(
+            "sucursal_division", df_filtrado,
+            lambda: construir_tabla_sucursal_division_html(tabla_sucursal_division, sucursales)
+        ),
         unsafe_allow_html=True
     )
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -604,8 +570,8 @@ def mostrar(df_filtrado, config):
 
     colores_divisiones = {k: v["color"] for k, v in config["divisiones"].items()}
 
-    # Agrupar datos
-    df_smd = df_filtrado.groupby(["sucursal", "mes_nombre", "division"], as_index=False)["monto"].sum()
+    # Agrupar datos (groupby ya descartaba las filas sin división)
+    df_smd = plan["sucursal_mes_division"].reset_index()
     df_smd["sucursal"] = df_smd["sucursal"].astype(str)
     df_smd["mes_nombre"] = df_smd["mes_nombre"].astype(str)
     df_smd["division"] = df_smd["division"].astype(str)
@@ -672,64 +638,68 @@ def mostrar(df_filtrado, config):
     divisiones_ordenadas = sorted(df_smd["division"].unique())
     palette = [colores_divisiones.get(div, "#777777") for div in divisiones_ordenadas]
 
+    # Divisiones presentes y paleta ajustada (iguales para todas las sucursales)
+    divisiones_presentes = df_filtrado["division"].unique()
+    palette_grafico = {div: colores_divisiones.get(div, "#777777") for div in divisiones_presentes}
+
+    # Gráfica de una sucursal; se guarda como PNG y no depende del número de columnas
+    def grafica_sucursal(suc):
+        df_sucursal = df_smd[df_smd["sucursal"] == suc]
+
+        fig, ax = plt.subplots(figsize=(8, 4))
+        fig.patch.set_facecolor('#121212')
+        ax.set_facecolor('#121212')
+
+        sns.barplot(
+            data=df_sucursal,
+            x="monto",
+            y="mes_nombre",
+            hue="division",
+            hue_order=divisiones_presentes,  # solo divisiones presentes
+            palette=palette_grafico,
+            ax=ax,
+            orient="h"
+        )
+
+        # Etiquetas de las barras, al borde para no sobreponerse
+        for container in ax.containers:
+            ax.bar_label(
+                container,
+                labels=[f"${x:,.0f}" for x in container.datavalues],
+                padding=3,
+                color='white',
+                fontsize=9,
+                label_type='edge'
+            )
+
+        # Formato eje X
+        ax.xaxis.set_major_formatter(mtick.StrMethodFormatter('${x:,.0f}'))
+        ax.set_title(f"{suc} - Evolución de Compras", color="white")
+        ax.set_xlabel("Monto", color="white")
+        ax.set_ylabel("Mes", color="white")
+        ax.tick_params(colors="white")
+
+        # Leyenda solo con divisiones presentes
+        leg = ax.get_legend()
+        if leg is not None:
+            leg.set_title("División")
+            leg.get_title().set_color("white")  # título en blanco
+            for text in leg.get_texts():
+                text.set_color("white")           # labels en blanco
+            leg.get_frame().set_facecolor('#121212')
+            leg.get_frame().set_edgecolor('white')
+            # mover la leyenda
+            leg.set_bbox_to_anchor((1.15, 1))   # desplazamiento horizontal
+            leg._legend_box.align = "left"
+
+        # Ajustar márgenes para que la leyenda no se encime con el gráfico
+        fig.subplots_adjust(right=0.80)
+        return fig
+
     for i in range(0, num_sucursales, num_columnas):
         cols = st.columns(num_columnas)
         for j in range(num_columnas):
             if i + j < num_sucursales:
                 suc = sucursales[i + j]
-                df_sucursal = df_smd[df_smd["sucursal"] == suc]
-
-                fig, ax = plt.subplots(figsize=(8, 4))
-                fig.patch.set_facecolor('#121212')
-                ax.set_facecolor('#121212')
-
-                # Divisiones presentes en este subset y paleta ajustada
-                divisiones_presentes = df_filtrado["division"].unique()
-                palette_grafico = {div: colores_divisiones.get(div, "#777777") for div in divisiones_presentes}
-
-                sns.barplot(
-                    data=df_sucursal,
-                    x="monto",
-                    y="mes_nombre",
-                    hue="division",
-                    hue_order=divisiones_presentes,  # solo divisiones presentes
-                    palette=palette_grafico,
-                    ax=ax,
-                    orient="h"
-                )
-
-                # Etiquetas de las barras, al borde para no sobreponerse
-                for container in ax.containers:
-                    ax.bar_label(
-                        container,
-                        labels=[f"${x:,.0f}" for x in container.datavalues],
-                        padding=3,
-                        color='white',
-                        fontsize=9,
-                        label_type='edge'
-                    )
-
-                # Formato eje X
-                ax.xaxis.set_major_formatter(mtick.StrMethodFormatter('${x:,.0f}'))
-                ax.set_title(f"{suc} - Evolución de Compras", color="white")
-                ax.set_xlabel("Monto", color="white")
-                ax.set_ylabel("Mes", color="white")
-                ax.tick_params(colors="white")
-
-                # Leyenda solo con divisiones presentes
-                leg = ax.get_legend()
-                if leg is not None:
-                    leg.set_title("División")
-                    leg.get_title().set_color("white")  # título en blanco
-                    for text in leg.get_texts():
-                        text.set_color("white")           # labels en blanco
-                    leg.get_frame().set_facecolor('#121212')
-                    leg.get_frame().set_edgecolor('white')
-                    # mover la leyenda
-                    leg.set_bbox_to_anchor((1.15, 1))   # desplazamiento horizontal
-                    leg._legend_box.align = "left"
-
-                # Ajustar márgenes para que la leyenda no se encime con el gráfico
-                fig.subplots_adjust(right=0.80)
-
-                cols[j].pyplot(fig)
\ No newline at end of file
+                imagen = imagen_cacheada(clave("evolucion_sucursal", suc), partial(grafica_sucursal, suc))
+                cols[j].image(imagen, width="stretch")
\ No newline at end of file
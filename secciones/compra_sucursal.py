@@ -1,12 +1,13 @@
 import streamlit as st
-import plotly.express as px
 import json
 import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime
-import io
+from functools import partial
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
-from utils.api_utils import obtener_datos_api
+from utils.data_utils import filtrar_por_periodo, obtener_años_disponibles, cargar_agregados_mensuales
+from utils.agregaciones_utils import PlanAgregaciones
+from utils.charts_utils import figura, traza, titulo, trazas_lineas, grafica_barras, clave_figura, figura_cacheada
+from utils.excel_utils import boton_excel, libro_excel, clave_excel
 
 
 def mostrar(df_filtrado, config):
@@ -20,6 +21,7 @@ def mostrar(df_filtrado, config):
         config = json.load(f)
     colores_divisiones = {k: v["color"] for k, v in config["divisiones"].items()}
     colores_sucursales = config["sucursales"]
+    color_map = {k: v["color"] for k, v in colores_sucursales.items()}
 
     divisiones = config["divisiones"]
 
@@ -43,62 +45,61 @@ def mostrar(df_filtrado, config):
     periodo = st.radio("Selecciona periodo", opciones_periodo, horizontal=True)
 
     # Detectar años disponibles
-    df_filtrado["fecha"] = pd.to_datetime(df_filtrado["mes"])  # asegúrate de tener columna 'mes' en formato fecha
-    años_disponibles = sorted(df_filtrado["fecha"].dt.year.unique())
+    años_disponibles = obtener_años_disponibles(df_filtrado)
     año_seleccionado = st.selectbox("Selecciona el año", años_disponibles, index=len(años_disponibles)-1)
 
-    # Filtrar por periodo
-    if periodo == "Año Natural":
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.year == año_seleccionado]
-        titulo_periodo = f"{año_seleccionado}"
-
-    elif periodo == "Año Fiscal":
-        # Año fiscal: 1 nov (año_seleccionado-1) -> 31 oct (año_seleccionado)
-        inicio_fiscal = pd.Timestamp(año_seleccionado-1, 11, 1)
-        fin_fiscal = pd.Timestamp(año_seleccionado, 10, 31)
-        df_filtrado = df_filtrado[(df_filtrado["fecha"] >= inicio_fiscal) & (df_filtrado["fecha"] <= fin_fiscal)]
-        titulo_periodo = f"Fiscal {año_seleccionado}"
+    # Filtrar por periodo (cacheado por versión de datos, sin hashear el DataFrame)
+    df_filtrado, titulo_periodo = filtrar_por_periodo(df_filtrado, periodo, año_seleccionado)
+    mensual, _ = filtrar_por_periodo(cargar_agregados_mensuales(), periodo, año_seleccionado)
     st.markdown("<br><br>", unsafe_allow_html=True)
+    # Agregaciones de la vista (cada suma por mes y sucursal se calcula una vez,
+    # desde los agregados mensuales)
+    plan = PlanAgregaciones(df_filtrado, mensual)
     # Usar df_filtrado en lugar del df original
-    df_divisiones_filtrado = df_filtrado.dropna(subset=["division"])
+    df_divisiones_filtrado = plan.datos("con_division")
 
     #------------------------------------ GRÁFICA DE BARRAS AGRUPADA ---------------------------------------------------------------------------------------
-    df_pivot = df_divisiones_filtrado.pivot_table(
-        index="mes_nombre",
-        columns="sucursal",
-        values="monto",
-        aggfunc="sum"
-    ).fillna(0)
+    df_pivot = plan.pivote("mes_nombre", "sucursal", filtro="con_division").fillna(0)
     orden_meses = df_divisiones_filtrado.drop_duplicates("mes_dt") \
             .sort_values("mes_dt")["mes_nombre"].tolist()
 
     df_pivot = df_pivot.reindex(orden_meses)
     df_percent = df_pivot.div(df_pivot.sum(axis=1), axis=0) * 100
 
-    fig = go.Figure()
-    for sucursal in sorted(df_pivot.columns):
-        fig.add_trace(go.Bar(
-            y=df_percent.index,
-            x=df_percent[sucursal],
-            orientation='h',
-            name=sucursal,
-            marker=dict(color=colores_sucursales.get(sucursal, {}).get("color", "#CCCCCC")),
-            customdata=df_pivot[sucursal],
-            text=[
-                f"{df_percent.loc[mes, sucursal]:.1f}%<br>${df_pivot.loc[mes, sucursal]:,.0f}"
-                if df_pivot.loc[mes, sucursal] > 0 else ""
-                for mes in df_percent.index
-            ],
-            hovertemplate="<b>%{fullData.name}</b><br>%{x:.1f}%<br>$%{customdata:,.2f}<extra></extra>",
-            textposition='inside'
-        ))
-    fig.update_layout(
-        barmode='stack',
-        #title='Distribución porcentual de compras por sucursal (2025)',
-        xaxis=dict(title='Porcentaje', ticksuffix='%'),
-        yaxis=dict(title='Mes'),
-        legend=dict(orientation='h', yanchor='top', y=-0.25, xanchor='center', x=0.5),
-        height=650, margin=dict(t=20)
+    # Texto de todas las celdas de una vez (porcentaje y monto; vacío donde no hubo compra)
+    sucursales_orden = sorted(df_pivot.columns)
+    montos = df_pivot[sucursales_orden]
+    porcentajes = df_percent[sucursales_orden]
+    textos = (
+        porcentajes.apply(lambda c: c.map("{:.1f}%".format)) + "<br>$"
+        + montos.apply(lambda c: c.map("{:,.0f}".format))
+    ).where(montos > 0, "")
+
+    fig = figura(
+        [
+            traza(
+                "bar",
+                y=porcentajes.index,
+                x=porcentajes[sucursal],
+                orientation="h",
+                name=sucursal,
+                marker={"color": color_map.get(sucursal, "#CCCCCC")},
+                customdata=montos[sucursal],
+                text=textos[sucursal],
+                hovertemplate="<b>%{fullData.name}</b><br>%{x:.1f}%<br>$%{customdata:,.2f}<extra></extra>",
+                textposition="inside",
+            )
+            for sucursal in sucursales_orden
+        ],
+        {
+            "barmode": "stack",
+            #"title": "Distribución porcentual de compras por sucursal (2025)",
+            "xaxis": {"title": titulo("Porcentaje"), "ticksuffix": "%"},
+            "yaxis": {"title": titulo("Mes")},
+            "legend": {"orientation": "h", "yanchor": "top", "y": -0.25, "xanchor": "center", "x": 0.5},
+            "height": 650,
+            "margin": {"t": 20},
+        },
     )
     # Configuración personalizada para scroll + barra de herramientas limpia
     config = {
@@ -122,14 +123,7 @@ def mostrar(df_filtrado, config):
     st.markdown("### Resumen total por mes y sucursal")
 
     # Crear tabla pivote con totales
-    tabla = df_filtrado.pivot_table(
-        index="mes_nombre",
-        columns="sucursal",
-        values="monto",
-        aggfunc="sum",
-        margins=True,
-        margins_name="Total"
-    ).fillna(0)
+    tabla = plan.pivote("mes_nombre", "sucursal", margins_name="Total").fillna(0)
 
     # Reordenar filas (meses + total)
     tabla = tabla.reindex(orden_meses + ["Total"])
@@ -326,15 +320,11 @@ def mostrar(df_filtrado, config):
         st.subheader("Tabla resumen del monto sin ligar por mes y sucursal")
 
     with col2:
-        buffer = io.BytesIO()
-        tabla_reset.to_excel(buffer, index=False)
-        buffer.seek(0)
-
-        st.download_button(
-            label="📥 Descargar tabla en Excel",
-            data=buffer,
-            file_name="resumen_mensual.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        boton_excel(
+            "📥 Descargar tabla en Excel",
+            "resumen_mensual.xlsx",
+            clave_excel("compra_sucursal", df_filtrado),
+            partial(libro_excel, tabla_reset, "Sheet1", index=False)
         )
 
     # --- Mostrar tabla debajo ---
@@ -350,35 +340,24 @@ def mostrar(df_filtrado, config):
     )
 
     # ------------------------- GRÁFICO DE LÍNEAS: EVOLUCIÓN DE COMPRAS POR MES Y SUCURSAL -------------------------------------
-    fig_lineas = go.Figure()
-
-    for sucursal in df_pivot.columns:
-        # Prepara los datos para pasar mes y sucursal por customdata
-        customdata = list(zip(df_pivot.index.astype(str), [sucursal]*len(df_pivot)))
-
-        fig_lineas.add_trace(go.Scatter(
-            x=df_pivot.index,
-            y=df_pivot[sucursal],
-            mode='lines+markers',
-            name=sucursal,
-            line=dict(color=colores_sucursales.get(sucursal, {}).get("color", "#CCCCCC")),
-            customdata=customdata,
-            hovertemplate=(
-                "<b>Sucursal:</b> %{customdata[1]}<br>" +
-                "<b>Mes:</b> %{customdata[0]}<br>" +
-                "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
-            )
-        ))
-
-    fig_lineas.update_layout(
-        #title="Evolución de Compras por Mes y Sucursal (2025)",
-        xaxis_title="Mes",
-        yaxis_title="Total Comprado",
-        xaxis=dict(tickangle=-45),
-        height=500,
-        margin=dict(t=60)
+    # Una traza por sucursal desde la matriz del pivote; mes y sucursal salen de x y del nombre de la traza
+    fig_lineas = figura(
+        trazas_lineas(
+            df_pivot,
+            color_map,
+            "<b>Sucursal:</b> %{fullData.name}<br>"
+            "<b>Mes:</b> %{x}<br>"
+            "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
+        ),
+        {
+            #"title": "Evolución de Compras por Mes y Sucursal (2025)",
+            "xaxis": {"title": titulo("Mes"), "tickangle": -45},
+            "yaxis": {"title": titulo("Total Comprado")},
+            "height": 500,
+            "margin": {"t": 60},
+        },
     )
-    
+
     # --- Espacio responsivo ---
     st.markdown("<div style='margin-top:1.5em; margin-bottom:1em'></div>", unsafe_allow_html=True)
     #st.markdown("<br><br>", unsafe_allow_html=True)
@@ -423,44 +402,40 @@ def mostrar(df_filtrado, config):
     st.markdown("<br><br>", unsafe_allow_html=True)
     st.markdown("### Compras por Sucursal, mes a mes")
 
+    compras_mes_sucursal = plan.suma(["mes_nombre", "sucursal"])
     for i, mes in enumerate(orden_meses_reversa_completa):
-        df_mes = df_filtrado[df_filtrado["mes_nombre"] == mes].copy()
-
-        # Agrupar solo por sucursal, sumando montos
-        df_mes = df_mes.groupby("sucursal", as_index=False).agg({"monto": "sum"})
+        # Montos del mes por sucursal, tomados de la misma suma que la tabla resumen
+        df_mes = compras_mes_sucursal.xs(mes, level="mes_nombre").reset_index()
         
         if df_mes["monto"].sum() == 0:
             continue
 
-        total_mes = df_mes["monto"].sum()
-        df_mes["porcentaje"] = df_mes["monto"] / total_mes * 100
-        df_mes["texto"] = df_mes.apply(
-            lambda row: f"${row['monto']:,.2f}<br>({row['porcentaje']:.1f}%)", axis=1
-        )
-        df_mes["custom_data"] = list(zip(df_mes["sucursal"], df_mes["monto"], df_mes["porcentaje"]))
-        color_map = {k: v["color"] for k, v in colores_sucursales.items()}
-
-        fig_mes = px.bar(
-            df_mes,
-            x="sucursal",
-            y="monto",
-            title=f"Compras en {mes}",
-            labels={"monto": "Total Comprado", "sucursal": "Sucursal"},
-            color="sucursal",
-            color_discrete_map=color_map,
-            text="texto",
-            custom_data=["sucursal", "monto", "porcentaje"]
-        )
+        def construir_mes():
+            total_mes = df_mes["monto"].sum()
+            df_mes["porcentaje"] = df_mes["monto"] / total_mes * 100
+            df_mes["texto"] = (
+                "$" + df_mes["monto"].map("{:,.2f}".format) + "<br>(" + df_mes["porcentaje"].map("{:.1f}".format) + "%)"
+            )
 
-        fig_mes.update_traces(
-            textposition='inside',
-            texttemplate='%{text}',
-            hovertemplate=(
-                "<b>Sucursal:</b> %{customdata[0]}<br>"
-                "<b>Monto:</b> $%{customdata[1]:,.2f}<br>"
-                "<b>Porcentaje:</b> %{customdata[2]:.1f}%<extra></extra>"
+            # Una sola traza, un color por barra, armada sin validación de graph_objects
+            return grafica_barras(
+                df_mes["sucursal"],
+                df_mes["monto"],
+                df_mes["sucursal"].map(color_map).fillna("#808080"),
+                df_mes["texto"],
+                (
+                    "<b>Sucursal:</b> %{customdata[0]}<br>"
+                    "<b>Monto:</b> $%{customdata[1]:,.2f}<br>"
+                    "<b>Porcentaje:</b> %{customdata[2]:.1f}%<extra></extra>"
+                ),
+                customdata=df_mes[["sucursal", "monto", "porcentaje"]].to_numpy(dtype=object),
+                texto_titulo=f"Compras en {mes}",
+                titulo_x="Sucursal",
+                titulo_y="Total Comprado"
             )
-        )
 
-        fig_mes.update_layout(showlegend=False)
+        fig_mes = figura_cacheada(
+            clave_figura("compra_sucursal", "compras_mes", df_filtrado, periodo, año_seleccionado, mes),
+            construir_mes
+        )
         st.plotly_chart(fig_mes, use_container_width=True, key=f"bar_{i}_{mes}")
\ No newline at end of file
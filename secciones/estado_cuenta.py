@@ -1,180 +1,83 @@
 import streamlit as st
+from functools import partial
 from datetime import datetime, timedelta
 import pandas as pd
-import json
-import io
-import xlsxwriter  
-import calendar
-import math
 import plotly.graph_objects as go
 import plotly.express as px
-from io import BytesIO
-from datetime import datetime, timedelta
 from utils.config import cargar_config
-from utils.api_utils import obtener_estado_cuenta_api
-from st_aggrid import AgGrid, GridOptionsBuilder, ColumnsAutoSizeMode, JsCode, AgGridTheme
-
+from utils.charts_utils import grafica_sunburst
+from utils.excel_utils import boton_excel, libro_excel
+from utils.historial_utils import cargar_resumen, guardar_corte
+from utils.proyeccion_utils import proyectar_salidas, holgura_credito, SimuladorCredito
+from utils.estado_cuenta_utils import (
+    cargar_modelo_estado_cuenta, tabla_cuentas, decimar_minmax, calendario_mes, proximas_fechas,
+    sunburst_por_fecha, sunburst_vencido, libro_deuda_vencida, clasificar_dias, colores_tramos,
+    etiquetas_tramos, js_color_tramo, CATEGORIAS_CALENDARIO, TRAMOS_VENCIMIENTO
+)
+from st_aggrid import AgGrid, GridOptionsBuilder, ColumnsAutoSizeMode, JsCode, AgGridTheme, DataReturnMode
+from utils.grid_utils import (
+    ESTADO_GRID_JS, EVENTOS_ESTADO_GRID, estado_grid, clave_estado_grid, aplicar_estado_grid, parametros_filtro
+)
 
-#================= CARGA DE DATOS ====================
-@st.cache_data(ttl=300)
-def cargar_estado_cuenta():
-    return obtener_estado_cuenta_api()
 
-@st.cache_data(ttl=600)
-def cargar_config():
-    with open("config_colores.json", "r", encoding="utf-8") as f:
-        return json.load(f)
-    
 # ================== CONFIGURACIÓN =====================
-
-config = cargar_config()
-divisiones = config["divisiones"]          # abreviaturas y códigos
-colores_sucursales = config["sucursales"]  # colores por sucursal
 CREDITO_MAX = 180_000_000                  # límite de crédito
+SUNBURSTS_POR_DEFECTO = 2                  # fechas de exigibilidad con anillo al abrir la vista
+MAX_SUNBURSTS = 6                          # tope de anillos por render
+HORIZONTE_SIMULADOR = 180                  # días que cubre el simulador de crédito
+PUNTOS_SVG_MAX = 5_000                     # arriba de esto la gráfica de líneas usa WebGL
+PUNTOS_LINEAS_MAX = 20_000                 # puntos totales de la gráfica de líneas antes de decimar
 # --- Tema ---
 modo = st.get_option("theme.base")  # 'dark' o 'light'
 template = "plotly_dark" if modo == "dark" else "plotly_white"
 
-# Función para obtener abreviatura de código
-def obtener_abreviatura(codigo):
-    for division, info in divisiones.items():
-        if codigo in info["codigos"]:
-            return info["abreviatura"]
-    return ""
-
-
-# Función para color según días de vencimiento
-def color_por_vencimiento(fecha_str, hoy):
-    try:
-        fecha = datetime.strptime(fecha_str, "%d/%m/%Y")
-        diff = (fecha - hoy).days
-        if diff < 0: return "red"
-        elif diff <= 30: return "orange"
-        elif diff <= 60: return "yellow"
-        else: return "green"
-    except:
-        return "transparent"
-    
-    
-def generar_cuenta_sucursal(df):
-    df = df.copy()
-    df["cuenta_sucursal"] = df["codigo"] + " (" + df["abreviatura"] + ") - " + df["sucursal"]
-    return df
-
-def calcular_vencimientos(df, hoy):
-    total_vencido = df[df["fecha_exigibilidad"] < hoy]["total"].sum()
-    por_vencer_30 = df[(df["fecha_exigibilidad"] >= hoy) & (df["fecha_exigibilidad"] <= hoy + timedelta(days=30))]["total"].sum()
-    por_vencer_90 = df[df["fecha_exigibilidad"] > hoy + timedelta(days=90)]["total"].sum()
-    return total_vencido, por_vencer_30, por_vencer_90
-
-def formatear_fechas(df, columna="fecha_exigibilidad"):
-    df = df.copy()
-    df[columna + "_str"] = df[columna].dt.strftime("%d/%m/%Y")
-    return df
-
 #=============================================
 def mostrar():
     st.title("Cuadro de estado de cuenta")
 
-    # Cargar configuración propia
-    config = cargar_config()
-    divisiones = config["divisiones"]
-    colores_sucursales = config["sucursales"]
-    
-    df_estado_cuenta, fecha_corte = cargar_estado_cuenta()
-    if df_estado_cuenta.empty or fecha_corte is None:
+    # Modelo preparado una vez por versión de datos y día, compartido por todos los bloques
+    # (y entre sesiones): es de solo lectura, las columnas nuevas van en copias
+    hoy = pd.Timestamp(datetime.today().date())
+    modelo = cargar_modelo_estado_cuenta(hoy)
+    if modelo is None:
         st.warning("No hay datos de estado de cuenta.")
         return
-    
-    st.markdown(f"### Estado de cuenta actualizado a {fecha_corte.strftime('%d/%m/%Y')}")
-    
-    # ------------------ Cargar configuración ------------------
-    with open("config_colores.json", "r", encoding="utf-8") as f:
-        config = json.load(f)
-
-    divisiones = config["divisiones"]
-    colores_sucursales = config["sucursales"]
-
-    # ------------------ Función para abreviatura ------------------
-    def obtener_abreviatura(codigo):
-        for division, info in divisiones.items():
-            if codigo in info["codigos"]:
-                return info["abreviatura"]
-        return ""
-    
-    # --- Tema ---
-    modo = st.get_option("theme.base")  # 'dark' o 'light'
-    template = "plotly_dark" if modo == "dark" else "plotly_white"
-
-    # ------------------ Preparar DataFrame base ------------------
-    df = df_estado_cuenta.copy()
 
-    df["fecha_exigibilidad"] = pd.to_datetime(df["fecha_exigibilidad"], errors="coerce")
-    df["codigo"] = df["codigo_6digitos"].astype(str)
-    df["total"] = pd.to_numeric(df["total"], errors="coerce").fillna(0)
-    df["abreviatura"] = df["codigo"].apply(obtener_abreviatura)
-    df["cuenta_sucursal"] = df["codigo"] + " (" + df["abreviatura"] + ") - " + df["sucursal"]
+    # Cada corte nuevo se agrega al historial local, fuera del modelo cacheado
+    guardar_corte(modelo["df"], modelo["fecha_corte"], modelo["version"])
 
-    meta = df[["cuenta_sucursal", "codigo", "sucursal", "abreviatura"]].drop_duplicates()
+    config = cargar_config()
+    colores_sucursales = config["sucursales"]
 
-    tabla = df.pivot_table(
-        index="fecha_exigibilidad",
-        columns="cuenta_sucursal",
-        values="total",
-        aggfunc="sum"
-    )
+    fecha_corte = modelo["fecha_corte"]
+    df_estado_cuenta = modelo["df"]
+    obligaciones = modelo["obligaciones"]   # deuda por (fecha, cuenta), sólo donde hay monto
+    meta = modelo["meta"]
+    fechas_ordenadas = modelo["fechas_ordenadas"]
 
-    fechas = sorted(df["fecha_exigibilidad"].dropna().unique())
-    tabla = tabla.reindex(fechas).fillna(0)
+    st.markdown(f"### Estado de cuenta actualizado a {fecha_corte.strftime('%d/%m/%Y')}")
 
-    df_completo = tabla.stack(dropna=False).reset_index(name="total")
-    df_completo = df_completo.rename(columns={"level_2": "cuenta_sucursal"})
-    df_completo = df_completo.merge(meta, on="cuenta_sucursal", how="left")
+    # ------------------------------------- TARJETAS DE CRÉDITO DISPONIBLE --------------------------------------------------
+    total_estado_cuenta = df_estado_cuenta["total"].sum()
+    credito_disponible = CREDITO_MAX - total_estado_cuenta
+    porcentaje_disponible = (credito_disponible / CREDITO_MAX) * 100
+    porcentaje_usado = (total_estado_cuenta / CREDITO_MAX) * 100
 
-    df_completo[["sucursal","codigo","abreviatura"]] = df_completo[["sucursal","codigo","abreviatura"]].fillna({
-        "sucursal":"Desconocida",
-        "codigo":"Desconocido",
-        "abreviatura":""
-    })
+    # Crear las tarjetas de crédito centradas
+    col1, col2, col3 = st.columns([1, 1, 1])
+    valores_credito = [
+        ("💰 Crédito disponible", f"${credito_disponible:,.2f}"),
+        ("📊 % Crédito disponible", f"{porcentaje_disponible:.2f}%"),
+        ("📈 % Crédito usado", f"{porcentaje_usado:.2f}%")
+    ]
 
-    df_completo["fecha_exigibilidad_str"] = df_completo["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
-    fechas_ordenadas = sorted(
-        df_completo["fecha_exigibilidad_str"].unique(),
-        key=lambda x: pd.to_datetime(x, format="%d/%m/%Y")
-    )
-    # ------------------------------------- TARJETAS DE CRÉDITO DISPONIBLE --------------------------------------------------
-    # Límite de crédito
-    CREDITO_MAX = 180_000_000
-
-    # Obtener los datos
-    df_estado_cuenta, fecha_corte = obtener_estado_cuenta_api()
-
-    if not df_estado_cuenta.empty:
-        total_estado_cuenta = df_estado_cuenta["total"].sum()
-        credito_disponible = CREDITO_MAX - total_estado_cuenta
-        porcentaje_disponible = (credito_disponible / CREDITO_MAX) * 100
-        porcentaje_usado = (total_estado_cuenta / CREDITO_MAX) * 100
-
-        # Crear las tarjetas de crédito centradas
-        col1, col2, col3 = st.columns([1, 1, 1])
-        valores_credito = [
-            ("💰 Crédito disponible", f"${credito_disponible:,.2f}"),
-            ("📊 % Crédito disponible", f"{porcentaje_disponible:.2f}%"),
-            ("📈 % Crédito usado", f"{porcentaje_usado:.2f}%")
-        ]
-
-        for col, (titulo, valor) in zip([col1, col2, col3], valores_credito):
-            col.metric(titulo, valor)
-    else:
-        st.info("No hay datos disponibles para mostrar el crédito.")
+    for col, (titulo, valor) in zip([col1, col2, col3], valores_credito):
+        col.metric(titulo, valor)
 
     st.markdown("<div class='spacer'></div>", unsafe_allow_html=True)
 
     # ----------------------------------------- TARJETAS DE VENCIMIENTO -----------------------------------------------------
-    df_estado_cuenta["fecha_exigibilidad"] = pd.to_datetime(df_estado_cuenta["fecha_exigibilidad"])
-    hoy = pd.to_datetime(datetime.today().date())
-
-    total_vencido = df_estado_cuenta[df_estado_cuenta["fecha_exigibilidad"] < hoy]["total"].sum()
+    total_vencido = modelo["vencido"]["total"]
     por_vencer_30 = df_estado_cuenta[
         (df_estado_cuenta["fecha_exigibilidad"] >= hoy) &
         (df_estado_cuenta["fecha_exigibilidad"] <= hoy + timedelta(days=30))
@@ -196,14 +99,11 @@ def mostrar():
 
     
     # --------------------------------------------- Indicador: próxima fecha de exigibilidad --------------------------------------------------------------------------------
-    hoy = datetime.today().date()
-    fechas_exig = pd.to_datetime(df_estado_cuenta["fecha_exigibilidad"]).dt.date
-
-    # Filtrar solo las fechas futuras o iguales a hoy
-    fechas_futuras = [f for f in fechas_exig if f >= hoy]
+    # Solo las fechas futuras o iguales a hoy
+    fechas_futuras = df_estado_cuenta.loc[df_estado_cuenta["fecha_exigibilidad"] >= hoy, "fecha_exigibilidad"]
 
-    if fechas_futuras:
-        proxima_fecha = min(fechas_futuras)
+    if not fechas_futuras.empty:
+        proxima_fecha = fechas_futuras.min()
         dias_faltan = (proxima_fecha - hoy).days
         st.markdown(
             f"""
@@ -243,22 +143,12 @@ def mostrar():
         )
 
     #------------------------------------------ TABLA: ESTADO DE CUENTA -----------------------------------------------------------------------
-    # --- Preparar fechas y pivote ---
-    df_estado_cuenta["fecha_exigibilidad"] = pd.to_datetime(df_estado_cuenta["fecha_exigibilidad"])
-    df_estado_cuenta["fecha_exigibilidad_str"] = df_estado_cuenta["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
-    hoy_str = pd.Timestamp(datetime.today().date()).strftime("%Y-%m-%d")  # para JS
-    def obtener_abreviatura(codigo):
-        for division, info in divisiones.items():
-            if codigo in info["codigos"]:
-                return info["abreviatura"]
-        return ""
-    # --- Enriquecer código con abreviatura ---
-    df_estado_cuenta["codigo"] = df_estado_cuenta["codigo_6digitos"].astype(str)
-    df_estado_cuenta["abreviatura"] = df_estado_cuenta["codigo"].apply(obtener_abreviatura)
-    df_estado_cuenta["codigo"] = df_estado_cuenta["codigo"] + " (" + df_estado_cuenta["abreviatura"] + ")"
+    # --- Pivote (el código ya viene como "300594 (AG)" en el modelo) ---
+    hoy_str = hoy.strftime("%Y-%m-%d")  # para JS
+    js_tramo = js_color_tramo()         # cortes y colores de TRAMOS_VENCIMIENTO para JS
 
     df_pivot = df_estado_cuenta.pivot_table(
-        index=["sucursal", "codigo"],  # 👈 aquí el cambio
+        index=["sucursal", "codigo_etiqueta"],
         columns="fecha_exigibilidad_str",
         values="total",
         aggfunc="sum",
@@ -300,9 +190,40 @@ def mostrar():
     }
     """)
 
+    # --- Estilo de la fila total anclada (línea superior según vencimiento) ---
+    # Se inyecta en el cellStyle de las columnas de fecha, que lo usa para la fila anclada
+    js_estilo_total = f"""
+    function estiloTotal(params) {{
+        const hoy = new Date('{hoy_str}');
+        let style = {{
+            color: 'white',
+            fontWeight: 'bold',
+            textAlign: 'left',
+            backgroundColor: '#0B083D',
+            borderTopStyle: 'solid',
+            borderTopWidth: '4px'
+        }};
+        
+        if(params.data && params.colDef.field !== 'codigo' && params.colDef.field !== 'sucursal' && params.value != null) {{
+            let fecha_parts = params.colDef.field.split('/');
+            if(fecha_parts.length === 3){{
+                let fecha_obj = new Date(fecha_parts[2], fecha_parts[1]-1, fecha_parts[0]);
+                let diffDias = Math.round((fecha_obj - hoy)/(1000*60*60*24));
+                style.borderTopColor = colorTramo(diffDias);
+            }}
+        }} else {{
+            style.borderTopColor = 'transparent';
+        }}
+        return style;
+    }}
+    """
+
     # --- Renderer dinámico con barra izquierda y línea inferior ---
     gradient_y_line_renderer = JsCode(f"""
     function(params) {{
+        {js_tramo}
+        {js_estilo_total}
+        if (params.node.rowPinned) return estiloTotal(params);
         const totalCol = '{ultima_col}';
         const hoy = new Date('{hoy_str}');
 
@@ -351,51 +272,6 @@ def mostrar():
     }}
     """)
 
-    # --- Renderer para fila total anclada (línea superior según vencimiento) ---
-    total_row_renderer = JsCode(f"""
-    function(params) {{
-        const hoy = new Date('{hoy_str}');
-        let style = {{
-            color: 'white',
-            fontWeight: 'bold',
-            textAlign: 'left',
-            backgroundColor: '#0B083D',
-            borderTopStyle: 'solid',
-            borderTopWidth: '4px'
-        }};
-        
-        if(params.data && params.colDef.field !== 'codigo' && params.colDef.field !== 'sucursal' && params.value != null) {{
-            let fecha_parts = params.colDef.field.split('/');
-            if(fecha_parts.length === 3){{
-                let fecha_obj = new Date(fecha_parts[2], fecha_parts[1]-1, fecha_parts[0]);
-                let diffDias = Math.round((fecha_obj - hoy)/(1000*60*60*24));
-                if(diffDias < 0) style.borderTopColor = 'red';
-                else if(diffDias <= 30) style.borderTopColor = 'orange';
-                else if(diffDias <= 60) style.borderTopColor = 'yellow';
-                else style.borderTopColor = 'green';
-            }}
-        }} else {{
-            style.borderTopColor = 'transparent';
-        }}
-        return style;
-    }}
-    """)
-
-    def color_por_vencimiento(fecha_str, hoy):
-        try:
-            fecha = datetime.strptime(fecha_str, "%d/%m/%Y")
-            diff = (fecha - hoy).days
-            if diff < 0:
-                return "red"
-            elif diff <= 30:
-                return "orange"
-            elif diff <= 60:
-                return "yellow"
-            else:
-                return "green"
-        except:
-            return "transparent"
-
     # --- Configuración inicial del grid ---
     columnas = list(data_sin_total.columns)
     if "codigo" in columnas and "sucursal" in columnas:
@@ -436,17 +312,13 @@ def mostrar():
     # --- Función JS para color de vencimiento en header ---
     header_vencimiento = JsCode(f"""
     function(params) {{
+        {js_tramo}
         const hoy = new Date('{hoy_str}');
         let fecha_parts = params.colDef.field.split('/');
         if(fecha_parts.length === 3){{
             let fecha_obj = new Date(fecha_parts[2], fecha_parts[1]-1, fecha_parts[0]);
             let diffDias = Math.round((fecha_obj - hoy)/(1000*60*60*24));
-            let color = 'transparent';
-            if(diffDias < 0) color='red';
-            else if(diffDias <= 30) color='orange';
-            else if(diffDias <= 60) color='yellow';
-            else color='green';
-            return {{borderBottom: '4px solid ' + color}};
+            return {{borderBottom: '4px solid ' + colorTramo(diffDias)}};
         }}
         return {{}};
     }}
@@ -458,8 +330,7 @@ def mostrar():
             minWidth=100,
             headerClass='header-left',
             headerStyle=header_vencimiento,   # línea en el header
-            cellStyle=gradient_y_line_renderer,  # degradado + barra vertical normal
-            #pinnedRowCellStyle=total_row_renderer,  # <- línea superior en fila total anclada
+            cellStyle=gradient_y_line_renderer,  # degradado; línea superior en la fila total anclada
             valueFormatter=value_formatter
         )
 
@@ -586,11 +457,13 @@ def mostrar():
         """)
     
     grid_options = gb.build()
-    hoy_py = datetime.today()
     total_row_styles = {}
 
-    for col in numeric_cols_sin_total:
-        color = color_por_vencimiento(col, hoy_py)
+    # Color del tramo de vencimiento de cada columna de fecha (todas en una pasada)
+    dias_columnas = (pd.to_datetime(pd.Index(numeric_cols_sin_total), format="%d/%m/%Y", errors="coerce") - hoy).days
+    colores_columnas = pd.Series(clasificar_dias(dias_columnas)).map(colores_tramos()).fillna("transparent")
+
+    for col, color in zip(numeric_cols_sin_total, colores_columnas):
         total_row_styles[col] = {
             "color": "white",
             "fontWeight": "bold",
@@ -638,63 +511,22 @@ def mostrar():
     )
 
     #--------------------- BOTON DE DESCARGA -----------
-    def to_excel(df):
-        import io
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='EstadoCuenta')
-        return output.getvalue()
-    
-    excel_data = to_excel(df_pivot)
-    st.download_button(
-        label="Descargar tabla en Excel",
-        data=excel_data,
-        file_name=f"estado_cuenta_{fecha_corte.strftime('%Y%m%d')}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # El libro se arma hasta que alguien lo descarga y queda cacheado por versión de datos
+    boton_excel(
+        "Descargar tabla en Excel",
+        f"estado_cuenta_{fecha_corte.strftime('%Y%m%d')}.xlsx",
+        ("estado_cuenta", modelo["version"]),
+        partial(libro_excel, df_pivot, "EstadoCuenta")
     )
 
     #----------------------------------------- TABLA DE FECHA DE VENCIMIENTO -------------------------------------------------------------------------------
 
-    hoy = datetime.today()
-
-    # --- Limpiar nombres de sucursal y códigos ---
-    df_estado_cuenta["sucursal"] = df_estado_cuenta["sucursal"].str.strip()
-    df_estado_cuenta["codigo_6digitos"] = df_estado_cuenta["codigo_6digitos"].astype(str).str.strip()
-
-    # --- Aplicar abreviaturas ---
-    df_estado_cuenta["sucursal_abrev"] = df_estado_cuenta["sucursal"].apply(
-        lambda x: config["sucursales"].get(x, {}).get("abreviatura", x)
-    )
-
-    def agregar_abrev_division(codigo):
-        for div, info in config["divisiones"].items():
-            if codigo in info["codigos"]:
-                return info['abreviatura']
-        return codigo
-
-    df_estado_cuenta["codigo_abrev"] = df_estado_cuenta["codigo_6digitos"].apply(agregar_abrev_division)
-
-    # --- Clasificar cada fila en bucket ---
-    def bucket_vencimiento(fecha, hoy):
-        diff = (fecha - hoy).days
-        if diff < 0:
-            return "Vencido"
-        elif diff <= 30:
-            return "0-30 dias"
-        elif diff <= 60:
-            return "31-60 dias"
-        elif diff <= 90:
-            return "61-90 dias"
-        else:
-            return "91+ dias"
-
-    df_estado_cuenta["bucket_venc"] = df_estado_cuenta["fecha_exigibilidad"].apply(lambda f: bucket_vencimiento(f, hoy))
-    df_estado_cuenta["codigo_original"] = df_estado_cuenta["codigo_6digitos"]
+    # Sucursal y código abreviados y tramo de cada fila vienen del modelo
 
     # --- Pivot usando sucursal_abrev y codigo_abrev ---
     df_pivot_bucket = df_estado_cuenta.pivot_table(
-        index=["sucursal_abrev", "codigo_abrev", "codigo_original"],
-        columns="bucket_venc",
+        index=["sucursal_abrev", "codigo_abrev", "codigo"],
+        columns="tramo",
         values="total",
         aggfunc="sum",
         fill_value=0,
@@ -703,7 +535,7 @@ def mostrar():
     )
 
     # --- Ordenar columnas ---
-    orden_buckets = ["Vencido", "0-30 dias", "31-60 dias", "61-90 dias", "91+ dias"]
+    orden_buckets = etiquetas_tramos()
     cols_presentes = [c for c in orden_buckets if c in df_pivot_bucket.columns]
     if "Total" in df_pivot_bucket.columns:
         cols_presentes.append("Total")
@@ -817,9 +649,9 @@ def mostrar():
     )
 
     # Buckets numéricos
-    for col in orden_buckets:
+    for i, col in enumerate(orden_buckets):
         if col in data_sin_total_bucket.columns:
-            header_class = f"header-{col.replace(' ', '').replace('+','')}"
+            header_class = f"header-tramo-{i}"
             gb.configure_column(
                 col,
                 minWidth=130,
@@ -840,11 +672,10 @@ def mostrar():
 
     # --- Custom CSS para AgGrid ---
     custom_css = {
-        ".header-Vencido": {"border-bottom": "4px solid red"},
-        ".header-0-30dias": {"border-bottom": "4px solid orange"},
-        ".header-31-60dias": {"border-bottom": "4px solid yellow"},
-        ".header-61-90dias": {"border-bottom": "4px solid lightgreen"},
-        ".header-91+dias": {"border-bottom": "4px solid green"},
+        **{
+            f".header-tramo-{i}": {"border-bottom": f"4px solid {color}"}
+            for i, (_, _, color) in enumerate(TRAMOS_VENCIMIENTO)
+        },
         ".header-total": {"border-bottom": "4px solid #0B083D"},
         ".ag-center-cols-container .ag-row": {"height": "20px", "line-height": "16px"},
         ".ag-pinned-left-cols-container .ag-row": {"height": "20px", "line-height": "16px"}
@@ -863,6 +694,7 @@ def mostrar():
     </div>
     """, unsafe_allow_html=True)
 
+    # El grid sólo regresa su filtro y orden (no las filas); la exportación los aplica aquí
     grid_response = AgGrid(
         data_sin_total_bucket,
         gridOptions=grid_options,
@@ -872,150 +704,59 @@ def mostrar():
         theme=AgGridTheme.ALPINE,
         fit_columns_on_grid_load=True,
         columns_auto_size_mode=ColumnsAutoSizeMode.FIT_CONTENTS,
-        enable_enterprise_modules=False
+        enable_enterprise_modules=False,
+        data_return_mode=DataReturnMode.CUSTOM,
+        custom_jscode_for_grid_return=ESTADO_GRID_JS,
+        update_on=EVENTOS_ESTADO_GRID,
+        key="grid-estado-cuenta-vencimiento"
     )
-
-    # --- Capturar la data filtrada/ordenada de AgGrid ---
-    df_filtrado = pd.DataFrame(grid_response["data"])
-
-    # --- Agregar la fila de totales al final ---
-    if not total_row_bucket.empty:
-        df_filtrado = pd.concat([df_filtrado, total_row_bucket], ignore_index=True)
-
-    # --- Función para exportar a Excel ---
-    def to_excel(df):
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Vencimiento")
-        return output.getvalue()
-
-    # --- Botón de descarga ---
-    st.download_button(
-        label="📥 Descargar tabla en Excel",
-        data=to_excel(df_filtrado),
-        file_name="estado_cuenta_vencimiento.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    filtros_grid, orden_grid = estado_grid(grid_response)
+
+    def excel_vencimiento(tabla, total, filtros, orden, params):
+        # Filas como las ve el usuario en el grid y la fila de totales al final
+        exportar = aplicar_estado_grid(tabla, filtros, orden, params)
+        if not total.empty:
+            exportar = pd.concat([exportar, total], ignore_index=True)
+        return libro_excel(exportar, "Vencimiento", index=False)
+
+    # --- Botón de descarga (filtro/orden del grid en la clave) ---
+    boton_excel(
+        "📥 Descargar tabla en Excel",
+        "estado_cuenta_vencimiento.xlsx",
+        ("vencimiento", modelo["version"], hoy, clave_estado_grid(filtros_grid, orden_grid)),
+        partial(
+            excel_vencimiento, data_sin_total_bucket, total_row_bucket, filtros_grid, orden_grid,
+            parametros_filtro(grid_options)
+        )
     )
 
     #----------------------------------- GRAFICO DE ANILLOS ------------------------------------------------------------------------------------------------------------------------
     st.markdown("### Distribución de la deuda según la fecha de exigibilidad")
-    # --- helper para formato moneda ---
-    def fmt(v):
-        try:
-            return f"${float(v):,.2f}"
-        except Exception:
-            return "$0.00"
-
-    # Asegura que estas columnas existan y tipos correctos
-    df_estado_cuenta["fecha_exigibilidad_str"] = df_estado_cuenta["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
-    df_estado_cuenta["codigo"] = df_estado_cuenta["codigo_6digitos"].astype(str)
-
-    fechas_ordenadas = sorted(
-        df_completo["fecha_exigibilidad_str"].unique(),
-        key=lambda x: pd.to_datetime(x, format="%d/%m/%Y")
+    # Sólo se dibujan las fechas elegidas (por defecto las próximas exigibilidades)
+    seleccion = st.multiselect(
+        "Fechas de exigibilidad a mostrar:",
+        fechas_ordenadas,
+        default=proximas_fechas(modelo["fechas"], hoy, SUNBURSTS_POR_DEFECTO),
+        max_selections=MAX_SUNBURSTS,
+        key="estado_cuenta_fechas_anillos"
     )
+    fechas_sunburst = [f for f in fechas_ordenadas if f in seleccion]   # en orden cronológico
+    nodos_por_fecha = sunburst_por_fecha(obligaciones, colores_sucursales)
 
     # Loop: 2 gráficos por fila
-    for i in range(0, len(fechas_ordenadas), 2):
+    for i in range(0, len(fechas_sunburst), 2):
         col1, col2 = st.columns(2)
         for j, col in enumerate([col1, col2]):
-            if i + j >= len(fechas_ordenadas):
+            if i + j >= len(fechas_sunburst):
                 break
 
-            fecha = fechas_ordenadas[i + j]
+            fecha = fechas_sunburst[i + j]
             # --- dataset de esa fecha ---
-            #df_fecha_raw = df_estado_cuenta[df_estado_cuenta["fecha_exigibilidad_str"] == fecha].copy()
-            df_grafico_base = df_completo.copy()
-            df_fecha_raw = df_completo[df_completo["fecha_exigibilidad_str"] == fecha].copy()
-
-            # MUY IMPORTANTE: agrupar por sucursal + cuenta para evitar duplicados
-            df_fecha = (
-                df_fecha_raw.groupby(["sucursal", "cuenta_sucursal", "codigo", "abreviatura"], as_index=False)["total"]
-                .sum()
-            )
-
-            # Totales por sucursal (para texto del nodo padre)
-            tot_por_suc = df_fecha.groupby("sucursal", as_index=False)["total"].sum().rename(columns={"total": "total_sucursal"})
-            map_tot_suc = dict(zip(tot_por_suc["sucursal"], tot_por_suc["total_sucursal"]))
-
-            # --- construir nodos: ids, parents, values, labels, colors, text, hover ---
-            ids, parents, values, labels, colors, texts, hovertexts = [], [], [], [], [], [], []
-
-            # Nodos de sucursal (padres)
-            for _, r in tot_por_suc.iterrows():
-                suc = r["sucursal"]
-                t_suc = r["total_sucursal"]
-                sid = f"S|{suc}"
-                ids.append(sid)
-                parents.append("")                  # raíz implícita
-                values.append(t_suc)                # branchvalues='total' y valor del padre = suma cuentas
-                labels.append(suc)
-                colors.append(colores_sucursales.get(suc, {}).get("color", "#808080"))
-                texts.append(fmt(t_suc))            # muestra total sucursal en el anillo interno
-                hovertexts.append(
-                    f"<b>Fecha:</b> {fecha}<br>"
-                    f"<b>Sucursal:</b> {suc}<br>"
-                    f"<b>Total Sucursal:</b> {fmt(t_suc)}"
-                )
-
-            # Nodos de cuenta (hijas)
-            # Orden estable por sucursal para consistencia visual
-            df_fecha = df_fecha.sort_values(["sucursal", "cuenta_sucursal"]).reset_index(drop=True)
-            for _, r in df_fecha.iterrows():
-                suc = r["sucursal"]
-                cuenta = r["cuenta_sucursal"]
-                monto = float(r["total"])
-                codigo = r["codigo"]
-                abrev = r["abreviatura"]
-                t_suc = map_tot_suc.get(suc, 0.0)
-
-                cid = f"A|{suc}|{cuenta}"
-                ids.append(cid)
-                parents.append(f"S|{suc}")
-                values.append(monto)
-                labels.append(cuenta)                      # etiqueta externa = cuenta (como querías)
-                colors.append(colores_sucursales.get(suc, {}).get("color", "#808080"))   # color por sucursal
-                texts.append(fmt(monto))                   # muestra monto cuenta en el anillo externo
-                hovertexts.append(
-                    f"<b>Fecha:</b> {fecha}<br>"
-                    f"<b>Código:</b> {codigo}<br>"
-                    f"<b>Sucursal:</b> {suc}<br>"
-                    f"<b>División:</b> {abrev}<br>"
-                    f"<b>Monto Cuenta:</b> {fmt(monto)}<br>"
-                    f"<b>Total Sucursal:</b> {fmt(t_suc)}"
-                )
-
-            # --- Sunburst GO: control total, sin customdata que se desordene ---
-            fig = go.Figure(
-                go.Sunburst(
-                    ids=ids,
-                    parents=parents,
-                    values=values,
-                    labels=labels,
-                    text=texts,                 # monto visible en cada porción
-                    textinfo="label+text",
-                    insidetextorientation="horizontal",
-                    marker=dict(
-                        colors=colors,
-                        line=dict(color="white", width=1)
-                    ),
-                    branchvalues="total",
-                    hovertext=hovertexts,
-                    hovertemplate="%{hovertext}<extra></extra>"
-                )
-            )
+            # Nodos de la fecha (se arman todas las fechas juntas una vez por versión de datos)
+            nodos = nodos_por_fecha[fecha]
 
-            fig.update_layout(
-                title={
-                    'text': f"Distribución por cuenta - {fecha}",
-                    'x': 0.5,            # centrado
-                    'xanchor': 'center', # ancla en el centro
-                    'yanchor': 'top'     # opcional: ancla arriba
-                },
-                title_font=dict(size=18, color="#E1E1EC", family="Arial"),
-                template="plotly_white",
-                margin=dict(t=60, l=0, r=0, b=0)
-            )
+            # --- Sunburst armado desde los nodos, sin validación de graph_objects ---
+            fig = grafica_sunburst(nodos, f"Distribución por cuenta - {fecha}")
 
             col.plotly_chart(fig, use_container_width=True)
             st.markdown("<br><br>", unsafe_allow_html=True)
@@ -1023,134 +764,23 @@ def mostrar():
     #----------------------------------- GRAFICO DE ANILLOS: SOLO VENCIDAS -----------------------------------------------------------------------------------
     st.markdown("### Distribución de la deuda vencida (todas las fechas)")
 
-    # --- helper para formato moneda ---
-    def fmt(v):
-        try:
-            return f"${float(v):,.2f}"
-        except Exception:
-            return "$0.00"
-
-    # Fecha de hoy para detectar vencidas
-    hoy = pd.Timestamp.today().normalize()
+    vencido = modelo["vencido"]   # subtotales por sucursal y cuenta, armados con el modelo
 
-    # Filtrar solo fechas vencidas
-    df_vencidas = df_completo[df_completo["fecha_exigibilidad"] < hoy].copy()
-
-    if not df_vencidas.empty:
-        # Agrupar por sucursal + cuenta
-        df_vencidas_group = (
-            df_vencidas.groupby(["sucursal", "cuenta_sucursal", "codigo", "abreviatura"], as_index=False)["total"]
-            .sum()
-        )
-
-        # Totales por sucursal (para nodos padres)
-        tot_por_suc = (
-            df_vencidas_group.groupby("sucursal", as_index=False)["total"].sum()
-            .rename(columns={"total": "total_sucursal"})
+    if not vencido["cuentas"].empty:
+        st.caption(
+            f"${vencido['total']:,.2f} vencidos en {len(vencido['cuentas'])} cuentas "
+            f"de {len(vencido['sucursales'])} sucursales."
         )
-        map_tot_suc = dict(zip(tot_por_suc["sucursal"], tot_por_suc["total_sucursal"]))
-
-        # --- 🚀 Construcción de tabla para exportar ---
-        export_rows = []
-        for _, row in df_vencidas_group.iterrows():
-            suc = row["sucursal"]
-            cuenta = row["cuenta_sucursal"]
-            monto_cuenta = row["total"]
-            monto_sucursal = map_tot_suc.get(suc, 0.0)
-            export_rows.append([suc, monto_sucursal, cuenta, monto_cuenta])
-
-        df_export = pd.DataFrame(export_rows, columns=["Sucursal", "Monto sucursal", "Cuenta sucursal", "Monto cuenta"])
-
-        # Crear Excel en memoria
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df_export.to_excel(writer, index=False, sheet_name="Deuda vencida")
-            workbook  = writer.book
-            worksheet = writer.sheets["Deuda vencida"]
-
-            # Combinar celdas de sucursal y monto sucursal
-            row_start = 1  # ExcelWriter escribe encabezados en la fila 0
-            for suc in df_export["Sucursal"].unique():
-                df_suc = df_export[df_export["Sucursal"] == suc]
-                if len(df_suc) > 1:
-                    # Columna 0 = Sucursal, Columna 1 = Monto sucursal
-                    worksheet.merge_range(row_start, 0, row_start + len(df_suc) - 1, 0, suc)
-                    worksheet.merge_range(row_start, 1, row_start + len(df_suc) - 1, 1, df_suc["Monto sucursal"].iloc[0])
-                row_start += len(df_suc)
-
-        buffer.seek(0)
-
-        # Botón de descarga
-        st.download_button(
-            label="📥 Descargar tabla en Excel",
-            data=buffer,
-            file_name="deuda_vencida.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        boton_excel(
+            "📥 Descargar tabla en Excel",
+            "deuda_vencida.xlsx",
+            ("deuda_vencida", modelo["version"], hoy),
+            partial(libro_deuda_vencida, vencido)
         )
 
-        # --- Sunburst GO ---
-        ids, parents, values, labels, colors, texts, hovertexts = [], [], [], [], [], [], []
-
-        # Nodos de sucursal
-        for _, r in tot_por_suc.iterrows():
-            suc = r["sucursal"]
-            t_suc = r["total_sucursal"]
-            sid = f"S|{suc}"
-            ids.append(sid)
-            parents.append("")
-            values.append(t_suc)
-            labels.append(suc)
-            colors.append(colores_sucursales.get(suc, {}).get("color", "#808080"))
-            texts.append(fmt(t_suc))
-            hovertexts.append(f"<b>Sucursal:</b> {suc}<br><b>Total vencido sucursal:</b> {fmt(t_suc)}")
-
-        # Nodos de cuenta
-        df_vencidas_group = df_vencidas_group.sort_values(["sucursal", "cuenta_sucursal"]).reset_index(drop=True)
-        for _, r in df_vencidas_group.iterrows():
-            suc = r["sucursal"]
-            cuenta = r["cuenta_sucursal"]
-            monto = float(r["total"])
-            codigo = r["codigo"]
-            abrev = r["abreviatura"]
-            t_suc = map_tot_suc.get(suc, 0.0)
-
-            cid = f"A|{suc}|{cuenta}"
-            ids.append(cid)
-            parents.append(f"S|{suc}")
-            values.append(monto)
-            labels.append(cuenta)
-            colors.append(colores_sucursales.get(suc, {}).get("color", "#808080"))
-            texts.append(fmt(monto))
-            hovertexts.append(
-                f"<b>Sucursal:</b> {suc}<br>"
-                f"<b>Código:</b> {codigo}<br>"
-                f"<b>División:</b> {abrev}<br>"
-                f"<b>Monto vencido:</b> {fmt(monto)}<br>"
-                f"<b>Total sucursal:</b> {fmt(t_suc)}"
-            )
-
-        fig_vencidas = go.Figure(
-            go.Sunburst(
-                ids=ids,
-                parents=parents,
-                values=values,
-                labels=labels,
-                text=texts,
-                textinfo="label+text",
-                insidetextorientation="horizontal",
-                marker=dict(colors=colors, line=dict(color="white", width=1)),
-                branchvalues="total",
-                hovertext=hovertexts,
-                hovertemplate="%{hovertext}<extra></extra>"
-            )
-        )
-
-        fig_vencidas.update_layout(
-            title={"text": "Monto vencido", "x": 0.5, "xanchor": "center", "yanchor": "top"},
-            title_font=dict(size=18, color="#E1E1EC", family="Arial"),
-            template="plotly_white",
-            margin=dict(t=60, l=0, r=0, b=0)
-        )
+        # --- Sunburst ---
+        nodos = sunburst_vencido(vencido, colores_sucursales)
+        fig_vencidas = grafica_sunburst(nodos, "Monto vencido")
 
         st.plotly_chart(fig_vencidas, use_container_width=True)
 
@@ -1160,49 +790,28 @@ def mostrar():
     #------------------------------------------------------- CALENDARIO ------------------------------------------------------------------------------------------------------------------
     st.markdown("### Calendario de fechas de exigibilidad")
     # --- Leyenda de colores arriba ---
-    st.markdown("""
+    leyenda_tramos = "\n    ".join(
+        f'<div><span style="background-color:{color}; padding:4px 12px; border-radius:4px; color:black;">{etiqueta}</span></div>'
+        for etiqueta, color in colores_tramos().items()
+    )
+    st.markdown(f"""
     <div style="display:flex; gap:20px; flex-wrap:wrap; font-size:14px; color:black;">
-    <div><span style="background-color:#ff6666; padding:4px 12px; border-radius:4px; color:black;">Vencido</span></div>
-    <div><span style="background-color:#ffcc66; padding:4px 12px; border-radius:4px; color:black;">0-30 días</span></div>
-    <div><span style="background-color:#ffff99; padding:4px 12px; border-radius:4px; color:black;">31-60 días</span></div>
-    <div><span style="background-color:#ccff99; padding:4px 12px; border-radius:4px; color:black;">61-90 días</span></div>
-    <div><span style="background-color:#99ff99; padding:4px 12px; border-radius:4px; color:black;">91+ días</span></div>
+    {leyenda_tramos}
     <div><span style="background-color:#66b3ff; padding:4px 12px; border-radius:4px; color:black;">Día actual</span></div>
     </div>
     """, unsafe_allow_html=True)
-    # --- Datos ---
-    hoy = datetime.today()
-    df_estado_cuenta["fecha_exigibilidad"] = pd.to_datetime(df_estado_cuenta["fecha_exigibilidad"])
-
     # --- Colores según tema ---
     line_color = "#ffffff" if modo == "dark" else "#000000"   # bordes de las celdas
     day_text_color = "#ffffff" if modo == "dark" else "#000000"  # números de los días
     bg_color = "#ffffff" if modo == "dark" else "#0e1117"  # s
     text_color = "#ffffff" if modo == "dark" else "#000000"
 
-    def clasificar_estado(fecha, hoy):
-        diff = (fecha - hoy).days
-        if diff < 0:
-            return "Vencido"
-        elif diff <= 30:
-            return "0-30 días"
-        elif diff <= 60:
-            return "31-60 días"
-        elif diff <= 90:
-            return "61-90 días"
-        else:
-            return "91+ días"
-
-    df_estado_cuenta["estado"] = df_estado_cuenta["fecha_exigibilidad"].apply(lambda f: clasificar_estado(f, hoy))
-
-    color_map = {
-        "Vencido": "#ff6666",
-        "0-30 días": "#ffcc66",
-        "31-60 días": "#ffff99",
-        "61-90 días": "#ccff99",
-        "91+ días": "#99ff99",
-        None: "#ffffff"
-    }
+    # Escala de colores discreta: una banda por categoría (tramos, sin exigibilidad y día actual)
+    colores_cal = [colores_tramos()[t] for t in etiquetas_tramos()] + ["#ffffff", "#66b3ff"]
+    n_cat = len(CATEGORIAS_CALENDARIO)
+    escala_cal = []
+    for i, color in enumerate(colores_cal):
+        escala_cal += [[i / n_cat, color], [(i + 1) / n_cat, color]]
 
     # --- Meses ---
     fecha_min = df_estado_cuenta["fecha_exigibilidad"].min().replace(day=1)
@@ -1211,159 +820,66 @@ def mostrar():
     meses_es = ["Enero","Febrero","Marzo","Abril","Mayo","Junio",
                 "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"]
 
-    # --- Columnas por fila ---
-    cols_per_row = 4
-    total_rows = math.ceil(len(meses)/cols_per_row)
-    row_cols = []
-    for i in range(total_rows):
-        row_cols.append(st.columns(cols_per_row))
-
     # --- Columnas para todos los meses en una fila ---
     cols = st.columns(len(meses))
 
     for idx, m in enumerate(meses):
         with cols[idx]:
-            cal = calendar.Calendar(firstweekday=0)
-            month_matrix = cal.monthdatescalendar(m.year, m.month)
-
-            fig = go.Figure()
-
-            # Estados presentes en el mes
-            dias_mes = df_estado_cuenta[df_estado_cuenta["fecha_exigibilidad"].dt.month == m.month]
-            estados_presentes = dias_mes["estado"].unique()
-            leyenda = [(estado, color_map[estado]) for estado in estados_presentes]
-
-            # Dibujar celdas de cada día
-            for week_idx, week in enumerate(month_matrix):
-                for day_idx, day in enumerate(week):
-                    if day.month == m.month:
-                        estado = df_estado_cuenta.loc[df_estado_cuenta["fecha_exigibilidad"].dt.date == day, "estado"]
-                        estado = estado.values[0] if len(estado) > 0 else None
-                        color = color_map[estado]
-
-                        if day == hoy.date():
-                            color = "#66b3ff"   # Azul especial para día actual
-
-                        x0, x1 = day_idx, day_idx + 1
-                        y0, y1 = -week_idx, -week_idx + 1
-
-                        fig.add_shape(
-                            type="rect",
-                            x0=x0, x1=x1, y0=y0, y1=y1,
-                            line=dict(color=line_color, width=1),   # antes "black"
-                            fillcolor=color
-                        )
-
-                        fig.add_annotation(
-                            x=(x0 + x1)/2,
-                            y=(y0 + y1)/2,
-                            text=str(day.day),
-                            showarrow=False,
-                            font=dict(size=12, color=day_text_color)   # antes sin color
-                        )
-
-            # Nombre del mes (más separado del calendario)
-            fig.add_annotation(
-                x=3.5,
-                y=2.9,
-                text=f"{meses_es[m.month-1]} {m.year}",
-                showarrow=False,
-                font=dict(size=14)
-            )
+            # Un heatmap por mes: cada celda es un día, su color sale del índice fecha -> tramo
+            z, dias, fechas_celda, leyenda = calendario_mes(m, modelo["tramo_por_fecha"], hoy)
 
-            # Nombres de los días
-            for i, day_name in enumerate(["Lun","Mar","Mié","Jue","Vie","Sáb","Dom"]):
-                fig.add_annotation(
-                    x=i + 0.5,
-                    y=1.6,
-                    text=day_name,
-                    showarrow=False,
-                    font=dict(size=10)
+            fig = go.Figure(
+                go.Heatmap(
+                    z=z,
+                    x=["Lun","Mar","Mié","Jue","Vie","Sáb","Dom"],
+                    text=dias,
+                    texttemplate="%{text}",
+                    textfont=dict(size=12, color=day_text_color),
+                    hovertext=fechas_celda,
+                    hovertemplate="%{hovertext}<extra></extra>",
+                    colorscale=escala_cal,
+                    zmin=-0.5,
+                    zmax=n_cat - 0.5,
+                    showscale=False,
+                    xgap=1,
+                    ygap=1
                 )
+            )
 
-            # Ejes sin ticks ni controles, escala cuadrada
-            fig.update_xaxes(showgrid=False, zeroline=False, showticklabels=False, range=[0,7])
-            fig.update_yaxes(showgrid=False, zeroline=False, showticklabels=False, range=[-6,3], scaleanchor="x")
+            # Ejes sin controles, escala cuadrada; días de la semana arriba
+            fig.update_xaxes(showgrid=False, zeroline=False, side="top", tickfont=dict(size=10), fixedrange=True)
+            fig.update_yaxes(showgrid=False, zeroline=False, showticklabels=False, autorange="reversed",
+                             scaleanchor="x", fixedrange=True)
+
+            # Leyenda de los tramos presentes en el mes (una sola anotación)
+            texto_leyenda = "  ".join(
+                f"<span style='color:{colores_tramos()[t]}'>■</span> {t}" for t in leyenda
+            )
 
             fig.update_layout(
                 template=template,
+                title=dict(text=f"{meses_es[m.month-1]} {m.year}", x=0.5, xanchor="center", font=dict(size=14)),
                 paper_bgcolor=bg_color,
-                plot_bgcolor=bg_color,
-                margin=dict(l=10, r=10, t=6, b=8),
+                plot_bgcolor=line_color,
+                margin=dict(l=10, r=10, t=60, b=40),
                 height=400,
                 autosize=True,
                 dragmode=False,
-                legend=dict(
-                    orientation="h",
-                    yanchor="top",
-                    y=-0.15,
-                    xanchor="center",
-                    x=0.5,
-                    font=dict(size=12, color=text_color),
-                    bgcolor=bg_color,
-                )
+                annotations=[dict(
+                    text=texto_leyenda, x=0.5, y=-0.02, xref="paper", yref="paper",
+                    xanchor="center", yanchor="top", showarrow=False, font=dict(size=9, color=text_color)
+                )] if leyenda else []
             )
 
-            # --- Leyenda centrada debajo del calendario ---
-            leyenda_y = -5.5
-            if leyenda:
-                total_width = len(leyenda) * 1.2
-                start_x = (7 - total_width)/2
-                for i, (estado, color) in enumerate(leyenda):
-                    # Cuadrito
-                    x0 = start_x + i*1.2
-                    x1 = x0 + 0.5
-                    fig.add_shape(
-                        type="rect",
-                        x0=x0, x1=x1,
-                        y0=leyenda_y, y1=leyenda_y+0.3,
-                        fillcolor=color,
-                        line=dict(color="black")
-                    )
-                    # Texto al lado del cuadrito
-                    fig.add_annotation(
-                        x=x1 + 0.1,
-                        y=leyenda_y + 0.15,
-                        text=estado,
-                        showarrow=False,
-                        font=dict(size=9),
-                        xanchor="left",
-                        yanchor="middle"
-                    )
-
             # --- Mostrar gráfico sin barra de herramientas ---
             st.plotly_chart(fig, use_container_width=False, config={'displayModeBar': False})
 
     # --------------------------------- Gráfico: montos por fecha de exigibilidad ---------------------------------------------------------------------------------------
-    # --- Preparación de datos ---
-    hoy = pd.to_datetime("today").normalize()
-
-    df_vencimientos = (
-        df_estado_cuenta.copy()
-    )
-
-    # Normalizamos la fecha al primer día del mes (para agrupar por mes)
-    df_vencimientos["mes"] = df_vencimientos["fecha_exigibilidad"].dt.to_period("M").dt.to_timestamp()
-
-    # Clasificamos según el rango de días
-    df_vencimientos["dias_diferencia"] = (df_vencimientos["fecha_exigibilidad"] - hoy).dt.days
-
-    def clasificar(dias):
-        if dias < 0:
-            return "Vencido"
-        elif dias <= 60:
-            return "≤ 60 días"
-        elif dias <= 90:
-            return "61–90 días"
-        else:
-            return "> 90 días"
-
-    # --- Agrupamos por mes y categoría conservando fecha exacta ---
-    df_vencimientos["categoria"] = df_vencimientos["dias_diferencia"].apply(clasificar)
-    df_vencimientos["fecha_str"] = df_vencimientos["fecha_exigibilidad"].dt.strftime("%d-%m-%Y")
+    # --- Preparación de datos (mes, días a la exigibilidad y tramo vienen del modelo) ---
+    df_vencimientos = df_estado_cuenta
 
     df_agrupado = (
-        df_vencimientos.groupby(["mes", "categoria"])  # agrupamos
+        df_vencimientos.groupby(["mes", "tramo"])  # agrupamos
         .agg({
             "total": "sum",
             "fecha_str": lambda x: ", ".join(sorted(set(x)))  # guardamos fechas únicas del mes
@@ -1372,23 +888,19 @@ def mostrar():
     )
 
     # --- Gráfico ---
-    colores = {
-        "Vencido": "#ff4d4d",
-        "≤ 60 días": "#ffd633",
-        "61–90 días": "#66cc66",
-        "> 90 días": "#b3b3b3"
-    }
+    colores = colores_tramos()
 
     # --- Gráfico ---
     fig_venc = px.bar(
         df_agrupado,
         x="mes",
         y="total",
-        color="categoria",
+        color="tramo",
         color_discrete_map=colores,
+        category_orders={"tramo": etiquetas_tramos()},
         text="total",
-        custom_data=["fecha_str", "categoria"],  # 👈 agregamos customdata
-        labels={"mes": "Mes de exigibilidad", "total": "Monto total", "categoria": "Estado"},
+        custom_data=["fecha_str", "tramo"],  # 👈 agregamos customdata
+        labels={"mes": "Mes de exigibilidad", "total": "Monto total", "tramo": "Estado"},
         title="📊 Montos a vencer agrupados por mes"
     )
 
@@ -1417,25 +929,20 @@ def mostrar():
     #----------------------------------
     # --- Agrupamos por categoría (para el pastel) ---
     df_pastel = (
-        df_vencimientos.groupby("categoria")["total"]
+        df_vencimientos.groupby("tramo")["total"]
         .sum()
         .reset_index()
     )
 
     # --- Colores ---
-    colores = {
-        "Vencido": "#ff4d4d",
-        "≤ 60 días": "#ffd633",
-        "61–90 días": "#66cc66",
-        "> 90 días": "#b3b3b3"
-    }
+    colores = colores_tramos()
 
     # --- Gráfico de pastel ---
     fig_pie = px.pie(
         df_pastel,
-        names="categoria",
+        names="tramo",
         values="total",
-        color="categoria",
+        color="tramo",
         color_discrete_map=colores,
         hole=0.4,  # 👈 si quieres tipo "dona"
     )
@@ -1462,51 +969,8 @@ def mostrar():
 
 
     #-------------------------------------- GRAFICO DE LÍNEAS DEL ESTADO DE CUENTA -----------------------------------------------------------
-    # ------------------ Cargar configuración de colores y divisiones ------------------
     st.markdown("### Gráfico del comportamiento de la deuda según las fechas de exigibilidad")
-    with open("config_colores.json", "r", encoding="utf-8") as f:
-        config = json.load(f)
-
-    divisiones = config["divisiones"]
-    colores_sucursales = config["sucursales"]
 
-    # ------------------ Función para abreviatura ------------------
-    def obtener_abreviatura(codigo):
-        for division, info in divisiones.items():
-            if codigo in info["codigos"]:
-                return info["abreviatura"]
-        return ""
-
-    # ------------------ Preparar DataFrame base ------------------
-    df = df_estado_cuenta.copy()
-    df["fecha_exigibilidad"] = pd.to_datetime(df["fecha_exigibilidad"], errors="coerce")
-    df["codigo"] = df["codigo_6digitos"].astype(str)
-    df["total"] = pd.to_numeric(df["total"], errors="coerce").fillna(0)
-    df["abreviatura"] = df["codigo"].apply(obtener_abreviatura)
-    df["cuenta_sucursal"] = df["codigo"] + " (" + df["abreviatura"] + ") - " + df["sucursal"]
-
-    meta = df[["cuenta_sucursal", "codigo", "sucursal", "abreviatura"]].drop_duplicates()
-
-    # ------------------ Construir universo de fechas y rellenar huecos a 0 ------------------
-    tabla = df.pivot_table(
-        index="fecha_exigibilidad",
-        columns="cuenta_sucursal",
-        values="total",
-        aggfunc="sum"
-    )
-    fechas = sorted(df["fecha_exigibilidad"].dropna().unique())
-    tabla = tabla.reindex(fechas).fillna(0)
-    df_completo = tabla.stack(dropna=False).reset_index(name="total").rename(columns={"level_2": "cuenta_sucursal"})
-    df_completo = df_completo.merge(meta, on="cuenta_sucursal", how="left")
-    df_completo[["sucursal","codigo","abreviatura"]] = df_completo[["sucursal","codigo","abreviatura"]].fillna({
-        "sucursal":"Desconocida",
-        "codigo":"Desconocido",
-        "abreviatura":""
-    })
-    df_completo["fecha_exigibilidad_str"] = df_completo["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
-    fechas_ordenadas = sorted(df_completo["fecha_exigibilidad_str"].unique(),
-                            key=lambda x: pd.to_datetime(x, format="%d/%m/%Y"))
-    
     # ------------------ Funciones auxiliares ------------------
     def get_color(suc):
         if suc == "Todas":
@@ -1519,7 +983,7 @@ def mostrar():
         return colores_sucursales.get(suc, {}).get("abreviatura", suc[:3])
 
     # ------------------ Selector de sucursales ------------------
-    sucursales_disponibles = ["Todas"] + sorted(df_completo["sucursal"].dropna().unique().tolist())
+    sucursales_disponibles = ["Todas"] + sorted(meta["sucursal"].dropna().unique().tolist())
     sucursales_seleccionadas = st.multiselect(
         "Selecciona sucursales a mostrar:",
         sucursales_disponibles,
@@ -1545,47 +1009,273 @@ def mostrar():
 
     st.markdown(css, unsafe_allow_html=True)
 
-    # ------------------ Filtrar el DataFrame según selección ------------------
+    # ------------------ Serie densa (huecos en 0) sólo de las cuentas seleccionadas ------------------
     if "Todas" in sucursales_seleccionadas:
-        df_filtrado = df_completo.copy()
+        cuentas_sel = meta
     else:
-        df_filtrado = df_completo[df_completo["sucursal"].isin(sucursales_seleccionadas)]
-
-    # ------------------ Colores por cuenta para el gráfico ------------------
-    color_cuentas = {
-        row["cuenta_sucursal"]: colores_sucursales.get(row["sucursal"], {}).get("color", "#808080")
-        for _, row in meta.iterrows()
-    }
+        cuentas_sel = meta[meta["sucursal"].isin(sucursales_seleccionadas)]
+    cuentas_sel = cuentas_sel.drop_duplicates("cuenta_sucursal").set_index("cuenta_sucursal")
+    tabla = tabla_cuentas(obligaciones, modelo["fechas"], cuentas_sel.index)
+    cuentas_sel = cuentas_sel.loc[tabla.columns]
+
+    # ------------------ Presupuesto de puntos: WebGL y decimado ------------------
+    # Con muchas cuentas o fechas las trazas SVG vuelven lenta la página; arriba de PUNTOS_SVG_MAX
+    # se dibuja con WebGL y cada cuenta se reduce (mínimo y máximo por cubeta) para no pasar de
+    # PUNTOS_LINEAS_MAX puntos en total
+    valores = tabla.to_numpy()
+    fechas_linea = tabla.index
+    puntos = valores.size
+    traza = go.Scattergl if puntos > PUNTOS_SVG_MAX else go.Scatter
+    indices = decimar_minmax(valores, max(PUNTOS_LINEAS_MAX // max(len(tabla.columns), 1), 2))
+
+    color_cuentas = cuentas_sel["sucursal"].map(lambda suc: colores_sucursales.get(suc, {}).get("color", "#808080"))
 
     # ------------------ Gráfico de líneas ------------------
-    fig = px.line(
-        df_filtrado,
-        x="fecha_exigibilidad_str",
-        y="total",
-        color="cuenta_sucursal",
-        color_discrete_map=color_cuentas,
-        custom_data=["sucursal", "codigo", "abreviatura"]
-    )
-
-    fig.update_traces(
-        mode="lines+markers",
-        marker=dict(size=6, symbol="circle"),
-        connectgaps=False,
-        hovertemplate=(
-            "<b>Fecha:</b> %{x}<br>"
-            "<b>Código:</b> %{customdata[1]}<br>"
-            "<b>Sucursal:</b> %{customdata[0]}<br>"
-            "<b>División:</b> %{customdata[2]}<br>"
-            "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
-        )
-    )
+    fig = go.Figure()
+    etiquetas = zip(cuentas_sel.index, cuentas_sel["codigo"], cuentas_sel["sucursal"], cuentas_sel["abreviatura"])
+    for j, (cuenta, codigo, sucursal, abreviatura) in enumerate(etiquetas):
+        filas = slice(None) if indices is None else indices[j]
+        fig.add_trace(traza(
+            x=fechas_linea[filas],
+            y=valores[filas, j],
+            name=cuenta,
+            legendgroup=cuenta,
+            mode="lines+markers" if indices is None else "lines",
+            marker=dict(size=6, symbol="circle", color=color_cuentas[cuenta]),
+            line=dict(color=color_cuentas[cuenta]),
+            connectgaps=False,
+            # Las etiquetas son fijas por cuenta: van en la plantilla y no como customdata por punto
+            hovertemplate=(
+                "<b>Fecha:</b> %{x|%d/%m/%Y}<br>"
+                f"<b>Código:</b> {codigo}<br>"
+                f"<b>Sucursal:</b> {sucursal}<br>"
+                f"<b>División:</b> {abreviatura}<br>"
+                "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
+            )
+        ))
 
     fig.update_layout(
         xaxis_title="Fecha de exigibilidad",
         yaxis_title="Monto",
+        xaxis=dict(type="date", tickformat="%d/%m/%Y"),
+        legend_title_text="cuenta_sucursal",
         hovermode="closest",
         template="plotly_white",
         margin=dict(t=20, b=20)
     )
 
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig, use_container_width=True)
+    if indices is not None:
+        st.caption(
+            f"Vista reducida: {sum(len(i) for i in indices):,} de {puntos:,} puntos "
+            "(se conservan el mínimo y el máximo de cada tramo de fechas)."
+        )
+    #-------------------------------------- HISTORIAL DE CORTES -----------------------------------------------------------
+    st.markdown("### Historial de cortes del estado de cuenta")
+    historial = cargar_resumen()   # historial local, un renglón por corte y sucursal
+
+    if historial["fecha_corte"].nunique() < 2:
+        st.info("El historial se arma con cada corte nuevo; aún no hay cortes suficientes para mostrar tendencias.")
+    else:
+        # --- Uso de crédito contra CREDITO_MAX ---
+        uso = historial.groupby("fecha_corte", as_index=False)[["total", "vencido"]].sum()
+        uso["porcentaje_usado"] = uso["total"] / CREDITO_MAX * 100
+
+        fig_uso = px.line(
+            uso,
+            x="fecha_corte",
+            y="porcentaje_usado",
+            markers=True,
+            custom_data=["total", "vencido"],
+            labels={"fecha_corte": "Fecha de corte", "porcentaje_usado": "% crédito usado"},
+            title="📈 Uso del crédito por fecha de corte"
+        )
+        fig_uso.update_traces(
+            hovertemplate=(
+                "<b>Corte:</b> %{x|%d/%m/%Y}<br>"
+                "<b>% usado:</b> %{y:.2f}%<br>"
+                "<b>Deuda:</b> $%{customdata[0]:,.2f}<br>"
+                "<b>Vencido:</b> $%{customdata[1]:,.2f}<extra></extra>"
+            )
+        )
+        fig_uso.add_hline(y=100, line_dash="dash", line_color="#ff4d4d", annotation_text="Límite de crédito")
+        fig_uso.update_layout(template="plotly_white", height=400, margin=dict(t=60, b=20))
+        st.plotly_chart(fig_uso, use_container_width=True)
+
+        # --- Deuda vencida por sucursal ---
+        fig_hist_vencido = px.line(
+            historial,
+            x="fecha_corte",
+            y="vencido",
+            color="sucursal",
+            markers=True,
+            color_discrete_map={suc: info.get("color", "#808080") for suc, info in colores_sucursales.items()},
+            labels={"fecha_corte": "Fecha de corte", "vencido": "Monto vencido", "sucursal": "Sucursal"},
+            title="🔴 Deuda vencida por sucursal en cada corte"
+        )
+        fig_hist_vencido.update_traces(
+            hovertemplate="<b>Corte:</b> %{x|%d/%m/%Y}<br><b>Vencido:</b> $%{y:,.2f}<extra></extra>"
+        )
+        fig_hist_vencido.update_layout(template="plotly_white", height=400, margin=dict(t=60, b=20))
+        st.plotly_chart(fig_hist_vencido, use_container_width=True)
+
+    #-------------------------------------- PROYECCIÓN DE SALIDAS -----------------------------------------------------------
+    st.markdown("### Proyección de salidas y crédito disponible")
+    col_h, col_f = st.columns([2, 1])
+    # El slider llega a 364 (52 semanas); con paso de 7 desde 7 no hay forma de llegar a 365
+    horizonte = col_h.slider("Horizonte (días)", min_value=7, max_value=364, value=90, step=7, key="proyeccion_horizonte")
+    frecuencia = col_f.radio("Agrupar por", ["Día", "Semana"], horizontal=True, key="proyeccion_frecuencia")
+    clave_frecuencia = "D" if frecuencia == "Día" else "W"
+
+    # Montos que vencen en cada día/semana (lo vencido sigue abierto: no tiene fecha de salida)
+    salidas = proyectar_salidas(df_estado_cuenta, hoy, horizonte, clave_frecuencia)
+    proyeccion = holgura_credito(salidas, total_estado_cuenta, CREDITO_MAX)
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+    col1.metric(f"💸 Sale en {horizonte} días", f"${proyeccion['acumulado'].iloc[-1]:,.2f}")
+    col2.metric("💰 Crédito disponible hoy", f"${credito_disponible:,.2f}")
+    col3.metric(f"📈 Disponible al día {horizonte}", f"${proyeccion['disponible'].iloc[-1]:,.2f}")
+
+    # --- Salidas por periodo, apiladas por sucursal y por división (una pestaña cada una) ---
+    formato_x = "%d/%m/%Y" if clave_frecuencia == "D" else "Semana del %d/%m/%Y"
+    desgloses = {
+        "sucursal": {suc: info.get("color", "#808080") for suc, info in colores_sucursales.items()},
+        "division": {div: info.get("color", "#808080") for div, info in config["divisiones"].items()},
+    }
+
+    tab_sucursal, tab_division = st.tabs(["Por sucursal", "Por división"])
+    for tab, (por, colores_grupo) in zip([tab_sucursal, tab_division], desgloses.items()):
+        salidas_grupo = proyectar_salidas(df_estado_cuenta, hoy, horizonte, clave_frecuencia, por=por)
+
+        fig_salidas = go.Figure()
+        for grupo in salidas_grupo.columns:
+            fig_salidas.add_trace(go.Bar(
+                x=salidas_grupo.index,
+                y=salidas_grupo[grupo].to_numpy(),
+                name=grupo,
+                marker_color=colores_grupo.get(grupo, "#808080"),
+                hovertemplate=f"<b>{grupo}</b><br>%{{x|{formato_x}}}<br>$%{{y:,.2f}}<extra></extra>"
+            ))
+        fig_salidas.update_layout(
+            barmode="stack",
+            title="💸 Montos que vencen por " + ("día" if clave_frecuencia == "D" else "semana"),
+            xaxis_title="Fecha de exigibilidad",
+            yaxis_title="Monto",
+            template="plotly_white",
+            height=450,
+            margin=dict(t=60, b=20)
+        )
+        tab.plotly_chart(fig_salidas, use_container_width=True, key=f"proyeccion_salidas_{por}")
+
+    # --- Salida acumulada y crédito disponible proyectado ---
+    fig_holgura = go.Figure([
+        go.Scatter(
+            x=proyeccion.index, y=proyeccion["acumulado"].to_numpy(), name="Salida acumulada",
+            mode="lines", line=dict(color="#ff9933"),
+            hovertemplate="%{x|%d/%m/%Y}<br>Acumulado: $%{y:,.2f}<extra></extra>"
+        ),
+        go.Scatter(
+            x=proyeccion.index, y=proyeccion["disponible"].to_numpy(), name="Crédito disponible",
+            mode="lines", line=dict(color="#33aa55"),
+            hovertemplate="%{x|%d/%m/%Y}<br>Disponible: $%{y:,.2f}<extra></extra>"
+        ),
+    ])
+    fig_holgura.add_hline(y=CREDITO_MAX, line_dash="dash", line_color="#888888", annotation_text="Límite de crédito")
+    fig_holgura.update_layout(
+        title="📉 Salida acumulada y crédito disponible proyectado",
+        yaxis_title="Monto",
+        template="plotly_white",
+        height=400,
+        margin=dict(t=60, b=20)
+    )
+    st.plotly_chart(fig_holgura, use_container_width=True)
+
+    #-------------------------------------- SIMULADOR DE CRÉDITO -----------------------------------------------------------
+    st.markdown("### Simulador de crédito: ¿qué pasa si...?")
+
+    # El simulador vive en la sesión: la curva base se calcula una vez por versión de datos y día,
+    # cada ajuste sólo suma o resta sus propios días
+    sim = st.session_state.get("simulador_credito")
+    clave_sim = (modelo["version"], hoy)
+    if sim is None or sim.clave != clave_sim:
+        ajustes_previos = sim.especificaciones() if sim is not None else []
+        sim = SimuladorCredito(df_estado_cuenta, hoy, HORIZONTE_SIMULADOR, clave=clave_sim)
+        for especificacion in ajustes_previos:
+            sim.aplicar(especificacion)
+        st.session_state["simulador_credito"] = sim
+
+    fecha_max_sim = (hoy + pd.Timedelta(days=HORIZONTE_SIMULADOR - 1)).date()
+    limite_credito = st.number_input(
+        "Límite de crédito", min_value=0.0, value=float(CREDITO_MAX), step=1_000_000.0, format="%.2f",
+        key="simulador_limite"
+    )
+
+    col_pago, col_compra = st.columns(2)
+    with col_pago:
+        with st.form("simulador_pago"):
+            st.markdown("**Pagar una cuenta por anticipado**")
+            cuenta_pago = st.selectbox("Cuenta", sorted(meta["cuenta_sucursal"].tolist()))
+            fecha_pago = st.date_input("Fecha de pago", value=hoy.date(), min_value=hoy.date(), max_value=fecha_max_sim)
+            if st.form_submit_button("Agregar pago"):
+                sim.aplicar({"tipo": "pago", "cuenta": cuenta_pago, "dia": (pd.Timestamp(fecha_pago) - hoy).days})
+    with col_compra:
+        with st.form("simulador_compra"):
+            st.markdown("**Registrar una compra**")
+            monto_compra = st.number_input("Monto", min_value=0.0, step=100_000.0, format="%.2f")
+            fecha_compra = st.date_input("Fecha de registro", value=hoy.date(), min_value=hoy.date(), max_value=fecha_max_sim)
+            plazo_compra = st.number_input("Plazo para pagarla (días)", min_value=0, value=90, step=30)
+            # Con cuenta, un pago anticipado de esa cuenta también liquida la compra
+            cuenta_compra = st.selectbox("Cuenta (opcional)", [None] + sorted(meta["cuenta_sucursal"].tolist()),
+                                         format_func=lambda c: "Sin cuenta" if c is None else c)
+            if st.form_submit_button("Agregar compra") and monto_compra > 0:
+                sim.aplicar({
+                    "tipo": "compra", "monto": monto_compra, "cuenta": cuenta_compra,
+                    "dia": (pd.Timestamp(fecha_compra) - hoy).days, "plazo": int(plazo_compra)
+                })
+
+    # --- Ajustes activos (se pueden quitar uno por uno) ---
+    for nombre, (especificacion, _, _) in list(sim.ajustes.items()):
+        fecha_ajuste = (hoy + pd.Timedelta(days=especificacion["dia"])).strftime("%d/%m/%Y")
+        if especificacion["tipo"] == "pago":
+            descripcion = f"💵 Pago anticipado de {especificacion['cuenta']} el {fecha_ajuste}"
+        else:
+            descripcion = (
+                f"🛒 Compra de ${especificacion['monto']:,.2f} el {fecha_ajuste}, "
+                f"a {especificacion['plazo']} días"
+                + (f" ({especificacion['cuenta']})" if especificacion.get("cuenta") else "")
+            )
+        col_desc, col_quitar = st.columns([5, 1])
+        col_desc.markdown(descripcion)
+        col_quitar.button("Quitar", key=f"quitar_{nombre}", on_click=sim.quitar, args=(nombre,))
+
+    simulacion = sim.resultado(limite_credito)
+    col1, col2, col3 = st.columns([1, 1, 1])
+    col1.metric("Disponible mínimo (actual)", f"${simulacion['disponible_base'].min():,.2f}")
+    col2.metric(
+        "Disponible mínimo (simulado)", f"${simulacion['disponible'].min():,.2f}",
+        delta=f"{simulacion['disponible'].min() - simulacion['disponible_base'].min():,.2f}"
+    )
+    excedidos = simulacion.index[simulacion["disponible"] < 0]
+    col3.metric("Primer día sobre el límite", excedidos[0].strftime("%d/%m/%Y") if len(excedidos) else "—")
+
+    fig_sim = go.Figure([
+        go.Scatter(
+            x=simulacion.index, y=simulacion["exposicion_base"].to_numpy(), name="Exposición actual",
+            mode="lines", line=dict(color="#888888", dash="dot"),
+            hovertemplate="%{x|%d/%m/%Y}<br>Actual: $%{y:,.2f}<extra></extra>"
+        ),
+        go.Scatter(
+            x=simulacion.index, y=simulacion["exposicion"].to_numpy(), name="Exposición simulada",
+            mode="lines", line=dict(color="#0B083D"),
+            hovertemplate="%{x|%d/%m/%Y}<br>Simulada: $%{y:,.2f}<extra></extra>"
+        ),
+    ])
+    fig_sim.add_hline(y=limite_credito, line_dash="dash", line_color="#ff4d4d", annotation_text="Límite de crédito")
+    fig_sim.update_layout(
+        title="🧮 Exposición de crédito: actual contra simulada",
+        yaxis_title="Deuda abierta",
+        template="plotly_white",
+        height=400,
+        margin=dict(t=60, b=20)
+    )
+    st.plotly_chart(fig_sim, use_container_width=True)
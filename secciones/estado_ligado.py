@@ -3,6 +3,7 @@ import plotly.express as px
 import pandas as pd
 from datetime import datetime
 from utils.api_utils import obtener_datos_api
+from utils.filtros_utils import filtrar
 
 def mostrar(df, config):
 
@@ -12,18 +13,7 @@ def mostrar(df, config):
         st.warning("No hay datos para mostrar.")
         return
     
-    df = df.dropna(subset=["sucursal"])
-
-    meses_es = {
-        'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril',
-        'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto',
-        'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
-    }
-
-    df["mes_dt"] = pd.to_datetime(df["mes"])
-    df["mes_nombre"] = df["mes_dt"].dt.month_name().map(meses_es) + " " + df["mes_dt"].dt.year.astype(str)
-    df["mes_period"] = df["mes_dt"].dt.to_period("M")
-    df = df.sort_values("mes_dt")
+    # El dataset compartido ya viene sin sucursales nulas, con columnas de mes y ordenado por mes_dt
     # Orden ascendente (para gráficas que van de enero a diciembre)
     orden_meses_asc = (
         df.drop_duplicates(subset="mes_period")
@@ -38,8 +28,10 @@ def mostrar(df, config):
     # ----------- Información General - Estado de Ligado  (TARJETAS) -----------
     st.markdown("### Información general")
     # Filtramos el dataframe para obtener totales según el ligado_sistema
-    monto_ligado = df[df["ligado_sistema"] == 1]["monto"].sum()
-    monto_pendiente = df[df["ligado_sistema"] == 0]["monto"].sum()
+    # (subconjuntos del índice de filtros, cacheados y reutilizados en toda la vista)
+    df_no_ligado = filtrar(df, ligado_sistema=0)
+    monto_ligado = filtrar(df, ligado_sistema=1)["monto"].sum()
+    monto_pendiente = df_no_ligado["monto"].sum()
     # Mostramos en tarjetas
     col1, col2 = st.columns(2)
 
@@ -49,9 +41,7 @@ def mostrar(df, config):
     with col2:
         st.metric("🕒 Pendiente de ligar", f"${monto_pendiente:,.2f}")
 
-    # ---------------- FILTRAR FACTURAS NO LIGADAS (GRAFICO DE LÍNEAS) ---------------------------------------------
-    df_no_ligado = df[df["ligado_sistema"] == 0]
-
+    # ---------------- FACTURAS NO LIGADAS (GRAFICO DE LÍNEAS) ---------------------------------------------
     # Agrupar por mes
     monto_mensual_no_ligado = (
         df_no_ligado.groupby("mes_nombre")["monto"]
@@ -84,13 +74,6 @@ def mostrar(df, config):
     st.plotly_chart(fig, use_container_width=True)
 
     # --- ---------CANTIDAD SIN LIGAR MENSUAL POR SUCURSAL (GRAFICO DE BARRAS APILADAS) -----------------------------------------------
-    # Filtrar solo facturas sin ligar
-    df_no_ligado = df[df["ligado_sistema"] == 0].copy()
-
-    # Asegurarnos que mes_dt exista y sea datetime
-    if "mes_dt" not in df_no_ligado.columns:
-        df_no_ligado["mes_dt"] = pd.to_datetime(df_no_ligado["mes"].astype(str))
-
     # Obtener el mes actual (en formato periodo M)
     mes_actual = pd.to_datetime("today").to_period("M")
 
@@ -3,6 +3,11 @@ import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
 from utils.api_utils import obtener_datos_api
+from utils.data_utils import (
+    filtrar_por_periodo, obtener_años_disponibles, preparar_comparativo_mensual, cargar_agregados_mensuales
+)
+from utils.agregaciones_utils import PlanAgregaciones
+from utils.table_utils import html_cacheado, tabla_totales_html, construir_tabla_comparativa
 
 # ================== FUNCIÓN PRINCIPAL =====================
 def mostrar(df_filtrado, config):
@@ -26,33 +31,11 @@ def mostrar(df_filtrado, config):
         "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
     ]
 
-    # Recalcular mes_nombre y mes_period después del filtrado
-    df_filtrado["mes_dt"] = pd.to_datetime(df_filtrado["fecha"])
-    df_filtrado["mes_period"] = df_filtrado["mes_dt"].dt.to_period("M")
-    df_filtrado["mes_nombre"] = (
-        df_filtrado["mes_dt"].dt.month_name().map(meses_es)
-        + " " + df_filtrado["mes_dt"].dt.year.astype(str)
-    )
-
-    # Agrupar montos por mes
-    df_total_mes = (
-        df_filtrado.groupby(["mes_period", "mes_nombre"])["monto"].sum().reset_index()
-        .sort_values("mes_period")
-    )
-
-    # Crear un orden dinámico en base a lo que realmente existe en los datos
-    orden_meses = df_total_mes["mes_nombre"].tolist()
-
-    # Reindexar con el orden correcto
-    df_total_mes = df_total_mes.set_index("mes_nombre").reindex(orden_meses).reset_index()
-
-    # ================== AGRUPACIONES ÚNICAS (reutilizables) =====================
-    df_mensual = (
-        df_filtrado.groupby("mes_nombre", as_index=False)["monto"].sum()
-    )
-    df_mensual["mes_nombre"] = pd.Categorical(df_mensual["mes_nombre"], categories=orden_meses, ordered=True)
-    df_mensual = df_mensual.sort_values("mes_nombre").reset_index(drop=True)
-
+    # mes_dt, mes_period y mes_nombre ya vienen del dataset compartido (solo lectura)
+    # Crear un orden dinámico en base a los meses que realmente existen en los datos
+    mensual = cargar_agregados_mensuales()
+    total_mes_completo = PlanAgregaciones(df_filtrado, mensual).suma(["mes_period", "mes_nombre"])
+    orden_meses = total_mes_completo.index.get_level_values("mes_nombre").tolist()
 
 
     st.title("Resumen General de Compras")
@@ -62,33 +45,21 @@ def mostrar(df_filtrado, config):
     periodo = st.radio("Selecciona periodo", opciones_periodo, horizontal=True)
 
     # Detectar años disponibles
-    df_filtrado["fecha"] = pd.to_datetime(df_filtrado["mes"])  # asegúrate de tener columna 'mes' en formato fecha
-    años_disponibles = sorted(df_filtrado["fecha"].dt.year.unique())
+    años_disponibles = obtener_años_disponibles(df_filtrado)
     año_seleccionado = st.selectbox("Selecciona el año", años_disponibles, index=len(años_disponibles)-1)
     st.markdown("<br><br>", unsafe_allow_html=True)
 
-    # Filtrar por periodo
-    if periodo == "Año Natural":
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.year == año_seleccionado]
-        titulo_periodo = f"{año_seleccionado}"
-
-    elif periodo == "Año Fiscal":
-        inicio_fiscal = pd.Timestamp(año_seleccionado-1, 11, 1)
-        fin_fiscal = pd.Timestamp(año_seleccionado, 10, 31)
-        df_filtrado = df_filtrado[(df_filtrado["fecha"] >= inicio_fiscal) & (df_filtrado["fecha"] <= fin_fiscal)]
-        titulo_periodo = f"Fiscal {año_seleccionado}"
-
-    # Recalcular mes_nombre y mes_period después del filtrado
-    df_filtrado["mes_dt"] = pd.to_datetime(df_filtrado["fecha"])
-    df_filtrado["mes_period"] = df_filtrado["mes_dt"].dt.to_period("M")
-    df_filtrado["mes_nombre"] = (
-        df_filtrado["mes_dt"].dt.month_name().map(meses_es)
-        + " " + df_filtrado["mes_dt"].dt.year.astype(str)
-    )
+    # Filtrar por periodo (cacheado por versión de datos, sin hashear el DataFrame)
+    df_filtrado, titulo_periodo = filtrar_por_periodo(df_filtrado, periodo, año_seleccionado)
+    mensual, _ = filtrar_por_periodo(mensual, periodo, año_seleccionado)
 
-    df_total_mes = (
-        df_filtrado.groupby(["mes_dt","mes_nombre"])["monto"].sum().reset_index()
-        .sort_values("mes_dt")
+    # ================== AGRUPACIONES ÚNICAS (reutilizables) =====================
+    # Cada agregación se calcula una vez (desde los agregados mensuales); el total por mes
+    # se re-agrega desde total_mes
+    plan = (
+        PlanAgregaciones(df_filtrado, mensual)
+        .declarar("total_mes", ["mes_period", "mes_nombre"])
+        .declarar("mensual", ["mes_nombre"])
     )
 
     #--------------- TARJETAS: total comprado en el año y en el mes corriente  ------------------------------------------
@@ -110,11 +81,8 @@ def mostrar(df_filtrado, config):
     st.markdown("<br><br>", unsafe_allow_html=True)
 
     # ------------------------------------ GÁFICA DE LÍNEAS DEL TOTAL GENERAL  -----------------------------------------------------------------------------------------------------------------
-    # Agrupar y ordenar por mes_period (cronológico)
-    df_total_mes = (
-        df_filtrado.groupby(["mes_period", "mes_nombre"])["monto"].sum().reset_index()
-        .sort_values("mes_period")
-    )
+    # Agrupado y ordenado por mes_period (cronológico)
+    df_total_mes = plan["total_mes"].reset_index()
 
     # Crear figura
     fig_total = go.Figure()
@@ -140,7 +108,7 @@ def mostrar(df_filtrado, config):
     st.markdown("### Total comprado por mes")
 
     # Agrupar
-    tabla_horizontal = df_filtrado.groupby("mes_nombre")["monto"].sum()
+    tabla_horizontal = plan["mensual"]
 
     # Filtrar y ordenar solo los meses presentes en df_filtrado
     meses_presentes = [m for m in orden_meses if m in tabla_horizontal.index]
@@ -157,48 +125,15 @@ def mostrar(df_filtrado, config):
     cols = [col for col in tabla_horizontal_df.columns if col != "Total"] + ["Total"]
     tabla_horizontal_df = tabla_horizontal_df[cols]
 
-    # Formatear montos como moneda
-    tabla_html = tabla_horizontal_df.applymap(lambda x: f"${x:,.2f}")
-
-    # HTML dinámico
-    header_html = ''.join([
-        f'<th style="background-color:#390570; color:white; padding:8px; text-align:left;">{col}</th>'
-        for col in tabla_html.columns
-    ])
-
-    row_html = ''.join([
-        f'<td style="padding:8px; text-align:left;">{val}</td>'
-        for val in tabla_html.iloc[0]
-    ])
-
-    html_table = f"""
-    <div style="overflow-x:auto; width: 100%;">
-    <table style="border-collapse:collapse; min-width:800px; width:100%;">
-        <thead>
-        <tr>
-            <th style="background-color:#390570; padding:8px; color:white; text-align:left; position:sticky; left:0; z-index:1;">
-            </th>
-            {header_html}
-        </tr>
-        </thead>
-        <tbody>
-        <tr>
-            <td style="padding:8px; text-align:right; background-color:#281436; color:white; font-weight:bold; position:sticky; left:0; z-index:1;">
-            Total Comprado
-            </td>
-            {row_html}
-        </tr>
-        </tbody>
-    </table>
-    </div>
-    """
+    # HTML armado por columnas y cacheado por versión de datos del periodo
+    html_table = html_cacheado("total_mensual", df_filtrado, lambda: tabla_totales_html(tabla_horizontal_df))
 
     st.markdown(html_table, unsafe_allow_html=True)
 
 # -------------------------------------------- GRÁFICA: Total comprado por mes ------------------------------------------------------------------------------
     #st.markdown("### Gráfica de Total comprado por mes")
-    # Agrupar de nuevo (en bruto, sin formato)
-    df_mensual = df_filtrado.groupby("mes_nombre", as_index=False)["monto"].sum()
+    # Misma agregación mensual (en bruto, sin formato)
+    df_mensual = plan["mensual"].reset_index()
     df_mensual["mes_nombre"] = pd.Categorical(df_mensual["mes_nombre"], categories=orden_meses, ordered=True)
     df_mensual = df_mensual.sort_values("mes_nombre")
 
@@ -238,136 +173,15 @@ def mostrar(df_filtrado, config):
     st.markdown("### Comparativo de compras mensuales")
     st.markdown("#### Compra vs mes anterior")
 
-    # Agrupar y ordenar por mes
-    df_mensual = df_filtrado.groupby("mes_nombre", as_index=False)["monto"].sum()
-    df_mensual["mes_nombre"] = pd.Categorical(df_mensual["mes_nombre"], categories=orden_meses, ordered=True)
-    df_mensual = df_mensual.sort_values("mes_nombre").reset_index(drop=True)
-
-    # Calcular diferencia y variación
-    df_mensual["diferencia"] = df_mensual["monto"].diff().fillna(0)
-    df_mensual["variacion_pct"] = df_mensual["monto"].pct_change().fillna(0) * 100
-
-    # Flechas al final
-    df_mensual["monto_str"] = df_mensual["monto"].apply(lambda x: f"${x:,.2f}")
-    df_mensual["diferencia_str"] = df_mensual["diferencia"].apply(
-        lambda x: f"${x:,.2f} ⬆" if x > 0 else f"${x:,.2f} ⬇" if x < 0 else "$0 ➖"
-    )
-    df_mensual["variacion_str"] = df_mensual["variacion_pct"].apply(
-        lambda x: f"{x:.1f}% ⬆" if x > 0 else f"{x:.1f}% ⬇" if x < 0 else "0.0% ➖"
-    )
+    # Agrupar, ordenar y calcular diferencia/variación con flechas (cacheado por versión de datos)
+    df_mensual = preparar_comparativo_mensual(df_filtrado, orden_meses)
 
     # Tabla base
     df_comp = df_mensual[["mes_nombre", "monto_str", "diferencia_str", "variacion_str"]]
     df_comp.columns = ["Mes", "Total Comprado", "Diferencia ($)", "Variación (%)"]
 
-    # Convertir a HTML
-    def construir_tabla_comparativa(df):
-        estilos_css = """
-        <style>
-            .tabla-wrapper {
-                overflow-x: auto;
-                width: 100%;
-            }
-
-            .tabla-comparativa {
-                min-width: 100%;
-                width: max-content;
-                border-collapse: collapse;
-                table-layout: auto;
-            }
-
-            .tabla-comparativa thead th {
-                background-color: #0B083D;
-                color: white;
-                padding: 8px;
-                white-space: nowrap;
-                position: sticky;
-                top: 0;
-                z-index: 3;
-                border: 1px solid white;
-            }
-
-            .tabla-comparativa thead th:first-child {
-                text-align: right;
-                left: 0;
-                position: sticky;
-                z-index: 5;
-            }
-
-            .tabla-comparativa thead th:not(:first-child) {
-                text-align: left;
-            }
-
-            .tabla-comparativa td, .tabla-comparativa th {
-                padding: 8px;
-                font-size: 14px;
-                white-space: nowrap;
-                border: 1px solid white;
-            }
-
-            .tabla-comparativa tbody td:first-child,
-            .tabla-comparativa tfoot td:first-child {
-                position: sticky;
-                left: 0;
-                background-color: #0B083D;
-                color: white;
-                font-weight: bold;
-                text-align: right;
-                z-index: 4;
-            }
-
-            .tabla-comparativa tbody td:not(:first-child) {
-                text-align: left;
-            }
-
-            .subida {
-                background-color: #7D1F08;
-                color: white;
-            }
-
-            .bajada {
-                background-color: #184E08;
-                color: white;
-            }
-
-            .neutra {
-                color: white;
-            }
-        </style>
-        """
-
-        html = f"{estilos_css}<div class='tabla-wrapper'><table class='tabla-comparativa'>"
-        html += (
-            "<thead><tr>"
-            "<th>Mes</th>"
-            "<th>Total Comprado</th>"
-            "<th>Diferencia ($)</th>"
-            "<th>Variación (%)</th>"
-            "</tr></thead><tbody>"
-        )
-
-        for _, row in df.iterrows():
-            html += "<tr>"
-
-            # Determinar clase de color
-            clase_color = (
-                "subida" if "⬆" in row["Diferencia ($)"] else
-                "bajada" if "⬇" in row["Diferencia ($)"] else
-                "neutra"
-            )
-
-            html += f"<td>{row['Mes']}</td>"
-            html += f"<td class='{clase_color}'>{row['Total Comprado']}</td>"
-            html += f"<td class='{clase_color}'>{row['Diferencia ($)']}</td>"
-            html += f"<td class='{clase_color}'>{row['Variación (%)']}</td>"
-
-            html += "</tr>"
-
-        html += "</tbody></table></div>"
-        return html
-
     # Mostrar tabla
-    tabla_html = construir_tabla_comparativa(df_comp)
+    tabla_html = html_cacheado("comparativo_mensual", df_filtrado, lambda: construir_tabla_comparativa(df_comp))
     st.markdown(tabla_html, unsafe_allow_html=True)
     st.markdown("<div class='spacer'></div>", unsafe_allow_html=True)
 
@@ -375,8 +189,8 @@ def mostrar(df_filtrado, config):
     st.markdown("<br><br>", unsafe_allow_html=True)
     st.markdown("### Variación de compras respecto al mes anterior")
 
-    # Agrupar y ordenar por mes
-    df_mensual = df_filtrado.groupby("mes_nombre", as_index=False)["monto"].sum()
+    # Ordenar por mes
+    df_mensual = plan["mensual"].reset_index()
     df_mensual["mes_nombre"] = pd.Categorical(df_mensual["mes_nombre"], categories=orden_meses, ordered=True)
     df_mensual = df_mensual.sort_values("mes_nombre").reset_index(drop=True)
 
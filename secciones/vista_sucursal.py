@@ -6,41 +6,37 @@ import plotly.graph_objects as go
 from datetime import datetime
 import io
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
-from utils.api_utils import obtener_datos_api
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 import matplotlib.colors as mcolors
 from matplotlib.colors import LinearSegmentedColormap
+from utils.data_utils import filtrar_por_periodo, obtener_años_disponibles
+from utils.filtros_utils import filtrar
+from utils.charts_utils import figura, titulo, trazas_lineas, grafica_barras, clave_figura, figura_cacheada
 
 def mostrar(df_filtrado, config):
     if df_filtrado.empty:
         st.warning("No hay datos para mostrar.")
         return
     
-    df = obtener_datos_api()
-    if not df.empty:
-        df = df.dropna(subset=["sucursal"])
-
-        meses_es = {
-            'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril',
-            'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto',
-            'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
-        }
+    # El dataset compartido ya trae las columnas de mes y está ordenado por mes_dt
+    df = df_filtrado
+    meses_es = {
+        'January': 'Enero', 'February': 'Febrero', 'March': 'Marzo', 'April': 'Abril',
+        'May': 'Mayo', 'June': 'Junio', 'July': 'Julio', 'August': 'Agosto',
+        'September': 'Septiembre', 'October': 'Octubre', 'November': 'Noviembre', 'December': 'Diciembre'
+    }
 
-        df["mes_dt"] = pd.to_datetime(df["mes"])
-        df["mes_nombre"] = df["mes_dt"].dt.month_name().map(meses_es) + " " + df["mes_dt"].dt.year.astype(str)
-        df["mes_period"] = df["mes_dt"].dt.to_period("M")
-        df = df.sort_values("mes_dt")
-        # Orden ascendente (para gráficas que van de enero a diciembre)
-        orden_meses_asc = (
-            df.drop_duplicates(subset="mes_period")
-            .sort_values("mes_period", ascending=True)["mes_nombre"]
-            .tolist()
-        )
+    # Orden ascendente (para gráficas que van de enero a diciembre)
+    orden_meses_asc = (
+        df.drop_duplicates(subset="mes_period")
+        .sort_values("mes_period", ascending=True)["mes_nombre"]
+        .tolist()
+    )
 
-        # Orden descendente (para gráficas que van de mes más reciente al más antiguo)
-        orden_meses_desc = orden_meses_asc[::-1]
-        orden_meses = orden_meses_asc
+    # Orden descendente (para gráficas que van de mes más reciente al más antiguo)
+    orden_meses_desc = orden_meses_asc[::-1]
+    orden_meses = orden_meses_asc
     
     with open("config_colores.json", "r", encoding="utf-8") as f:
         config = json.load(f)
@@ -63,19 +59,7 @@ def mostrar(df_filtrado, config):
                 "division": division
             }
 
-    # Asignar división
-    df_filtrado["division"] = df_filtrado["codigo_normalizado"].map(mapa_codigos)
-
-    # Filtrar válidos
-    df_divisiones = df_filtrado.dropna(subset=["division"]).copy()
-
-    # Agregar columnas de fecha/mes
-    df_divisiones["mes_dt"] = pd.to_datetime(df_divisiones["mes"])
-    df_divisiones["mes_nombre"] = (
-        df_divisiones["mes_dt"].dt.month_name().map(meses_es)
-        + " "
-        + df_divisiones["mes_dt"].dt.year.astype(str)
-    )
+    # division y abreviatura ya vienen del dataset compartido
 
     # Diccionario plano solo con colores por sucursal
     colores_sucursales_map = {
@@ -89,24 +73,20 @@ def mostrar(df_filtrado, config):
     periodo = st.radio("Selecciona periodo", opciones_periodo, horizontal=True)
 
     # Detectar años disponibles
-    df_filtrado["fecha"] = pd.to_datetime(df_filtrado["mes"])  # asegúrate de tener columna 'mes' en formato fecha
-    años_disponibles = sorted(df_filtrado["fecha"].dt.year.unique())
+    años_disponibles = obtener_años_disponibles(df_filtrado)
     año_seleccionado = st.selectbox("Selecciona el año", años_disponibles, index=len(años_disponibles)-1)
 
-    # Filtrar por periodo
-    if periodo == "Año Natural":
-        df_filtrado = df_filtrado[df_filtrado["fecha"].dt.year == año_seleccionado]
-        titulo_periodo = f"{año_seleccionado}"
-
-    elif periodo == "Año Fiscal":
-        # Año fiscal: 1 nov (año_seleccionado-1) -> 31 oct (año_seleccionado)
-        inicio_fiscal = pd.Timestamp(año_seleccionado-1, 11, 1)
-        fin_fiscal = pd.Timestamp(año_seleccionado, 10, 31)
-        df_filtrado = df_filtrado[(df_filtrado["fecha"] >= inicio_fiscal) & (df_filtrado["fecha"] <= fin_fiscal)]
-        titulo_periodo = f"Fiscal {año_seleccionado}"
+    # Filtrar por periodo (cacheado por versión de datos, sin hashear el DataFrame)
+    df_filtrado, titulo_periodo = filtrar_por_periodo(df_filtrado, periodo, año_seleccionado)
     # Usar df_filtrado en lugar del df original
     df_divisiones_filtrado = df_filtrado.dropna(subset=["division"])
 
+    # Figuras cacheadas por (sección, gráfica, periodo, año, selecciones, versión de datos del periodo)
+    df_periodo = df_filtrado
+
+    def clave(grafica, *selecciones):
+        return clave_figura("vista_sucursal", grafica, df_periodo, periodo, año_seleccionado, *selecciones)
+
     # Recalcular df_pivot
     df_pivot = df_filtrado.pivot_table(index="mes_nombre", columns="sucursal", values="monto", aggfunc="sum").fillna(0)
     df_pivot = df_pivot.reindex(orden_meses)
@@ -129,9 +109,9 @@ def mostrar(df_filtrado, config):
     st.markdown("<br><br>", unsafe_allow_html=True)    
     # ----------------------------- TARJETAS: TOTAL ACUMULADO ANUAL Y MES ACTUAL ------------------------------------------------------------------------------------------------------------------
     if sucursales_seleccionadas:  # si hay selección
-        df_filtrado = df_filtrado[df_filtrado["sucursal"].isin(sucursales_seleccionadas)]
+        df_filtrado = filtrar(df_filtrado, sucursal=sucursales_seleccionadas)
     else:
-        df_filtrado = df_filtrado.copy()  # o un df vacío si quieres no mostrar nada
+        df_filtrado = df_filtrado  # o un df vacío si quieres no mostrar nada
 
     total_anual = df_filtrado["monto"].sum()
 
@@ -156,48 +136,40 @@ def mostrar(df_filtrado, config):
     
     # --------------------------- GRÁFICA DE LÍNEAS (evolución mensual) ------------------------------------------------------------------------------------------------------------------------------
     
-    # Crear pivot table solo con df_filtrado (periodo + sucursales)
-    df_pivot = df_filtrado.pivot_table(
-        index="mes_nombre",
-        columns="sucursal",
-        values="monto",
-        aggfunc="sum"
-    ).fillna(0)
-
-    # Reordenar los meses según orden_meses pero solo los que existen en df_pivot
-    meses_existentes = [m for m in orden_meses if m in df_pivot.index]
-    df_pivot = df_pivot.reindex(meses_existentes)
-
-    # Crear gráfico
-    fig_lineas = go.Figure()
-
-    for sucursal in sucursales_seleccionadas:
-        if sucursal in df_pivot.columns:
-            # Crear customdata con mes y sucursal para cada punto
-            customdata = list(zip(df_pivot.index.astype(str), [sucursal]*len(df_pivot)))
-            
-            fig_lineas.add_trace(go.Scatter(
-                x=df_pivot.index,
-                y=df_pivot[sucursal],
-                mode='lines+markers',
-                name=sucursal,
-                line=dict(color=colores_sucursales_map.get(sucursal, "#CCC")),
-                customdata=customdata,
-                hovertemplate=(
-                    "<b>Sucursal:</b> %{customdata[1]}<br>" +
-                    "<b>Mes:</b> %{customdata[0]}<br>" +
-                    "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
-                )
-            ))
+    def construir_lineas():
+        # Crear pivot table solo con df_filtrado (periodo + sucursales)
+        df_pivot = df_filtrado.pivot_table(
+            index="mes_nombre",
+            columns="sucursal",
+            values="monto",
+            aggfunc="sum"
+        ).fillna(0)
+
+        # Reordenar los meses según orden_meses pero solo los que existen en df_pivot
+        meses_existentes = [m for m in orden_meses if m in df_pivot.index]
+        df_pivot = df_pivot.reindex(meses_existentes)
+
+        # Crear gráfico: una traza por sucursal seleccionada, armada desde la matriz del pivote
+        columnas_lineas = [s for s in sucursales_seleccionadas if s in df_pivot.columns]
+        return figura(
+            trazas_lineas(
+                df_pivot[columnas_lineas],
+                colores_sucursales_map,
+                "<b>Sucursal:</b> %{fullData.name}<br>"
+                "<b>Mes:</b> %{x}<br>"
+                "<b>Monto:</b> $%{y:,.2f}<extra></extra>",
+                color_omision="#CCC"
+            ),
+            {
+                "title": titulo(f"Evolución mensual por sucursal ({titulo_periodo})"),
+                "xaxis": {"title": titulo("Mes")},
+                "yaxis": {"title": titulo("Total Comprado")},
+                "height": 600,
+                "margin": {"t": 100},
+            },
+        )
 
-    # Layout
-    fig_lineas.update_layout(
-        title=f"Evolución mensual por sucursal ({titulo_periodo})",
-        xaxis_title="Mes",
-        yaxis_title="Total Comprado",
-        height=600,
-        margin=dict(t=100)
-    )
+    fig_lineas = figura_cacheada(clave("lineas", sucursales_seleccionadas), construir_lineas)
 
     # Mostrar gráfico
     st.plotly_chart(
@@ -218,17 +190,7 @@ def mostrar(df_filtrado, config):
 
     #------------------------------ GRÁFICA DE BARRAS: COMPRAS ACUMULADAS POR CUENTA --------------------------------------------------------------------------------------
     # Filtrar df_filtrado también por sucursales seleccionadas
-    df_cta_filtrado = df_filtrado[df_filtrado["sucursal"].isin(sucursales_seleccionadas)].copy()
-
-    # Función para obtener abreviatura
-    def obtener_abreviatura(codigo):
-        codigo_str = str(codigo).strip()
-        for division, info in divisiones.items():
-            if codigo_str in info["codigos"]:
-                return info["abreviatura"]
-        return ""
-
-    df_cta_filtrado["abreviatura"] = df_cta_filtrado["codigo_normalizado"].apply(obtener_abreviatura)
+    df_cta_filtrado = filtrar(df_filtrado, sucursal=sucursales_seleccionadas)
 
     # Agrupar por cuenta y sucursal
     df_cta = df_cta_filtrado.groupby(
@@ -300,25 +262,12 @@ def mostrar(df_filtrado, config):
     else:
         st.markdown("### Compras por Sucursal, mes a mes")
         # Filtrar por sucursales seleccionadas
-        df_filtrado = df_filtrado[df_filtrado["sucursal"].isin(sucursales_seleccionadas)].copy()
-
-        # Crear etiqueta cuenta_sucursal
-        df_filtrado["cuenta_sucursal"] = df_filtrado["codigo_normalizado"] + " - " + df_filtrado["sucursal"]
-
-        # Agregar abreviatura de la división
-        df_filtrado["abreviatura"] = df_filtrado["codigo_normalizado"].apply(obtener_abreviatura)
-
-        # Crear columna con cuenta-sucursal-abreviatura
-        df_filtrado["cuenta_sucursal_abrev"] = (
-            df_filtrado["codigo_normalizado"].astype(str) + " (" +
-            df_filtrado["abreviatura"] + ") - " +
-            df_filtrado["sucursal"]
-        )
+        df_filtrado = filtrar(df_filtrado, sucursal=sucursales_seleccionadas)
 
-        # Agrupar por mes y cuenta_sucursal_abrev (en lugar de la columna anterior)
+        # Agrupar por mes y cuenta-sucursal-abreviatura (cuenta_sucursal del dataset compartido)
         df_mes_cta = df_filtrado.groupby(
-            ["mes_nombre", "cuenta_sucursal_abrev", "sucursal", "division"], as_index=False
-        )["monto"].sum()
+            ["mes_nombre", "cuenta_sucursal", "sucursal", "division"], as_index=False
+        )["monto"].sum().rename(columns={"cuenta_sucursal": "cuenta_sucursal_abrev"})
 
         # Ordenar meses según orden_meses
         df_mes_cta["mes_nombre"] = pd.Categorical(df_mes_cta["mes_nombre"], categories=orden_meses, ordered=True)
@@ -430,7 +379,7 @@ def mostrar(df_filtrado, config):
 
     if len(sucursales_seleccionadas) == 1:
         sucursal = sucursales_seleccionadas[0]
-        df_suc = df_filtrado[df_filtrado["sucursal"] == sucursal].copy()
+        df_suc = filtrar(df_filtrado, sucursal=sucursal)
 
         # Agrupamos y ordenamos
         df_suc = df_suc.groupby(["mes_nombre", "mes_dt"], as_index=False).agg({"monto": "sum"})
@@ -468,41 +417,37 @@ def mostrar(df_filtrado, config):
             fig_barras.update_layout(showlegend=False, xaxis_title="Mes", yaxis_title="Total Comprado")
             st.plotly_chart(fig_barras, use_container_width=True)
     else:
+        colores_sucursales_map = {k: v["color"] for k, v in colores_sucursales.items()}
         for mes in orden_meses_desc:  # <- aquí el cambio para orden descendente
-            df_mes = df_filtrado[df_filtrado["mes_nombre"] == mes].copy()
-            df_mes = df_mes[df_mes["sucursal"].isin(sucursales_seleccionadas)].copy()
+            df_mes = filtrar(df_filtrado, mes_nombre=mes, sucursal=sucursales_seleccionadas)
             df_mes = df_mes.groupby("sucursal", as_index=False).agg({"monto": "sum"})
             total_mes = df_mes["monto"].sum()
             if total_mes == 0:
                 continue
-            df_mes["porcentaje"] = df_mes["monto"] / total_mes * 100
-            df_mes["texto"] = df_mes.apply(lambda row: f"${row['monto']:,.0f}<br>({row['porcentaje']:.1f}%)", axis=1)
             df_mes = df_mes.sort_values("monto", ascending=False)
-            df_mes["sucursal"] = pd.Categorical(df_mes["sucursal"], categories=df_mes["sucursal"], ordered=True)
-            # Plano para plotly
-            colores_sucursales_map = {k: v["color"] for k, v in colores_sucursales.items()}
 
-            fig_mes = px.bar(
-                df_mes,
-                x="sucursal",
-                y="monto",
-                text="texto",
-                color="sucursal",
-                color_discrete_map=colores_sucursales_map,
-                title=f"Compras en {mes}"
-            )
+            def construir_mes():
+                df_mes["porcentaje"] = df_mes["monto"] / total_mes * 100
+                df_mes["texto"] = (
+                    "$" + df_mes["monto"].map("{:,.0f}".format) + "<br>(" + df_mes["porcentaje"].map("{:.1f}".format) + "%)"
+                )
 
-            fig_mes.update_traces(
-                textposition='inside',
-                texttemplate='%{text}',
-                hovertemplate=(
-                    "<b>Sucursal:</b> %{x}<br>"
-                    "<b>Porcentaje:</b> %{customdata[0]:.1f}%<br>"
-                    "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
-                ),
-                customdata=df_mes[["porcentaje"]]
-            )
+                # Una sola traza, un color por barra, armada sin validación de graph_objects
+                return grafica_barras(
+                    df_mes["sucursal"],
+                    df_mes["monto"],
+                    df_mes["sucursal"].map(colores_sucursales_map).fillna("#808080"),
+                    df_mes["texto"],
+                    (
+                        "<b>Sucursal:</b> %{x}<br>"
+                        "<b>Porcentaje:</b> %{customdata[0]:.1f}%<br>"
+                        "<b>Monto:</b> $%{y:,.2f}<extra></extra>"
+                    ),
+                    customdata=df_mes[["porcentaje"]].to_numpy(),
+                    texto_titulo=f"Compras en {mes}",
+                    titulo_x="sucursal",
+                    titulo_y="monto"
+                )
 
-            fig_mes.update_traces(textposition='inside', texttemplate='%{text}')
-            fig_mes.update_layout(showlegend=False)
+            fig_mes = figura_cacheada(clave("compras_mes", sucursales_seleccionadas, mes), construir_mes)
             st.plotly_chart(fig_mes, use_container_width=True, key=f"mes_{mes}")
\ No newline at end of file
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from utils.mensual_utils import AgregadosMensuales, verificar_consistencia
+
+
+def dataset_chico():
+    meses = pd.to_datetime(["2025-01-01", "2025-01-01", "2025-02-01", "2025-02-01", "2025-03-01"])
+    df = pd.DataFrame({
+        "fecha": meses,
+        "mes_dt": meses,
+        "mes_nombre": meses.strftime("%m %Y"),
+        "mes_period": meses.to_period("M"),
+        "sucursal": ["Merida", "Cancun", "Merida", "Merida", "Cancun"],
+        "codigo_normalizado": ["100", "200", "100", "100", "200"],
+        "division": ["Agrícola", None, "Agrícola", "Agrícola", None],
+        "abreviatura": ["AG", "", "AG", "AG", ""],
+        "monto": [10.0, 20.0, 30.0, 40.0, 50.0],
+    })
+    df["cuenta_sucursal"] = df["codigo_normalizado"] + " - " + df["sucursal"]
+    return df
+
+
+def test_consistente_despues_de_actualizar():
+    df = dataset_chico()
+    agregados = AgregadosMensuales()
+    agregados.actualizar(df)
+
+    assert verificar_consistencia(agregados, df) == []
+
+
+def test_marca_solo_el_mes_que_cambio():
+    df = dataset_chico()
+    agregados = AgregadosMensuales()
+    agregados.actualizar(df)
+
+    cambiado = df.copy()
+    cambiado.loc[2, "monto"] = 35.0   # una fila de febrero
+
+    assert verificar_consistencia(agregados, cambiado) == [pd.Timestamp("2025-02-01")]
+
+
+def test_recalcula_solo_el_mes_que_cambio():
+    df = dataset_chico()
+    agregados = AgregadosMensuales()
+    agregados.actualizar(df)
+
+    cambiado = df.copy()
+    cambiado.loc[2, "monto"] = 35.0
+    agregados.actualizar(cambiado)
+
+    assert agregados.recalculados == [pd.Timestamp("2025-02-01")]
+    assert verificar_consistencia(agregados, cambiado) == []
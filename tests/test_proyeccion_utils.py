@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from utils.proyeccion_utils import SimuladorCredito
+
+
+HOY = pd.Timestamp("2025-06-01")
+
+
+def estado_chico():
+    return pd.DataFrame({
+        "cuenta_sucursal": ["100 - Merida", "100 - Merida", "200 - Cancun"],
+        "dias_diferencia": [-5, 20, 10],
+        "total": [100.0, 300.0, 50.0],
+    })
+
+
+def test_segundo_pago_reemplaza_al_primero():
+    un_pago = SimuladorCredito(estado_chico(), HOY, 60)
+    un_pago.aplicar({"tipo": "pago", "cuenta": "100 - Merida", "dia": 5})
+
+    dos_pagos = SimuladorCredito(estado_chico(), HOY, 60)
+    dos_pagos.aplicar({"tipo": "pago", "cuenta": "100 - Merida", "dia": 2})
+    dos_pagos.aplicar({"tipo": "pago", "cuenta": "100 - Merida", "dia": 5})
+
+    assert len(dos_pagos.ajustes) == 1
+    np.testing.assert_allclose(dos_pagos.exposicion(), un_pago.exposicion())
+    assert dos_pagos.exposicion().min() >= 0
+
+
+def test_pago_liquida_las_compras_de_la_cuenta_sin_importar_el_orden():
+    compra = {"tipo": "compra", "monto": 80.0, "cuenta": "100 - Merida", "dia": 1, "plazo": 30}
+    pago = {"tipo": "pago", "cuenta": "100 - Merida", "dia": 5}
+
+    compra_primero = SimuladorCredito(estado_chico(), HOY, 60)
+    compra_primero.aplicar(compra)
+    compra_primero.aplicar(pago)
+
+    pago_primero = SimuladorCredito(estado_chico(), HOY, 60)
+    pago_primero.aplicar(pago)
+    pago_primero.aplicar(compra)
+
+    np.testing.assert_allclose(pago_primero.exposicion(), compra_primero.exposicion())
+    # Después del pago sólo queda la cuenta de Cancún
+    assert pago_primero.exposicion()[5] == 50.0
+
+    pago_primero.quitar(next(n for n, (e, _, _) in pago_primero.ajustes.items() if e["tipo"] == "compra"))
+    solo_pago = SimuladorCredito(estado_chico(), HOY, 60)
+    solo_pago.aplicar(pago)
+    np.testing.assert_allclose(pago_primero.exposicion(), solo_pago.exposicion())
@@ -0,0 +1,88 @@
+from utils.cache_utils import CacheLRU, version_datos, derivar_version
+from utils.backend_utils import sumar
+
+# Filtros con nombre que pueden usar las agregaciones (el nombre forma parte de la clave del cache)
+FILTROS = {
+    "con_division": lambda df: df.dropna(subset=["division"]),
+}
+
+# Agregaciones compartidas entre reruns y sesiones mientras no cambie la versión de datos
+_cache_agregaciones = CacheLRU("agregaciones", maxsize=256)
+
+
+class PlanAgregaciones:
+    """
+    Plan de agregaciones de una vista (se crea uno por rerun).
+    La vista declara las sumas que necesita y cada (filtro, llaves, medida) distinta
+    se calcula una sola vez; las más gruesas se re-agregan desde la más fina declarada.
+    Si se pasan los agregados mensuales del mismo periodo (mensual), las sumas de monto
+    cuyas llaves estén en ellos se calculan desde ahí en lugar de las filas.
+    """
+
+    def __init__(self, df, mensual=None):
+        self.df = df
+        self.mensual = mensual
+        self._declaradas = {}
+        self._resultados = {}
+        self._filtrados = {}
+
+    def declarar(self, nombre, llaves, medida="monto", filtro=None):
+        """Registra una agregación con nombre; se calcula hasta que se pide."""
+        self._declaradas[nombre] = (filtro, tuple(llaves), medida)
+        return self
+
+    def __getitem__(self, nombre):
+        filtro, llaves, medida = self._declaradas[nombre]
+        return self.suma(llaves, medida, filtro)
+
+    def datos(self, filtro=None):
+        """DataFrame de la vista con el filtro aplicado (calculado una vez)."""
+        if filtro is None:
+            return self.df
+        if filtro not in self._filtrados:
+            self._filtrados[filtro] = derivar_version(FILTROS[filtro](self.df), self.df, filtro)
+        return self._filtrados[filtro]
+
+    def suma(self, llaves, medida="monto", filtro=None):
+        """Serie con la suma de la medida por llaves (el índice son las llaves, ordenadas)."""
+        clave = (filtro, tuple(llaves), medida)
+        if clave not in self._resultados:
+            self._resultados[clave] = self._calcular(*clave)
+        return self._resultados[clave].copy(deep=False)
+
+    def pivote(self, index, columns, medida="monto", filtro=None, fill_value=None, margins_name=None):
+        """Equivalente a pivot_table(aggfunc="sum"), armado desde la suma agregada."""
+        tabla = self.suma([index, columns], medida, filtro).unstack(columns, fill_value=fill_value)
+        if margins_name:
+            tabla[margins_name] = tabla.sum(axis=1)
+            tabla.loc[margins_name] = tabla.sum()
+        return tabla
+
+    def _origen(self, filtro, llaves, medida):
+        # Los agregados mensuales sirven si tienen todas las llaves; si no, se usan las filas
+        if self.mensual is None or medida != "monto" or not set(llaves) <= set(self.mensual.columns):
+            return self.datos(filtro)
+        clave = ("mensual", filtro)
+        if clave not in self._filtrados:
+            self._filtrados[clave] = self.mensual if filtro is None else FILTROS[filtro](self.mensual)
+        return self._filtrados[clave]
+
+    def _mas_fina(self, filtro, llaves, medida):
+        # Agregación declarada con las mismas llaves y más (la de menos llaves), o None
+        candidatas = [
+            l for f, l, m in self._declaradas.values()
+            if f == filtro and m == medida and set(l) > set(llaves)
+        ]
+        return min(candidatas, key=len) if candidatas else None
+
+    def _calcular(self, filtro, llaves, medida):
+        base = self._mas_fina(filtro, llaves, medida)
+        if base is not None:
+            nivel = list(llaves) if len(llaves) > 1 else llaves[0]
+            return self.suma(base, medida, filtro).groupby(level=nivel).sum()
+
+        calcular = lambda: sumar(self._origen(filtro, llaves, medida), llaves, medida)
+        version = version_datos(self.df)
+        if version is None:
+            return calcular()
+        return _cache_agregaciones.obtener((version, filtro, llaves, medida), calcular)
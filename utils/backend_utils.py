@@ -0,0 +1,80 @@
+import os
+import threading
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # backend opcional
+    duckdb = None
+
+# Backend de agregaciones: pandas (siempre disponible) o DuckDB embebido (opcional, en proceso,
+# vectorizado y en paralelo). Se usa DuckDB si está instalado, salvo BACKEND_AGREGACIONES=pandas;
+# las consultas que DuckDB no cubre caen a pandas.
+BACKEND = os.environ.get("BACKEND_AGREGACIONES", "duckdb" if duckdb is not None else "pandas")
+
+# Por debajo de este número de filas pandas es más rápido que preparar la consulta
+FILAS_MINIMAS_DUCKDB = 200_000
+
+# Una sola conexión por proceso; cada consulta usa su propio cursor (Streamlit corre
+# cada rerun en un hilo nuevo, así que una conexión por hilo abriría una por rerun)
+_con = None
+_lock = threading.Lock()
+
+
+def _cursor():
+    global _con
+    with _lock:
+        if _con is None:
+            _con = duckdb.connect()
+        return _con.cursor()
+
+
+def _soportado(df, llaves, medida):
+    # Llaves de texto, enteras o fechas y medida numérica; el resto (Period, categorías...) va por pandas
+    for col in llaves:
+        tipo = df[col].dtype
+        if not (
+            pd.api.types.is_object_dtype(tipo) or pd.api.types.is_integer_dtype(tipo)
+            or pd.api.types.is_datetime64_dtype(tipo)
+        ):
+            return False
+    return pd.api.types.is_float_dtype(df[medida].dtype)
+
+
+def usar_duckdb(df, llaves, medida):
+    return (
+        BACKEND == "duckdb" and duckdb is not None
+        and len(df) >= FILAS_MINIMAS_DUCKDB and _soportado(df, llaves, medida)
+    )
+
+
+def sumar_pandas(df, llaves, medida="monto", dropna=True):
+    return df.groupby(list(llaves), dropna=dropna)[medida].sum()
+
+
+def sumar_duckdb(df, llaves, medida="monto", dropna=True):
+    """
+    Misma salida que sumar_pandas: índice ordenado y, con dropna, filas con llaves
+    nulas descartadas (sin dropna las llaves nulas forman su propio grupo, al final).
+    """
+    columnas = ", ".join(f'"{col}"' for col in llaves)
+    filtro = " WHERE " + " AND ".join(f'"{col}" IS NOT NULL' for col in llaves) if dropna else ""
+    cur = _cursor()
+    try:
+        cur.register("datos", df[list(llaves) + [medida]])
+        resultado = cur.execute(
+            f'SELECT {columnas}, fsum("{medida}") AS "{medida}" FROM datos{filtro} GROUP BY {columnas}'
+        ).df()
+    finally:
+        cur.close()
+    resultado[medida] = resultado[medida].fillna(0.0)
+    for col in llaves:
+        resultado[col] = resultado[col].astype(df[col].dtype)
+    return resultado.set_index(list(llaves))[medida].sort_index()
+
+
+def sumar(df, llaves, medida="monto", dropna=True):
+    """Suma de la medida por llaves (equivale a df.groupby(llaves, dropna=dropna)[medida].sum())."""
+    if usar_duckdb(df, llaves, medida):
+        return sumar_duckdb(df, llaves, medida, dropna)
+    return sumar_pandas(df, llaves, medida, dropna)
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+import pandas as pd
+
+# Registro de caches para poder consultar sus estadísticas desde cualquier vista
+_caches = {}
+
+
+class CacheLRU:
+    """Cache LRU acotado y seguro entre hilos, con conteo de aciertos y fallos."""
+
+    def __init__(self, nombre, maxsize=64):
+        self.nombre = nombre
+        self.maxsize = maxsize
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches[nombre] = self
+
+    def obtener(self, clave, calcular):
+        """Regresa el valor de la clave; si no existe lo calcula con calcular() y lo guarda."""
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.hits += 1
+                return self._datos[clave]
+            self.misses += 1
+
+        valor = calcular()
+
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def estadisticas(self):
+        return {"hits": self.hits, "misses": self.misses, "tamaño": len(self._datos), "maxsize": self.maxsize}
+
+
+def estadisticas_cache():
+    """Regresa las estadísticas (hits/misses/tamaño) de todos los caches registrados."""
+    return {nombre: cache.estadisticas() for nombre, cache in _caches.items()}
+
+
+# ================== VERSIÓN DE DATOS =====================
+def calcular_version(df):
+    """Token corto que identifica el contenido de un DataFrame (se calcula una vez por carga)."""
+    hash_filas = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(hash_filas.tobytes()).hexdigest()[:16]
+
+
+def _huella(df):
+    # Identidad del objeto, índice, filas y columnas: barato y distinto en cualquier derivado
+    return (id(df), id(df.index), len(df), tuple(df.columns))
+
+
+def asignar_version(df, version):
+    """Marca el DataFrame con su token de versión (en df.attrs) y regresa el mismo DataFrame."""
+    df.attrs["version"] = version
+    df.attrs["huella"] = _huella(df)
+    return df
+
+
+def version_datos(df):
+    """
+    Regresa el token de versión del DataFrame o None si no está marcado.
+    pandas propaga attrs a todo lo que deriva del DataFrame (filtros, assign, replace,
+    reordenar, copias); la versión sólo vale para el objeto que se marcó y mientras
+    conserve su índice y sus columnas. Los derivados se marcan con derivar_version.
+    """
+    version = df.attrs.get("version")
+    if version is None or df.attrs.get("huella") != _huella(df):
+        return None
+    return version
+
+
+def derivar_version(df_derivado, df_origen, *parametros):
+    """
+    Marca un derivado con una versión calculada de la del origen y de los parámetros
+    usados; sin parámetros (p. ej. una copia superficial) conserva la del origen.
+    """
+    version = version_datos(df_origen)
+    if version is not None:
+        asignar_version(df_derivado, "|".join([version] + [str(p) for p in parametros]))
+    return df_derivado
+
+
+# ================== DECORADOR =====================
+def _hashable(valor):
+    if isinstance(valor, (list, tuple)):
+        return tuple(_hashable(v) for v in valor)
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in valor.items()))
+    if isinstance(valor, (set, frozenset)):
+        return tuple(sorted(valor))
+    return valor
+
+
+def _copia_superficial(valor):
+    # Con Copy-on-Write la copia superficial protege el resultado cacheado sin copiar datos
+    if isinstance(valor, pd.DataFrame):
+        return derivar_version(valor.copy(deep=False), valor)
+    if isinstance(valor, pd.Series):
+        return valor.copy(deep=False)
+    if isinstance(valor, tuple):
+        return tuple(_copia_superficial(v) for v in valor)
+    return valor
+
+
+def cache_por_version(maxsize=32):
+    """
+    Cachea funciones cuyo primer argumento es un DataFrame usando como clave
+    (versión de datos, parámetros) en lugar de hashear el DataFrame completo.
+    Si el DataFrame no tiene versión se calcula directamente sin cachear.
+    """
+    def decorador(func):
+        cache = CacheLRU(f"{func.__module__}.{func.__name__}", maxsize=maxsize)
+
+        @functools.wraps(func)
+        def envoltura(df, *args, **kwargs):
+            version = version_datos(df)
+            if version is None:
+                return func(df, *args, **kwargs)
+            clave = (version, _hashable(args), _hashable(kwargs))
+            resultado = cache.obtener(clave, lambda: func(df, *args, **kwargs))
+            return _copia_superficial(resultado)
+
+        envoltura.cache = cache
+        return envoltura
+    return decorador
@@ -1,47 +1,218 @@
+import io
+import json
+import numpy as np
+import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-import pandas as pd
+import plotly.io as pio
+from utils.cache_utils import CacheLRU, version_datos
+
+
+# ================== FIGURAS RÁPIDAS =====================
+# Las figuras se arman como dicts desde arreglos de NumPy y se envuelven en go.Figure sin
+# validar atributo por atributo (_validate=False): st.plotly_chart sólo las serializa.
+# La validación de graph_objects es lo más caro al armar decenas de figuras por página.
+# Los atributos van con su estructura completa (xaxis={"title": {"text": ...}}), sin
+# los atajos con guion bajo de update_layout.
+
+# Layouts compartidos; figura() los combina con lo propio de cada gráfica
+LAYOUTS = {
+    "montos": {"yaxis": {"tickformat": ","}},
+    "barras_h": {"xaxis": {"tickformat": ","}, "bargap": 0.25},
+    "anillo": {"margin": {"t": 60, "l": 0, "r": 0, "b": 0}},
+}
+
+
+def _combinar(base, extra):
+    # Combina layouts anidados sin modificar ninguno de los dos
+    resultado = dict(base)
+    for clave, valor in extra.items():
+        if isinstance(valor, dict) and isinstance(resultado.get(clave), dict):
+            resultado[clave] = _combinar(resultado[clave], valor)
+        else:
+            resultado[clave] = valor
+    return resultado
+
+
+def _arreglo(valores):
+    return valores if isinstance(valores, (str, dict)) or valores is None else np.asarray(valores)
+
+
+def traza(tipo, **atributos):
+    """Dict de una traza de plotly; las columnas se pasan como arreglos (None se omite)."""
+    return {"type": tipo, **{k: _arreglo(v) for k, v in atributos.items() if v is not None}}
+
+
+def titulo(texto, **atributos):
+    return {"text": texto, **atributos}
+
+
+def figura(trazas, layout=None, base=None, template=None):
+    """
+    go.Figure armada desde dicts de trazas y layout sin validación por atributo.
+    base es el nombre de un layout de LAYOUTS y template el de una plantilla de plotly.
+    """
+    layout = _combinar(LAYOUTS[base], layout or {}) if base else dict(layout or {})
+    if template is not None:
+        layout["template"] = pio.templates[template]
+    return go.Figure({"data": list(trazas), "layout": layout}, _validate=False)
+
+
+def grafica_sunburst(nodos, texto_titulo, template="plotly_white"):
+    """Sunburst desde los nodos ya armados (ids, parents, values, labels, colors, text, hovertext)."""
+    return figura(
+        [traza(
+            "sunburst",
+            ids=nodos["ids"],
+            parents=nodos["parents"],
+            values=nodos["values"],
+            labels=nodos["labels"],
+            text=nodos["text"],
+            textinfo="label+text",
+            insidetextorientation="horizontal",
+            marker={"colors": nodos["colors"], "line": {"color": "white", "width": 1}},
+            branchvalues="total",
+            hovertext=nodos["hovertext"],
+            hovertemplate="%{hovertext}<extra></extra>",
+        )],
+        {
+            "title": titulo(texto_titulo, x=0.5, xanchor="center", yanchor="top",
+                            font={"size": 18, "color": "#E1E1EC", "family": "Arial"}),
+        },
+        base="anillo",
+        template=template,
+    )
+
+
+def grafica_barras(x, y, colores, texto, hovertemplate, customdata=None, texto_titulo=None,
+                   titulo_x=None, titulo_y=None):
+    """Barras de una sola traza (un color por barra) con el texto dentro y sin leyenda."""
+    return figura(
+        [traza(
+            "bar",
+            x=x,
+            y=y,
+            marker={"color": np.asarray(colores)},
+            text=texto,
+            textposition="inside",
+            texttemplate="%{text}",
+            customdata=customdata,
+            hovertemplate=hovertemplate,
+        )],
+        {
+            "title": titulo(texto_titulo),
+            "xaxis": {"title": titulo(titulo_x)},
+            "yaxis": {"title": titulo(titulo_y)},
+            "showlegend": False,
+        },
+    )
+
+
+def trazas_lineas(tabla, colores, hovertemplate, modo="lines+markers", color_omision="#CCCCCC"):
+    """
+    Una traza de líneas por columna de una tabla ancha (x = índice), armadas desde la
+    matriz de valores. El nombre de la serie va en %{fullData.name}, sin customdata por punto.
+    """
+    x = np.asarray(tabla.index.astype(str))
+    valores = tabla.to_numpy(dtype=float)
+    return [
+        traza(
+            "scatter",
+            x=x,
+            y=valores[:, k],
+            mode=modo,
+            name=str(columna),
+            line={"color": colores.get(columna, color_omision)},
+            hovertemplate=hovertemplate,
+        )
+        for k, columna in enumerate(tabla.columns)
+    ]
+
+
+# ================== CACHE DE FIGURAS =====================
+# Figuras ya construidas, compartidas entre reruns y sesiones. La clave lleva
+# (sección, gráfica, periodo, año, selecciones, versión de datos): un widget que no
+# cambia la clave (p. ej. el número de columnas) no vuelve a armar ninguna figura.
+# Se guarda la figura serializada (dict de plotly o PNG de matplotlib), nunca el objeto,
+# para que una sesión no pueda modificar lo que ve otra.
+_cache_figuras = CacheLRU("figuras", maxsize=256)
+
+
+def clave_figura(seccion, grafica, df, *parametros):
+    """Clave de cache de una figura; None si el DataFrame no tiene versión."""
+    version = version_datos(df)
+    if version is None:
+        return None
+    return (seccion, grafica, json.dumps(parametros, sort_keys=True, default=str), version)
+
+
+def figura_cacheada(clave, construir):
+    """
+    Figura de plotly cacheada por clave. construir() regresa la go.Figure; se guarda su
+    to_dict() y cada rerun la envuelve de nuevo sin validar. Con clave None se arma directo.
+    """
+    if clave is None:
+        return construir()
+    datos = _cache_figuras.obtener(clave, lambda: construir().to_dict())
+    return go.Figure(datos, _validate=False)
+
+
+def imagen_cacheada(clave, construir):
+    """
+    PNG de una figura de matplotlib cacheado por clave, con las opciones de st.pyplot
+    (se muestra con st.image). construir() regresa la figura, que se cierra al guardarla.
+    """
+    def png():
+        fig = construir()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+        plt.close(fig)
+        return buffer.getvalue()
+
+    if clave is None:
+        return png()
+    return _cache_figuras.obtener(clave, png)
+
+
+# ================== GRÁFICAS =====================
 
 def grafica_total_mensual(df_total_mes, orden_meses):
     df_total_mes = df_total_mes.reindex([m for m in orden_meses if m in df_total_mes.index])
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=df_total_mes.index,
-        y=df_total_mes.values,
-        mode="lines+markers",
-        name="Total",
-        line=dict(color="blue"),
-        hovertemplate="%{x}<br>Total: $%{y:,.2f}<extra></extra>"
-    ))
-
-    fig.update_layout(
-        xaxis_title="Mes",
-        yaxis_title="Monto",
-        yaxis_tickformat=","
+
+    return figura(
+        [traza(
+            "scatter",
+            x=df_total_mes.index,
+            y=df_total_mes.to_numpy(),
+            mode="lines+markers",
+            name="Total",
+            line={"color": "blue"},
+            hovertemplate="%{x}<br>Total: $%{y:,.2f}<extra></extra>",
+        )],
+        {"xaxis": {"title": titulo("Mes")}, "yaxis": {"title": titulo("Monto")}},
+        base="montos",
     )
-    return fig
 
 def grafica_diferencias_mensuales(df_mensual):
-    df_mensual["color"] = df_mensual["diferencia"].apply(lambda x: "#f81515" if x >= 0 else "#33FF00")
-    df_mensual["texto"] = df_mensual["diferencia"].apply(lambda x: f"${x:,.2f}")
-
-    fig_dif = go.Figure()
-    fig_dif.add_trace(go.Bar(
-        x=df_mensual["mes_nombre"],
-        y=df_mensual["diferencia"],
-        marker_color=df_mensual["color"],
-        text=df_mensual["texto"],
-        textposition="outside",
-        cliponaxis=False,
-        hovertemplate="%{x}<br>Diferencia: %{text}<extra></extra>"
-    ))
-
-    fig_dif.update_layout(
-        title="Diferencia mensual de compras vs mes anterior",
-        xaxis_title="Mes",
-        yaxis_title="Diferencia en monto (MXN)",
-        yaxis=dict(zeroline=True, zerolinecolor="black"),
-        height=450,
-        margin=dict(r=70)
+    diferencia = df_mensual["diferencia"].to_numpy(dtype=float)
+    df_mensual["color"] = np.where(diferencia >= 0, "#f81515", "#33FF00")
+    df_mensual["texto"] = df_mensual["diferencia"].map("${:,.2f}".format)
+
+    return figura(
+        [traza(
+            "bar",
+            x=df_mensual["mes_nombre"],
+            y=diferencia,
+            marker={"color": df_mensual["color"].to_numpy()},
+            text=df_mensual["texto"],
+            textposition="outside",
+            cliponaxis=False,
+            hovertemplate="%{x}<br>Diferencia: %{text}<extra></extra>",
+        )],
+        {
+            "title": titulo("Diferencia mensual de compras vs mes anterior"),
+            "xaxis": {"title": titulo("Mes")},
+            "yaxis": {"title": titulo("Diferencia en monto (MXN)"), "zeroline": True, "zerolinecolor": "black"},
+            "height": 450,
+            "margin": {"r": 70},
+        },
     )
-    return fig_dif
\ No newline at end of file
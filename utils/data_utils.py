@@ -1,20 +1,215 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import streamlit as st
+from utils.config import cargar_config
+from utils.helpers import meses_es
+from utils.cache_utils import cache_por_version, calcular_version, asignar_version, derivar_version
+from utils.mensual_utils import AgregadosMensuales
 
-@st.cache_data
+# Copy-on-Write: las vistas pueden derivar columnas sin copiar el dataset compartido
+# (en pandas 3 ya es el comportamiento por defecto)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Agregados mensuales del proceso: en cada recarga sólo se recalculan los meses que cambiaron
+_agregados_mensuales = AgregadosMensuales()
+
+
+def preparar_dataset(df, config):
+    """Agrega al DataFrame crudo de la API todas las columnas derivadas que usan las vistas."""
+    df = df.dropna(subset=["sucursal"])
+
+    # Columnas de fecha/mes
+    df["mes_dt"] = pd.to_datetime(df["mes"])
+    df["fecha"] = df["mes_dt"]
+    df["mes_nombre"] = df["mes_dt"].dt.month_name().map(meses_es) + " " + df["mes_dt"].dt.year.astype(str)
+    df["mes_period"] = df["mes_dt"].dt.to_period("M")
+    df = df.sort_values("mes_dt").reset_index(drop=True)
+
+    # Columnas de división y cuenta
+    mapa_codigos = {}
+    mapa_abreviaturas = {}
+    for division, datos in config["divisiones"].items():
+        for cod in datos["codigos"]:
+            mapa_codigos[cod] = division
+            mapa_abreviaturas[cod] = datos["abreviatura"]
+
+    df["division"] = df["codigo_normalizado"].map(mapa_codigos)
+    df["abreviatura"] = df["codigo_normalizado"].map(mapa_abreviaturas).fillna("")
+    df["cuenta_sucursal"] = df["codigo_normalizado"] + " (" + df["abreviatura"] + ") - " + df["sucursal"]
+    return df
+
+
+# ================== REPRESENTACIÓN COMPACTA =====================
+# Cada dimensión se guarda una sola vez: {nombre: (columna de código, columnas de etiqueta)}.
+# La primera columna de etiqueta es la que se codifica; las demás dependen de ella.
+DIMENSIONES = {
+    "sucursal": ("sucursal_id", ["sucursal"]),
+    "codigo": ("codigo_id", ["codigo_normalizado", "abreviatura"]),
+    "division": ("division_id", ["division"]),
+    "mes": ("mes_id", ["mes", "mes_dt", "fecha", "mes_nombre", "mes_period"]),
+    "cuenta": ("cuenta_id", ["cuenta_sucursal"]),
+}
+
+
+def _codificar(serie):
+    """Códigos enteros (orden alfabético de las etiquetas) en int16/int32; los nulos quedan en -1."""
+    codigos, etiquetas = pd.factorize(serie, sort=True)
+    return codigos.astype("int16" if len(etiquetas) < 2**15 else "int32")
+
+
+def _tabla_dimension(df, codigos, columnas):
+    """Una fila por código (0..n-1) y al final la fila de nulos, para que take(-1) la encuentre."""
+    valores, primeras = np.unique(codigos, return_index=True)
+    dim = df[columnas].iloc[primeras].reset_index(drop=True)
+    if len(valores) and valores[0] == -1:
+        return pd.concat([dim.iloc[1:], dim.iloc[:1]], ignore_index=True)
+    return dim.reindex(range(len(dim) + 1))
+
+
+def compactar_dataset(df):
+    """
+    Representación compacta del dataset preparado: tabla de hechos con códigos
+    int16/int32 y monto float64, más tablas de dimensión pequeñas con las etiquetas.
+    """
+    hechos = {}
+    dimensiones = {}
+    for nombre, (col_codigo, columnas) in DIMENSIONES.items():
+        codigos = _codificar(df[columnas[0]])
+        hechos[col_codigo] = codigos
+        dimensiones[nombre] = _tabla_dimension(df, codigos, columnas)
+
+    etiquetas = {col for _, columnas in DIMENSIONES.values() for col in columnas}
+    for col in df.columns:
+        if col not in etiquetas:
+            hechos[col] = df[col].to_numpy()
+    hechos["monto"] = df["monto"].to_numpy(dtype="float64")
+
+    return {
+        "hechos": pd.DataFrame(hechos),
+        "dimensiones": dimensiones,
+        "columnas": list(df.columns),
+    }
+
+
+def expandir_dataset(compacto):
+    """
+    Reconstruye el DataFrame que leen las vistas. Las columnas de texto apuntan a
+    las etiquetas de cada dimensión (una referencia por fila, no un string por fila).
+    """
+    hechos = compacto["hechos"]
+    columnas = {}
+    for nombre, (col_codigo, etiquetas) in DIMENSIONES.items():
+        dim = compacto["dimensiones"][nombre]
+        codigos = hechos[col_codigo].to_numpy()
+        for col in etiquetas:
+            columnas[col] = dim[col].take(codigos).reset_index(drop=True)
+    return pd.DataFrame({col: columnas[col] if col in columnas else hechos[col] for col in compacto["columnas"]})
+
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def cargar_dataset_compacto():
+    """
+    Carga y prepara los datos de la API una vez por proceso y los guarda en forma
+    compacta, junto con la vista decodificada que usan las secciones ("vista")
+    y los agregados mensuales actualizados por mes ("mensual").
+    Regresa None si la API no trajo datos.
+    """
+    # import local: api_utils lee st.secrets al importarse
+    from utils.api_utils import obtener_datos_api
+
+    df = obtener_datos_api()
+    if df.empty:
+        return None
+    version = calcular_version(df)
+    compacto = compactar_dataset(preparar_dataset(df, cargar_config()))
+    compacto["version"] = version
+    compacto["vista"] = asignar_version(expandir_dataset(compacto), version)
+    compacto["mensual"] = asignar_version(_agregados_mensuales.actualizar(compacto["vista"]), f"{version}|mensual")
+    return compacto
+
+
+def cargar_dataset():
+    """
+    Regresa el dataset de compras ya preparado, compartido por todas las sesiones.
+    Se guarda con cache_resource (sin copia por rerun): las vistas deben tratarlo
+    como solo lectura y derivar sus columnas con Copy-on-Write.
+    Lleva en df.attrs el token de versión que usan los caches de cálculo.
+    """
+    compacto = cargar_dataset_compacto()
+    if compacto is None:
+        return pd.DataFrame()
+    return compacto["vista"]
+
+
+def cargar_agregados_mensuales():
+    """
+    Suma de monto por mes, sucursal, código y división del dataset compartido
+    (mismas columnas de mes que el dataset, así que se filtra por periodo igual).
+    """
+    compacto = cargar_dataset_compacto()
+    if compacto is None:
+        return pd.DataFrame()
+    return compacto["mensual"]
+
+
+# ================== ÍNDICE DE MESES =====================
+@cache_por_version(maxsize=8)
+def indice_meses(df):
+    """
+    Índice del dataset ordenado por fecha: fechas distintas (ordenadas) y la fila
+    donde empieza cada una, más el total de filas al final. None si no está ordenado.
+    """
+    fechas = df["fecha"].to_numpy()
+    if len(fechas) and not (fechas[1:] >= fechas[:-1]).all():
+        return None
+    inicios = np.flatnonzero(np.r_[True, fechas[1:] != fechas[:-1]]) if len(fechas) else np.array([], dtype=int)
+    meses, inicios = fechas[inicios], np.append(inicios, len(fechas))
+    meses.flags.writeable = False
+    inicios.flags.writeable = False
+    return meses, inicios
+
+
+def rango_fechas(df, desde, hasta):
+    """
+    Filas con desde <= fecha < hasta. Con el índice de meses se resuelve con
+    búsqueda binaria y regresa un slice contiguo (sin copiar datos).
+    """
+    indice = indice_meses(df)
+    if indice is None:
+        return df[(df["fecha"] >= desde) & (df["fecha"] < hasta)]
+    meses, inicios = indice
+    i = meses.searchsorted(pd.Timestamp(desde).to_datetime64())
+    j = meses.searchsorted(pd.Timestamp(hasta).to_datetime64())
+    return df.iloc[inicios[i]:inicios[j]]
+
+
+def obtener_años_disponibles(df):
+    """Años con datos, ordenados (se leen del índice de meses, no de cada fila)."""
+    indice = indice_meses(df)
+    fechas = pd.Series(indice[0]) if indice is not None else df["fecha"]
+    return sorted(fechas.dt.year.unique())
+
+
+@cache_por_version(maxsize=32)
 def filtrar_por_periodo(df, periodo, año):
-    df["fecha"] = pd.to_datetime(df["mes"])
-    
+    """Filtra por año natural o fiscal; el resultado queda marcado con una versión derivada."""
     if periodo == "Año Natural":
-        return df[df["fecha"].dt.year == año], f"{año}"
-    
+        df_periodo = rango_fechas(df, pd.Timestamp(año, 1, 1), pd.Timestamp(año + 1, 1, 1))
+        titulo_periodo = f"{año}"
+
     elif periodo == "Año Fiscal":
-        inicio_fiscal = pd.Timestamp(año-1, 11, 1)
-        fin_fiscal = pd.Timestamp(año, 10, 31)
-        return df[(df["fecha"] >= inicio_fiscal) & (df["fecha"] <= fin_fiscal)], f"Fiscal {año}"
+        # Noviembre del año anterior a octubre del año seleccionado
+        df_periodo = rango_fechas(df, pd.Timestamp(año - 1, 11, 1), pd.Timestamp(año, 11, 1))
+        titulo_periodo = f"Fiscal {año}"
+
+    else:
+        raise ValueError(f"Periodo desconocido: {periodo!r}")
+
+    return derivar_version(df_periodo, df, periodo, año), titulo_periodo
 
-@st.cache_data
+@cache_por_version(maxsize=32)
 def preparar_comparativo_mensual(df_filtrado, orden_meses):
     """Prepara los datos para el comparativo mensual y la variación."""
     df_mensual = df_filtrado.groupby("mes_nombre", as_index=False)["monto"].sum()
@@ -34,4 +229,4 @@ def preparar_comparativo_mensual(df_filtrado, orden_meses):
         lambda x: f"{x:.1f}% ⬆" if x > 0 else f"{x:.1f}% ⬇" if x < 0 else "0.0% ➖"
     )
 
-    return df_mensual
\ No newline at end of file
+    return df_mensual
@@ -0,0 +1,372 @@
+import io
+import calendar
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.config import cargar_config
+from utils.cache_utils import calcular_version, asignar_version, cache_por_version
+
+# Tramos de vencimiento por días a la exigibilidad: definición única para toda la vista
+# (tabla por vencimiento, calendario, barras y pastel). Cada tramo es
+# (días máximos, etiqueta, color); el último no tiene límite.
+TRAMOS_VENCIMIENTO = [
+    (-1, "Vencido", "#ff6666"),
+    (30, "0-30 días", "#ffcc66"),
+    (60, "31-60 días", "#ffff99"),
+    (90, "61-90 días", "#ccff99"),
+    (None, "91+ días", "#99ff99"),
+]
+
+
+def etiquetas_tramos(tramos=TRAMOS_VENCIMIENTO):
+    return [etiqueta for _, etiqueta, _ in tramos]
+
+
+def colores_tramos(tramos=TRAMOS_VENCIMIENTO):
+    return {etiqueta: color for _, etiqueta, color in tramos}
+
+
+def clasificar_dias(dias, tramos=TRAMOS_VENCIMIENTO):
+    """Etiqueta del tramo de cada valor de días, en una sola pasada (None si no hay días)."""
+    dias = np.asarray(dias, dtype=float)
+    condiciones = [dias <= limite for limite, _, _ in tramos[:-1]]
+    condiciones.append(dias > tramos[-2][0])
+    return np.select(condiciones, etiquetas_tramos(tramos), default=None)
+
+
+def js_color_tramo(tramos=TRAMOS_VENCIMIENTO):
+    """
+    Función JS colorTramo(dias) con los mismos cortes y colores que clasificar_dias,
+    para los renderers del grid (así el grid no se desfasa de los tramos).
+    """
+    cortes = " ".join(f"if(dias <= {limite}) return '{color}';" for limite, _, color in tramos[:-1])
+    return f"function colorTramo(dias) {{ {cortes} return '{tramos[-1][2]}'; }}"
+
+
+# Categorías de las celdas del calendario: los tramos, días sin exigibilidad y el día actual
+CATEGORIAS_CALENDARIO = etiquetas_tramos() + ["Sin exigibilidad", "Día actual"]
+
+
+def tramo_por_fecha(df):
+    """Índice fecha (date) -> tramo de vencimiento; el tramo sólo depende de la fecha."""
+    fechas = df.dropna(subset=["fecha_exigibilidad"]).drop_duplicates("fecha_exigibilidad")
+    return dict(zip(fechas["fecha_exigibilidad"].dt.date, fechas["tramo"]))
+
+
+def calendario_mes(mes, tramos_fecha, hoy):
+    """
+    Celdas de un mes (semanas × 7, lunes primero) para dibujarlo como una sola traza:
+    regresa (categoría de cada día -NaN fuera del mes-, número del día, fecha, tramos presentes).
+    """
+    semanas = calendar.Calendar(firstweekday=0).monthdatescalendar(mes.year, mes.month)
+    sin_exigibilidad = CATEGORIAS_CALENDARIO.index("Sin exigibilidad")
+    indice = {c: i for i, c in enumerate(CATEGORIAS_CALENDARIO)}
+    hoy = hoy.date()
+
+    z = np.full((len(semanas), 7), np.nan)
+    dias = np.full((len(semanas), 7), "", dtype=object)
+    fechas = np.full((len(semanas), 7), "", dtype=object)
+    presentes = set()
+    for w, semana in enumerate(semanas):
+        for d, dia in enumerate(semana):
+            if dia.month != mes.month:
+                continue
+            tramo = tramos_fecha.get(dia)
+            if tramo is not None:
+                presentes.add(tramo)
+            z[w, d] = indice["Día actual"] if dia == hoy else indice.get(tramo, sin_exigibilidad)
+            dias[w, d] = str(dia.day)
+            fechas[w, d] = f"{dia:%d/%m/%Y}" + (f"<br>{tramo}" if tramo else "")
+    return z, dias, fechas, [t for t in etiquetas_tramos() if t in presentes]
+
+
+def _mapas_division(config):
+    # código -> abreviatura / división (la primera división que lo contenga, como antes)
+    abreviaturas, divisiones = {}, {}
+    for division, info in config["divisiones"].items():
+        for cod in info["codigos"]:
+            abreviaturas.setdefault(cod, info["abreviatura"])
+            divisiones.setdefault(cod, division)
+    return abreviaturas, divisiones
+
+
+def preparar_estado_cuenta(df, config):
+    """Columnas tipadas y etiquetas del estado de cuenta que usan todos los bloques de la vista."""
+    abreviaturas, divisiones = _mapas_division(config)
+    abrev_sucursal = {suc: info.get("abreviatura", suc) for suc, info in config["sucursales"].items()}
+
+    df = df.copy()
+    df["sucursal"] = df["sucursal"].astype(str).str.strip()
+    df["codigo"] = df["codigo_6digitos"].astype(str).str.strip()
+    df["fecha_exigibilidad"] = pd.to_datetime(df["fecha_exigibilidad"], errors="coerce")
+    df["fecha_exigibilidad_str"] = df["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
+    df["total"] = pd.to_numeric(df["total"], errors="coerce").fillna(0)
+
+    df["abreviatura"] = df["codigo"].map(abreviaturas).fillna("")
+    df["division"] = df["codigo"].map(divisiones)
+    df["cuenta_sucursal"] = df["codigo"] + " (" + df["abreviatura"] + ") - " + df["sucursal"]
+
+    # Etiquetas de las tablas: "300594 (AG)" y abreviaturas (si no hay, el valor original)
+    df["codigo_etiqueta"] = df["codigo"] + " (" + df["abreviatura"] + ")"
+    df["codigo_abrev"] = df["codigo"].map(abreviaturas).fillna(df["codigo"])
+    df["sucursal_abrev"] = df["sucursal"].map(abrev_sucursal).fillna(df["sucursal"])
+    return df
+
+
+def clasificar_vencimientos(df, hoy, tramos=TRAMOS_VENCIMIENTO):
+    """Días a la exigibilidad contra hoy y tramo de vencimiento de cada fila."""
+    df["dias_diferencia"] = (df["fecha_exigibilidad"] - hoy).dt.days
+    df["tramo"] = clasificar_dias(df["dias_diferencia"], tramos)
+    df["mes"] = df["fecha_exigibilidad"].dt.to_period("M").dt.to_timestamp()
+    df["fecha_str"] = df["fecha_exigibilidad"].dt.strftime("%d-%m-%Y")
+    return df
+
+
+COLUMNAS_CUENTA = ["cuenta_sucursal", "codigo", "sucursal", "abreviatura"]
+
+
+def obligaciones_cuenta_fecha(df):
+    """
+    Deuda en formato disperso (coordenadas): una fila por (fecha_exigibilidad, cuenta_sucursal)
+    sólo donde hay obligaciones, con las etiquetas de la cuenta; regresa (obligaciones, meta).
+    """
+    meta = df[COLUMNAS_CUENTA].drop_duplicates()
+    obligaciones = (
+        df.groupby(["fecha_exigibilidad", "cuenta_sucursal"], as_index=False)["total"].sum()
+        .merge(meta, on="cuenta_sucursal", how="left")
+    )
+    obligaciones["fecha_exigibilidad_str"] = obligaciones["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
+    return obligaciones, meta
+
+
+def tabla_cuentas(obligaciones, fechas, cuentas):
+    """Deuda densa en formato ancho: fechas × cuentas dadas (huecos en 0)."""
+    sub = obligaciones[obligaciones["cuenta_sucursal"].isin(cuentas)]
+    return (
+        sub.pivot(index="fecha_exigibilidad", columns="cuenta_sucursal", values="total")
+        .reindex(fechas)
+        .fillna(0)
+        .rename_axis("fecha_exigibilidad")
+    )
+
+
+def decimar_minmax(valores, puntos_max):
+    """
+    Índices a graficar de cada columna de `valores` (fechas × series) para no pasar de
+    `puntos_max` puntos por serie: las fechas se agrupan en cubetas y de cada cubeta se
+    conservan el mínimo y el máximo (los picos no se pierden), más la primera y la última.
+    Regresa None si no hace falta decimar.
+    """
+    n, series = valores.shape
+    if n <= puntos_max or series == 0:
+        return None
+    tam = -(-n // max((puntos_max - 2) // 2, 1))
+    cubetas = -(-n // tam)
+    relleno = np.full((cubetas * tam - n, series), np.nan)
+    bloques = np.vstack([valores, relleno]).reshape(cubetas, tam, series)
+    inicio = (np.arange(cubetas) * tam)[:, None]
+    minimos = np.nanargmin(bloques, axis=1) + inicio
+    maximos = np.nanargmax(bloques, axis=1) + inicio
+    extremos = np.array([0, n - 1])
+    return [np.unique(np.concatenate([minimos[:, j], maximos[:, j], extremos])) for j in range(series)]
+
+
+def densificar(obligaciones, fechas, cuentas):
+    """
+    Serie densa fecha × cuenta (huecos en 0) sólo de las cuentas dadas, en formato largo:
+    lo que necesita una gráfica de líneas para unir las fechas sin monto.
+    """
+    sub = obligaciones[obligaciones["cuenta_sucursal"].isin(cuentas)]
+    if sub.empty:
+        return sub.iloc[:0]
+    denso = tabla_cuentas(sub, fechas, cuentas).stack(dropna=False).reset_index(name="total")
+    denso = denso.merge(sub[COLUMNAS_CUENTA].drop_duplicates(), on="cuenta_sucursal", how="left")
+    denso["fecha_exigibilidad_str"] = denso["fecha_exigibilidad"].dt.strftime("%d/%m/%Y")
+    return denso
+
+
+def proximas_fechas(fechas, hoy, n):
+    """Las n próximas fechas de exigibilidad (desde hoy) como "dd/mm/aaaa"; si no hay, las n últimas."""
+    futuras = fechas[fechas >= hoy]
+    elegidas = futuras[:n] if len(futuras) else fechas[-n:]
+    return list(elegidas.strftime("%d/%m/%Y"))
+
+
+# ================== NODOS DE SUNBURST =====================
+def _moneda(serie):
+    return serie.map("${:,.2f}".format)
+
+
+def _hover_fecha_sucursal(d):
+    return (
+        "<b>Fecha:</b> " + d["fecha_exigibilidad_str"] + "<br><b>Sucursal:</b> " + d["sucursal"]
+        + "<br><b>Total Sucursal:</b> " + _moneda(d["total"])
+    )
+
+
+def _hover_fecha_cuenta(d):
+    return (
+        "<b>Fecha:</b> " + d["fecha_exigibilidad_str"] + "<br><b>Código:</b> " + d["codigo"]
+        + "<br><b>Sucursal:</b> " + d["sucursal"] + "<br><b>División:</b> " + d["abreviatura"]
+        + "<br><b>Monto Cuenta:</b> " + _moneda(d["total"])
+        + "<br><b>Total Sucursal:</b> " + _moneda(d["total_sucursal"])
+    )
+
+
+def _hover_vencido_sucursal(d):
+    return "<b>Sucursal:</b> " + d["sucursal"] + "<br><b>Total vencido sucursal:</b> " + _moneda(d["total"])
+
+
+def _hover_vencido_cuenta(d):
+    return (
+        "<b>Sucursal:</b> " + d["sucursal"] + "<br><b>Código:</b> " + d["codigo"]
+        + "<br><b>División:</b> " + d["abreviatura"] + "<br><b>Monto vencido:</b> " + _moneda(d["total"])
+        + "<br><b>Total sucursal:</b> " + _moneda(d["total_sucursal"])
+    )
+
+
+def _listas(nodos):
+    return {col: nodos[col].tolist() for col in ["ids", "parents", "values", "labels", "colors", "text", "hovertext"]}
+
+
+def _sucursales_y_cuentas(df, llaves=()):
+    # Subtotales por cuenta (con sus etiquetas y el total de su sucursal) y por sucursal
+    llaves = list(llaves)
+    cuentas = df.groupby(llaves + ["sucursal", "cuenta_sucursal", "codigo", "abreviatura"], as_index=False)["total"].sum()
+    sucursales = cuentas.groupby(llaves + ["sucursal"], as_index=False)["total"].sum()
+    cuentas = cuentas.merge(
+        sucursales.rename(columns={"total": "total_sucursal"}), on=llaves + ["sucursal"], how="left"
+    )
+    return sucursales, cuentas
+
+
+def nodos_sunburst(df, colores_sucursales, hover_sucursal, hover_cuenta, grupo=None):
+    """
+    Nodos de un sunburst sucursal -> cuenta (ids, parents, values, labels, colors, text,
+    hovertext), armados por columnas. Con grupo regresa {valor del grupo: nodos},
+    todos calculados en la misma pasada.
+    """
+    llaves = [grupo] if grupo else []
+    sucursales, cuentas = _sucursales_y_cuentas(df, llaves)
+    nodos = _nodos(sucursales, cuentas, colores_sucursales, hover_sucursal, hover_cuenta, llaves)
+    if grupo is None:
+        return _listas(nodos)
+    return {valor: _listas(g) for valor, g in nodos.groupby(grupo, sort=False)}
+
+
+def _nodos(sucursales, cuentas, colores_sucursales, hover_sucursal, hover_cuenta, llaves=()):
+    color = {suc: info.get("color", "#808080") for suc, info in colores_sucursales.items()}
+
+    # Sucursales (anillo interno, su valor es la suma de sus cuentas) y cuentas (anillo externo)
+    return pd.concat([
+        pd.DataFrame({
+            "ids": "S|" + sucursales["sucursal"],
+            "parents": "",
+            "values": sucursales["total"],
+            "labels": sucursales["sucursal"],
+            "colors": sucursales["sucursal"].map(color).fillna("#808080"),
+            "text": _moneda(sucursales["total"]),
+            "hovertext": hover_sucursal(sucursales),
+            **{col: sucursales[col] for col in llaves},
+        }),
+        pd.DataFrame({
+            "ids": "A|" + cuentas["sucursal"] + "|" + cuentas["cuenta_sucursal"],
+            "parents": "S|" + cuentas["sucursal"],
+            "values": cuentas["total"],
+            "labels": cuentas["cuenta_sucursal"],
+            "colors": cuentas["sucursal"].map(color).fillna("#808080"),
+            "text": _moneda(cuentas["total"]),
+            "hovertext": hover_cuenta(cuentas),
+            **{col: cuentas[col] for col in llaves},
+        }),
+    ], ignore_index=True)
+
+
+@cache_por_version(maxsize=8)
+def sunburst_por_fecha(obligaciones, colores_sucursales):
+    """Nodos del sunburst de cada fecha de exigibilidad {fecha_str: nodos}; uno por versión de datos."""
+    return nodos_sunburst(
+        obligaciones, colores_sucursales, _hover_fecha_sucursal, _hover_fecha_cuenta, grupo="fecha_exigibilidad_str"
+    )
+
+
+# ================== ÍNDICE DE DEUDA VENCIDA =====================
+def indice_vencido(obligaciones, hoy):
+    """
+    Deuda vencida (exigible antes de hoy) lista para navegar sucursal -> cuenta:
+    subtotales por sucursal (con su número de cuentas) y por cuenta (con sus etiquetas
+    y el total de su sucursal), más el total. Se arma una vez con el modelo; el sunburst,
+    las tarjetas y el Excel salen de aquí sin volver a agrupar.
+    """
+    sucursales, cuentas = _sucursales_y_cuentas(obligaciones[obligaciones["fecha_exigibilidad"] < hoy])
+    sucursales["cuentas"] = cuentas.groupby("sucursal").size().reindex(sucursales["sucursal"]).to_numpy()
+    return {"sucursales": sucursales, "cuentas": cuentas, "total": float(sucursales["total"].sum())}
+
+
+def sunburst_vencido(indice, colores_sucursales):
+    """Nodos del sunburst de la deuda vencida (todas las fechas juntas)."""
+    return _listas(_nodos(
+        indice["sucursales"], indice["cuentas"], colores_sucursales, _hover_vencido_sucursal, _hover_vencido_cuenta
+    ))
+
+
+def libro_deuda_vencida(indice):
+    """Libro .xlsx de la deuda vencida por sucursal y cuenta, con la sucursal y su monto combinados."""
+    cuentas = indice["cuentas"]
+    df_export = pd.DataFrame({
+        "Sucursal": cuentas["sucursal"],
+        "Monto sucursal": cuentas["total_sucursal"],
+        "Cuenta sucursal": cuentas["cuenta_sucursal"],
+        "Monto cuenta": cuentas["total"],
+    })
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        df_export.to_excel(writer, index=False, sheet_name="Deuda vencida")
+        worksheet = writer.sheets["Deuda vencida"]
+
+        # Combinar sucursal y monto sucursal (las cuentas vienen ordenadas por sucursal)
+        inicio = 1  # la fila 0 son los encabezados
+        sucursales = indice["sucursales"]
+        for suc, monto, filas in zip(sucursales["sucursal"], sucursales["total"], sucursales["cuentas"]):
+            if filas > 1:
+                worksheet.merge_range(inicio, 0, inicio + filas - 1, 0, suc)
+                worksheet.merge_range(inicio, 1, inicio + filas - 1, 1, monto)
+            inicio += filas
+    return output.getvalue()
+
+
+def preparar_modelo_estado_cuenta(df, fecha_corte, config, hoy):
+    """Modelo del estado de cuenta: datos tipados, tramos de vencimiento y deuda por cuenta y fecha."""
+    version = calcular_version(df)
+    df_base = clasificar_vencimientos(preparar_estado_cuenta(df, config), hoy)
+    obligaciones, meta = obligaciones_cuenta_fecha(df_base)
+    asignar_version(obligaciones, f"{version}|obligaciones")
+    fechas = pd.DatetimeIndex(obligaciones["fecha_exigibilidad"].unique()).sort_values()
+    return {
+        "df": df_base,
+        "meta": meta,
+        "obligaciones": obligaciones,
+        "fechas": fechas,
+        "fechas_ordenadas": list(fechas.strftime("%d/%m/%Y")),
+        "tramo_por_fecha": tramo_por_fecha(df_base),
+        "vencido": indice_vencido(obligaciones, hoy),
+        "fecha_corte": fecha_corte,
+        "hoy": hoy,
+        "version": version,
+    }
+
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def cargar_modelo_estado_cuenta(hoy):
+    """
+    Modelo del estado de cuenta, uno por versión de datos y día (compartido entre
+    sesiones, solo lectura). Regresa None si la API no trajo datos.
+    """
+    # import local: api_utils lee st.secrets al importarse
+    from utils.api_utils import obtener_estado_cuenta_api
+
+    df, fecha_corte = obtener_estado_cuenta_api()
+    if df.empty or fecha_corte is None:
+        return None
+    return preparar_modelo_estado_cuenta(df, fecha_corte, cargar_config(), hoy)
@@ -0,0 +1,41 @@
+import io
+import pandas as pd
+import streamlit as st
+from utils.cache_utils import CacheLRU, version_datos
+
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Libros de Excel ya generados, compartidos entre reruns y sesiones. La clave lleva
+# (tabla, versión de datos, filtros): si cambian los datos o los filtros la clave es otra
+_cache_excel = CacheLRU("excel", maxsize=32)
+
+
+def libro_excel(df, hoja, index=True):
+    """Bytes de un libro .xlsx con el DataFrame en una sola hoja."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name=hoja, index=index)
+    return output.getvalue()
+
+
+def clave_excel(tabla, df, *filtros):
+    """Clave de cache de una exportación; None si el DataFrame no tiene versión."""
+    version = version_datos(df)
+    if version is None:
+        return None
+    return (tabla, version, *filtros)
+
+
+def boton_excel(label, file_name, clave, construir, **kwargs):
+    """
+    Botón de descarga cuyo libro se genera hasta que se hace clic (st.download_button
+    con datos diferidos) y se guarda por clave. construir() regresa los bytes del libro;
+    con clave None se genera en cada clic sin cachear. Conviene pasar construir con
+    functools.partial para fijar los datos de este rerun.
+    """
+    def datos():
+        if clave is None:
+            return construir()
+        return _cache_excel.obtener(clave, construir)
+
+    return st.download_button(label=label, data=datos, file_name=file_name, mime=MIME_EXCEL, **kwargs)
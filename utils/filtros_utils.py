@@ -0,0 +1,56 @@
+import functools
+import numpy as np
+import pandas as pd
+from utils.cache_utils import cache_por_version, version_datos, derivar_version
+
+
+def _lista(valor):
+    return list(valor) if isinstance(valor, (list, tuple, set)) else [valor]
+
+
+@cache_por_version(maxsize=64)
+def bitmaps_columna(df, columna):
+    """
+    Índice de filtro de una columna: un bitmap (np.packbits, 1 bit por fila) por
+    cada valor distinto. Se calcula una vez por versión de datos y columna.
+    """
+    codigos, valores = pd.factorize(df[columna])
+    bitmaps = {}
+    for i, valor in enumerate(valores):
+        bits = np.packbits(codigos == i)
+        bits.flags.writeable = False
+        bitmaps[valor] = bits
+    return bitmaps
+
+
+def mascara(df, **condiciones):
+    """
+    Máscara booleana alineada a df para condiciones columna=valor o columna=[valores].
+    Entre valores de una columna es OR y entre columnas es AND, sobre los bitmaps.
+    """
+    if version_datos(df) is None:
+        # Sin versión no hay índice: máscara directa
+        resultado = np.ones(len(df), dtype=bool)
+        for columna, valor in condiciones.items():
+            resultado &= df[columna].isin(_lista(valor)).to_numpy()
+        return resultado
+
+    vacio = np.zeros((len(df) + 7) // 8, dtype=np.uint8)
+    bits = None
+    for columna, valor in condiciones.items():
+        bitmaps = bitmaps_columna(df, columna)
+        bits_columna = functools.reduce(np.bitwise_or, [bitmaps.get(v, vacio) for v in _lista(valor)], vacio)
+        bits = bits_columna if bits is None else bits & bits_columna
+    if bits is None:
+        return np.ones(len(df), dtype=bool)
+    return np.unpackbits(bits, count=len(df)).view(bool)
+
+
+@cache_por_version(maxsize=64)
+def filtrar(df, **condiciones):
+    """
+    Subconjunto de df que cumple las condiciones (ver mascara). Se cachea por versión
+    y condiciones, y queda marcado con una versión derivada para reutilizarlo.
+    """
+    parametros = sorted((columna, tuple(_lista(valor))) for columna, valor in condiciones.items())
+    return derivar_version(df[mascara(df, **condiciones)], df, *parametros)
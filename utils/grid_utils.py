@@ -0,0 +1,132 @@
+import json
+import operator
+import numpy as np
+import pandas as pd
+from st_aggrid import JsCode
+
+# El grid regresa sólo su estado (filtros y orden), no las filas: el servidor aplica ese
+# estado a la tabla que ya tiene para exportar. Se usa con DataReturnMode.CUSTOM.
+ESTADO_GRID_JS = JsCode("""
+function({streamlitRerunEventTriggerName, eventData}) {
+    let api = eventData.api;
+    return {
+        filterModel: api.getFilterModel(),
+        sortModel: api.getColumnState()
+            .filter(c => c.sort)
+            .map(c => ({colId: c.colId, sort: c.sort, sortIndex: c.sortIndex}))
+    };
+}
+""")
+
+EVENTOS_ESTADO_GRID = ["filterChanged", "sortChanged"]
+
+_COMPARACIONES = {
+    "equals": operator.eq,
+    "notEqual": operator.ne,
+    "lessThan": operator.lt,
+    "lessThanOrEqual": operator.le,
+    "greaterThan": operator.gt,
+    "greaterThanOrEqual": operator.ge,
+}
+
+
+def estado_grid(grid_response):
+    """(filterModel, sortModel) que mandó el grid; vacíos si aún no hay interacción."""
+    return grid_response.get("filterModel") or {}, grid_response.get("sortModel") or []
+
+
+def clave_estado_grid(filtros, orden):
+    """Representación estable (hashable) del estado del grid para usarla en claves de cache."""
+    return json.dumps([filtros, orden], sort_keys=True)
+
+
+def _vacio(serie):
+    return serie.isna() | (serie.astype(str).str.strip() == "")
+
+
+def _condicion_texto(serie, tipo, valor):
+    texto = serie.fillna("").astype(str).str.lower()
+    valor = str(valor or "").lower()
+    if tipo == "contains":
+        return texto.str.contains(valor, regex=False)
+    if tipo == "notContains":
+        return ~texto.str.contains(valor, regex=False)
+    if tipo == "startsWith":
+        return texto.str.startswith(valor)
+    if tipo == "endsWith":
+        return texto.str.endswith(valor)
+    if tipo in ("equals", "notEqual"):
+        return _COMPARACIONES[tipo](texto, valor)
+    return pd.Series(True, index=serie.index)
+
+
+def parametros_filtro(grid_options):
+    """filterParams de cada columna del gridOptions (con los de defaultColDef como base)."""
+    base = (grid_options.get("defaultColDef") or {}).get("filterParams") or {}
+    return {
+        col["field"]: {**base, **(col.get("filterParams") or {})}
+        for col in grid_options.get("columnDefs", []) if "field" in col
+    }
+
+
+def _condicion_numero(serie, tipo, valor, valor_hasta, incluir_extremos=True):
+    numeros = pd.to_numeric(serie, errors="coerce")
+    if tipo == "inRange":   # AG Grid incluye los extremos salvo con inRangeInclusive=False
+        if incluir_extremos:
+            return (numeros >= valor) & (numeros <= valor_hasta)
+        return (numeros > valor) & (numeros < valor_hasta)
+    if tipo in _COMPARACIONES and valor is not None:
+        return _COMPARACIONES[tipo](numeros, valor)
+    return pd.Series(True, index=serie.index)
+
+
+def _mascara_condicion(serie, condicion, params=None):
+    # Condiciones combinadas: {"operator", "conditions"} o el formato anterior condition1/condition2
+    partes = condicion.get("conditions") or [
+        condicion[c] for c in ("condition1", "condition2") if c in condicion
+    ]
+    if partes:
+        mascaras = [_mascara_condicion(serie, parte, params) for parte in partes]
+        combinar = np.logical_or if condicion.get("operator") == "OR" else np.logical_and
+        return pd.Series(combinar.reduce(mascaras), index=serie.index)
+
+    tipo = condicion.get("type")
+    if tipo == "blank":
+        return _vacio(serie)
+    if tipo == "notBlank":
+        return ~_vacio(serie)
+    if condicion.get("filterType") == "number":
+        return _condicion_numero(
+            serie, tipo, condicion.get("filter"), condicion.get("filterTo"),
+            (params or {}).get("inRangeInclusive", True)
+        )
+    if condicion.get("filterType") == "set":
+        return serie.astype(str).isin([str(v) for v in condicion.get("values", [])])
+    return _condicion_texto(serie, tipo, condicion.get("filter"))
+
+
+def aplicar_estado_grid(df, filtros, orden, params=None):
+    """
+    Aplica a un DataFrame el filterModel y el sortModel de AG Grid (filtros de texto,
+    número y conjunto; orden por varias columnas). Las columnas que no existen se ignoran.
+    params son los filterParams por columna (ver parametros_filtro) para que los filtros
+    se evalúen con la misma configuración que el grid.
+    """
+    params = params or {}
+    mascara = pd.Series(True, index=df.index)
+    for columna, condicion in filtros.items():
+        if columna in df.columns:
+            mascara &= _mascara_condicion(df[columna], condicion, params.get(columna))
+    resultado = df[mascara]
+
+    orden = sorted(
+        (o for o in orden if o.get("colId") in df.columns),
+        key=lambda o: o.get("sortIndex") or 0
+    )
+    if orden:
+        resultado = resultado.sort_values(
+            [o["colId"] for o in orden],
+            ascending=[o.get("sort") != "desc" for o in orden],
+            kind="stable"
+        )
+    return resultado.reset_index(drop=True)
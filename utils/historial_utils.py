@@ -0,0 +1,148 @@
+import os
+import glob
+import logging
+import threading
+import pandas as pd
+
+# Historial local de cortes del estado de cuenta (Parquet, columnar). Cada fecha_corte nueva
+# se guarda compacta (deuda por fecha de exigibilidad, sucursal y código) en cortes/, y el
+# resumen por corte y sucursal (total y vencido) se mantiene en resumen.parquet, que es lo
+# que leen las gráficas de tendencia. Cuando hay muchos cortes sueltos se juntan en detalle.parquet.
+DIRECTORIO_HISTORIAL = os.environ.get("HISTORIAL_ESTADO_CUENTA", os.path.join("historial", "estado_cuenta"))
+CORTES_SUELTOS_MAX = 30
+
+COLUMNAS_DETALLE = ["fecha_corte", "fecha_exigibilidad", "sucursal", "codigo", "division", "total"]
+COLUMNAS_RESUMEN = ["fecha_corte", "sucursal", "total", "vencido", "version"]
+
+_lock = threading.Lock()
+_intentados = set()   # (fecha_corte, versión) que este proceso ya intentó guardar
+
+logger = logging.getLogger(__name__)
+
+
+def _ruta(*partes):
+    return os.path.join(DIRECTORIO_HISTORIAL, *partes)
+
+
+def _escribir(df, ruta):
+    # Escritura atómica: otra sesión nunca lee un archivo a medias
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(temporal, index=False)
+    os.replace(temporal, ruta)
+
+
+def compactar_corte(df, fecha_corte):
+    """Snapshot compacto de un corte: deuda por fecha de exigibilidad, sucursal y código."""
+    detalle = (
+        df.groupby(["fecha_exigibilidad", "sucursal", "codigo", "division"], dropna=False, as_index=False)["total"]
+        .sum()
+    )
+    detalle.insert(0, "fecha_corte", fecha_corte)
+    return _categorias(detalle)[COLUMNAS_DETALLE]   # categorías: diccionario en Parquet
+
+
+def resumir_corte(detalle, fecha_corte, version):
+    """Total y vencido (exigible antes del corte) por sucursal."""
+    vencido = detalle["total"].where(detalle["fecha_exigibilidad"] < fecha_corte.normalize(), 0.0)
+    resumen = (
+        detalle.assign(vencido=vencido)
+        .groupby("sucursal", observed=True, as_index=False)[["total", "vencido"]].sum()
+    )
+    resumen["sucursal"] = resumen["sucursal"].astype(str)
+    resumen.insert(0, "fecha_corte", fecha_corte)
+    resumen["version"] = version
+    return resumen[COLUMNAS_RESUMEN]
+
+
+def _leer_resumen():
+    ruta = _ruta("resumen.parquet")
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=COLUMNAS_RESUMEN)
+    return pd.read_parquet(ruta)
+
+
+def cargar_resumen():
+    """
+    Resumen de todos los cortes guardados (ordenado por fecha_corte); vacío si no hay
+    historial o si no se puede leer (el error queda en el log).
+    """
+    try:
+        return _leer_resumen()
+    except Exception:
+        logger.warning("No se pudo leer el historial de cortes", exc_info=True)
+        return pd.DataFrame(columns=COLUMNAS_RESUMEN)
+
+
+def registrar_corte(df, fecha_corte, version):
+    """
+    Agrega el corte al historial si es nuevo (o si para la misma fecha_corte cambió la versión).
+    Regresa True si se escribió algo.
+    """
+    fecha_corte = pd.Timestamp(fecha_corte)
+    with _lock:
+        resumen = _leer_resumen()
+        previo = resumen[resumen["fecha_corte"] == fecha_corte]
+        if not previo.empty and (previo["version"] == version).all():
+            return False
+
+        os.makedirs(_ruta("cortes"), exist_ok=True)
+        detalle = compactar_corte(df, fecha_corte)
+        _escribir(detalle, _ruta("cortes", f"{fecha_corte:%Y%m%d%H%M%S}.parquet"))
+
+        nuevo = resumir_corte(detalle, fecha_corte, version)
+        anteriores = resumen[resumen["fecha_corte"] != fecha_corte]
+        if not anteriores.empty:
+            nuevo = pd.concat([anteriores, nuevo], ignore_index=True)
+        resumen = nuevo.sort_values(["fecha_corte", "sucursal"], ignore_index=True)
+        _escribir(resumen, _ruta("resumen.parquet"))
+
+        if len(glob.glob(_ruta("cortes", "*.parquet"))) > CORTES_SUELTOS_MAX:
+            _compactar_detalle()
+        return True
+
+
+def guardar_corte(df, fecha_corte, version):
+    """
+    Registra el corte una vez por proceso y versión. Si el historial no se puede escribir
+    (disco, motor de Parquet, esquema, compactación) deja un aviso en el log y regresa
+    False: la vista sigue sin historial.
+    """
+    clave = (pd.Timestamp(fecha_corte), version)
+    with _lock:
+        if clave in _intentados:
+            return False
+        _intentados.add(clave)
+    try:
+        return registrar_corte(df, fecha_corte, version)
+    except Exception:
+        logger.warning("No se pudo guardar el corte %s en el historial", clave[0], exc_info=True)
+        return False
+
+
+def _categorias(detalle):
+    for col in ["sucursal", "codigo", "division"]:
+        detalle[col] = detalle[col].astype("category")
+    return detalle
+
+
+def _leer_detalle():
+    # detalle.parquet más los cortes sueltos; si un corte se volvió a guardar, gana el suelto
+    sueltos = sorted(glob.glob(_ruta("cortes", "*.parquet")))
+    partes = [pd.read_parquet(ruta) for ruta in sueltos]
+    cortes_sueltos = pd.concat([p["fecha_corte"] for p in partes]).unique() if partes else []
+    if os.path.exists(_ruta("detalle.parquet")):
+        previo = pd.read_parquet(_ruta("detalle.parquet"))
+        partes.insert(0, previo[~previo["fecha_corte"].isin(cortes_sueltos)])
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_DETALLE), sueltos
+    detalle = _categorias(pd.concat(partes, ignore_index=True))
+    return detalle.sort_values(["fecha_corte", "fecha_exigibilidad"], ignore_index=True), sueltos
+
+
+def _compactar_detalle():
+    # Junta los cortes sueltos en detalle.parquet
+    detalle, sueltos = _leer_detalle()
+    _escribir(detalle, _ruta("detalle.parquet"))
+    for ruta in sueltos:
+        os.remove(ruta)
+
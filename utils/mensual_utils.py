@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+import pandas as pd
+from utils.backend_utils import sumar
+
+# Columnas de mes (todas dependen de la fecha) y llaves de los agregados mensuales
+COLUMNAS_MES = ["fecha", "mes_dt", "mes_nombre", "mes_period"]
+LLAVES_MENSUALES = ["sucursal", "codigo_normalizado", "division", "abreviatura", "cuenta_sucursal"]
+
+# Columnas que definen la huella de cada mes (si cambian, el mes se recalcula)
+COLUMNAS_HUELLA = ["sucursal", "codigo_normalizado", "division", "cuenta_sucursal", "monto"]
+
+
+def agregar_mensual(df):
+    """
+    Suma de monto por mes, sucursal, código y división (conserva las filas sin división).
+    Se agrupa por fecha con el backend de agregaciones (DuckDB en tablas grandes) y las
+    demás columnas de mes, que dependen de la fecha, se agregan después.
+    """
+    suma = sumar(df, ["fecha"] + LLAVES_MENSUALES, "monto", dropna=False).reset_index()
+    meses = df[COLUMNAS_MES].drop_duplicates("fecha")
+    return meses.merge(suma, on="fecha", how="right")[COLUMNAS_MES + LLAVES_MENSUALES + ["monto"]]
+
+
+def _particiones_mes(df):
+    # Meses distintos y fila donde empieza cada uno (el dataset compartido ya viene ordenado)
+    if not df["fecha"].is_monotonic_increasing:
+        df = df.sort_values("fecha", kind="stable")
+    meses, inicios = np.unique(df["fecha"].to_numpy(), return_index=True)
+    return df, meses, np.append(inicios, len(df))
+
+
+def _huellas_mes(df, inicios):
+    # Suma (módulo 2^64) de los hashes de fila de cada mes: no depende del orden de las filas
+    if len(df) == 0:
+        return np.array([], dtype=np.uint64)
+    filas = pd.util.hash_pandas_object(df[COLUMNAS_HUELLA], index=False).to_numpy()
+    return np.add.reduceat(filas, inicios[:-1])
+
+
+class AgregadosMensuales:
+    """
+    Agregados mensuales mantenidos por partición de mes. En cada recarga sólo se
+    recalculan los meses nuevos o cuya huella cambió; los demás se reutilizan.
+    """
+
+    def __init__(self):
+        self._particiones = {}
+        self._lock = threading.Lock()
+        self.recalculados = []
+
+    def actualizar(self, df):
+        """Actualiza con el dataset preparado y regresa la tabla mensual completa."""
+        df, meses, inicios = _particiones_mes(df)
+        huellas = _huellas_mes(df, inicios)
+
+        with self._lock:
+            # Los meses nuevos o con huella distinta se agregan juntos en una sola consulta
+            # (en la primera carga es el dataset completo)
+            cambiados = [
+                i for i, mes in enumerate(meses)
+                if mes not in self._particiones or self._particiones[mes][0] != huellas[i]
+            ]
+            nuevos = {}
+            if cambiados:
+                filas = df if len(cambiados) == len(meses) else df.iloc[
+                    np.concatenate([np.arange(inicios[i], inicios[i + 1]) for i in cambiados])
+                ]
+                nuevos = {
+                    mes: agregado.reset_index(drop=True)
+                    for mes, agregado in agregar_mensual(filas).groupby("fecha", sort=False)
+                }
+
+            particiones = {}
+            for i, mes in enumerate(meses):
+                if pd.Timestamp(mes) in nuevos:
+                    particiones[mes] = (huellas[i], nuevos[pd.Timestamp(mes)])
+                else:
+                    particiones[mes] = self._particiones[mes]
+            self._particiones = particiones
+            self.recalculados = [pd.Timestamp(meses[i]) for i in cambiados]
+            return self.tabla()
+
+    def tabla(self):
+        """Tabla mensual (ordenada por fecha) armada con las particiones vigentes."""
+        partes = [agregado for _, agregado in self._particiones.values()]
+        if not partes:
+            return pd.DataFrame(columns=COLUMNAS_MES + LLAVES_MENSUALES + ["monto"])
+        return pd.concat(partes, ignore_index=True)
+
+
+def verificar_consistencia(agregados, df):
+    """
+    Compara la tabla incremental contra una reconstrucción completa desde df, mes por mes.
+    Regresa los meses (fecha de inicio) que no coinciden; lista vacía si todo coincide.
+    """
+    tabla = agregados.tabla()
+    completa = agregar_mensual(df.sort_values("fecha", kind="stable"))
+    distintos = []
+    for mes in pd.Index(tabla["fecha"]).union(pd.Index(completa["fecha"])):
+        try:
+            pd.testing.assert_frame_equal(
+                tabla[tabla["fecha"] == mes].reset_index(drop=True),
+                completa[completa["fecha"] == mes].reset_index(drop=True),
+                check_exact=False
+            )
+        except AssertionError:
+            distintos.append(pd.Timestamp(mes))
+    return distintos
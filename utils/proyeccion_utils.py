@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+# Etiqueta para obligaciones sin grupo (p. ej. códigos sin división en la configuración)
+SIN_GRUPO = "Sin asignar"
+
+FRECUENCIAS = {"D": 1, "W": 7}   # tamaño de la cubeta en días
+
+
+def fechas_cubetas(hoy, horizonte, frecuencia="D"):
+    """Fecha de inicio de cada cubeta del horizonte (la primera es hoy)."""
+    paso = FRECUENCIAS[frecuencia]
+    n = -(-horizonte // paso)
+    return pd.DatetimeIndex(hoy + pd.to_timedelta(np.arange(n) * paso, unit="D"))
+
+
+def proyectar_salidas(df, hoy, horizonte, frecuencia="D", por=None):
+    """
+    Montos que vencen en los próximos `horizonte` días (día 0 = hoy) por día ("D") o por
+    semana desde hoy ("W"), con np.bincount sobre los días a la exigibilidad.
+    Sin `por` regresa una Serie indexada por fecha; con `por` (sucursal, division...)
+    un DataFrame fecha × grupo, todos los grupos en la misma pasada.
+    """
+    fechas = fechas_cubetas(hoy, horizonte, frecuencia)
+    n = len(fechas)
+
+    dias = df["dias_diferencia"].to_numpy(dtype=float)
+    dentro = (dias >= 0) & (dias < horizonte)   # lo vencido y lo que cae fuera del horizonte no sale
+    cubeta = dias[dentro].astype(np.int64) // FRECUENCIAS[frecuencia]
+    montos = df["total"].to_numpy(dtype=float)[dentro]
+
+    if por is None:
+        return pd.Series(np.bincount(cubeta, weights=montos, minlength=n), index=fechas, name="salida")
+
+    codigos, grupos = pd.factorize(df[por].fillna(SIN_GRUPO).to_numpy()[dentro], sort=True)
+    matriz = np.bincount(codigos * n + cubeta, weights=montos, minlength=len(grupos) * n)
+    return pd.DataFrame(matriz.reshape(len(grupos), n).T, index=fechas, columns=grupos)
+
+
+def holgura_credito(salidas, deuda_actual, credito_max):
+    """
+    Salida acumulada, exposición (deuda que sigue abierta) y crédito disponible
+    proyectados al cierre de cada cubeta, suponiendo que cada monto se paga al vencer.
+    """
+    acumulado = salidas.cumsum()
+    exposicion = deuda_actual - acumulado
+    return pd.DataFrame({
+        "salida": salidas,
+        "acumulado": acumulado,
+        "exposicion": exposicion,
+        "disponible": credito_max - exposicion,
+    })
+
+
+class SimuladorCredito:
+    """
+    Simulador "¿qué pasa si...?" sobre la exposición de crédito diaria.
+    Guarda la curva base (deuda abierta al cierre de cada día si todo se paga al vencer)
+    y los ajustes del usuario como deltas sobre las salidas de cada día: agregar o quitar
+    un ajuste sólo toca sus propios días, la base no se vuelve a calcular.
+    """
+
+    def __init__(self, df, hoy, horizonte, clave=None):
+        self.hoy = hoy
+        self.horizonte = horizonte
+        self.clave = clave
+        self.fechas = fechas_cubetas(hoy, horizonte)
+        self.deuda_actual = float(df["total"].sum())
+        self.base = self.deuda_actual - proyectar_salidas(df, hoy, horizonte).cumsum().to_numpy()
+
+        # Obligaciones de cada cuenta (días a la exigibilidad, monto) para los pagos anticipados
+        dias = df["dias_diferencia"].to_numpy(dtype=float)
+        montos = df["total"].to_numpy(dtype=float)
+        self._cuentas = {
+            cuenta: (dias[idx], montos[idx]) for cuenta, idx in df.groupby("cuenta_sucursal").indices.items()
+        }
+
+        self._delta = np.zeros(len(self.fechas))   # cambio en la salida de cada día
+        self.ajustes = {}                          # nombre -> (especificación, días, montos)
+        self._siguiente = 1
+
+    # ---------- ajustes ----------
+    def aplicar(self, especificacion):
+        """
+        Agrega un ajuste ({"tipo": "pago"|"compra", ...}) y regresa su nombre (None si no cambia nada).
+        Un pago de una cuenta que ya tiene pago reemplaza al anterior; una compra con "cuenta"
+        vuelve a calcular el pago de esa cuenta, si lo hay.
+        """
+        if especificacion["tipo"] == "pago":
+            previo = self._pago_de(especificacion["cuenta"])
+            if previo is not None:
+                self.quitar(previo)
+        nombre = self._agregar(especificacion, f"Ajuste {self._siguiente}")
+        if nombre is not None:
+            self._siguiente += 1
+            if especificacion["tipo"] == "compra":
+                self._rehacer_pago(especificacion.get("cuenta"))
+        return nombre
+
+    def quitar(self, nombre):
+        especificacion, dias, montos = self.ajustes.pop(nombre)
+        np.add.at(self._delta, dias, -montos)
+        if especificacion["tipo"] == "compra":
+            self._rehacer_pago(especificacion.get("cuenta"))
+
+    def especificaciones(self):
+        return [especificacion for especificacion, _, _ in self.ajustes.values()]
+
+    def _agregar(self, especificacion, nombre):
+        if especificacion["tipo"] == "pago":
+            dias, montos = self._pago_anticipado(especificacion["cuenta"], especificacion["dia"])
+        else:
+            dias, montos = self._compra(especificacion["monto"], especificacion["dia"], especificacion.get("plazo"))
+        dentro = (dias >= 0) & (dias < len(self._delta))
+        dias, montos = dias[dentro], montos[dentro]
+        if len(dias) == 0:
+            return None
+        np.add.at(self._delta, dias, montos)
+        self.ajustes[nombre] = (especificacion, dias, montos)
+        return nombre
+
+    def _pago_de(self, cuenta):
+        # Nombre del pago anticipado vigente de la cuenta (a lo más hay uno)
+        return next(
+            (n for n, (e, _, _) in self.ajustes.items() if e["tipo"] == "pago" and e["cuenta"] == cuenta),
+            None
+        )
+
+    def _rehacer_pago(self, cuenta):
+        # Las compras de la cuenta cambiaron: el pago vigente se calcula de nuevo con el mismo nombre
+        nombre = self._pago_de(cuenta) if cuenta is not None else None
+        if nombre is None:
+            return
+        especificacion, dias, montos = self.ajustes.pop(nombre)
+        np.add.at(self._delta, dias, -montos)
+        self._agregar(especificacion, nombre)
+
+    def _obligaciones(self, cuenta, dia):
+        # Obligaciones de la cuenta (días a la exigibilidad, monto): las del estado de cuenta más
+        # las compras simuladas de la cuenta registradas a más tardar el día del pago
+        dias, montos = self._cuentas.get(cuenta, (np.array([]), np.array([])))
+        compras = [
+            (e["dia"] + e["plazo"] if e.get("plazo") is not None else len(self._delta), e["monto"])
+            for e, _, _ in self.ajustes.values()
+            if e["tipo"] == "compra" and e.get("cuenta") == cuenta and e["dia"] <= dia
+        ]
+        if compras:
+            dias_compras, montos_compras = np.array(compras, dtype=float).T
+            dias, montos = np.concatenate([dias, dias_compras]), np.concatenate([montos, montos_compras])
+        return dias, montos
+
+    def _pago_anticipado(self, cuenta, dia):
+        # Lo que la cuenta debe después del día de pago (y lo vencido) sale ese día en lugar de a su vencimiento
+        dias, montos = self._obligaciones(cuenta, dia)
+        pendientes = (dias > dia) | (dias < 0)
+        if not pendientes.any():
+            return np.array([], dtype=np.int64), np.array([])
+        a_tiempo = dias[pendientes] > dia   # los vencidos no tenían salida programada
+        return (
+            np.concatenate([[dia], dias[pendientes][a_tiempo].astype(np.int64)]),
+            np.concatenate([[montos[pendientes].sum()], -montos[pendientes][a_tiempo]]),
+        )
+
+    def _compra(self, monto, dia, plazo=None):
+        # La compra aumenta la deuda el día que se registra (salida negativa) y sale al vencer
+        if plazo is None:
+            return np.array([dia]), np.array([-monto])
+        return np.array([dia, dia + plazo]), np.array([-monto, monto])
+
+    # ---------- resultado ----------
+    def exposicion(self):
+        """Exposición simulada al cierre de cada día: base menos la salida acumulada de los ajustes."""
+        return self.base - np.cumsum(self._delta)
+
+    def resultado(self, credito_max):
+        exposicion = self.exposicion()
+        return pd.DataFrame({
+            "exposicion_base": self.base,
+            "exposicion": exposicion,
+            "disponible_base": credito_max - self.base,
+            "disponible": credito_max - exposicion,
+        }, index=self.fechas)
@@ -1,15 +1,83 @@
+import numpy as np
+import pandas as pd
+from utils.cache_utils import CacheLRU, version_datos
+
+# HTML de las tablas con estilo, compartido entre reruns y sesiones por (tabla, versión de datos)
+_cache_html = CacheLRU("tablas_html", maxsize=64)
+
+
+# ================== RENDER POR COLUMNAS =====================
+def html_cacheado(tabla, df, construir):
+    """HTML de la tabla cacheado por (tabla, versión de datos de df); sin versión se arma directo."""
+    version = version_datos(df)
+    if version is None:
+        return construir()
+    return _cache_html.obtener((tabla, version), construir)
+
+
+def formatear(valores, formato):
+    """Texto de una columna completa con el mismo formato ("{:,.2f}", "${:,.2f}"...)."""
+    return pd.Series(np.asarray(valores, dtype=object)).map(formato.format)
+
+
+def _columna(valor, n):
+    return pd.Series(np.broadcast_to(np.asarray(valor, dtype=object), n))
+
+
+def celdas(texto, clase=None, estilo=None, etiqueta="td"):
+    """
+    Celdas HTML de una columna completa. texto, clase y estilo pueden ser un valor
+    (igual para toda la columna) o un arreglo con uno por renglón.
+    """
+    texto = pd.Series(np.asarray(texto, dtype=object)).astype(str)
+    n = len(texto)
+    apertura = _columna(f"<{etiqueta}", n)
+    if clase is not None:
+        apertura = apertura + " class='" + _columna(clase, n) + "'"
+    if estilo is not None:
+        apertura = apertura + " style='" + _columna(estilo, n) + "'"
+    return apertura + ">" + texto + f"</{etiqueta}>"
+
+
+def renglones(*columnas):
+    """Une columnas de celdas (mismo número de renglones) en <tr>...</tr>."""
+    if not columnas:
+        return ""
+    filas = columnas[0]
+    for columna in columnas[1:]:
+        filas = filas + columna
+    return "".join("<tr>" + filas + "</tr>")
+
+
+def encabezado(columnas):
+    return "<thead><tr>" + "".join(f"<th>{col}</th>" for col in columnas) + "</tr></thead>"
+
+
+def degradado_azul(matriz):
+    """
+    Fondo en degradado azul de cada celda, normalizado por renglón (mínimo claro,
+    máximo oscuro). Regresa un arreglo de estilos con la forma de la matriz.
+    """
+    matriz = np.asarray(matriz, dtype=float)
+    minimo = matriz.min(axis=1, keepdims=True)
+    maximo = matriz.max(axis=1, keepdims=True)
+    rango = np.where(maximo != minimo, maximo - minimo, 1)
+    azul = (255 - ((matriz - minimo) / rango * 120)).astype(int)
+    rojo = azul.astype(str).astype(object)
+    verde = (azul + 20).astype(str).astype(object)
+    return "background-color:rgb(" + rojo + "," + verde + ",255)"
+
+
+# ================== TABLAS =====================
 def tabla_totales_html(tabla_horizontal_df):
-    tabla_html = tabla_horizontal_df.applymap(lambda x: f"${x:,.2f}")
+    columnas = pd.Series(tabla_horizontal_df.columns, dtype=object).astype(str)
+    montos = formatear(tabla_horizontal_df.iloc[0], "${:,.2f}")
 
-    header_html = ''.join([
-        f'<th style="background-color:#390570; color:white; padding:8px; text-align:left;">{col}</th>'
-        for col in tabla_html.columns
-    ])
+    header_html = ''.join(
+        '<th style="background-color:#390570; color:white; padding:8px; text-align:left;">' + columnas + '</th>'
+    )
 
-    row_html = ''.join([
-        f'<td style="padding:8px; text-align:left;">{val}</td>'
-        for val in tabla_html.iloc[0]
-    ])
+    row_html = ''.join('<td style="padding:8px; text-align:left;">' + montos + '</td>')
 
     return f"""
     <div style="overflow-x:auto; width: 100%;">
@@ -35,38 +103,94 @@ def tabla_totales_html(tabla_horizontal_df):
 
 def construir_tabla_comparativa(df_comp):
     estilos_css = """
-    <style>
-        .tabla-wrapper { overflow-x: auto; width: 100%; }
-        .tabla-comparativa { min-width: 100%; width: max-content; border-collapse: collapse; }
-        .tabla-comparativa thead th {
-            background-color: #0B083D; color: white; padding: 8px;
-            position: sticky; top: 0; z-index: 3;
-        }
-        .tabla-comparativa td, .tabla-comparativa th {
-            padding: 8px; font-size: 14px; white-space: nowrap; border: 1px solid white;
-        }
-        .tabla-comparativa tbody td:first-child {
-            position: sticky; left: 0; background-color: #0B083D; color: white; font-weight: bold;
-        }
-        .subida { background-color: #7D1F08; color: white; }
-        .bajada { background-color: #184E08; color: white; }
-        .neutra { color: white; }
-    </style>
-    """
+        <style>
+            .tabla-wrapper {
+                overflow-x: auto;
+                width: 100%;
+            }
 
-    html = f"{estilos_css}<div class='tabla-wrapper'><table class='tabla-comparativa'>"
-    html += "<thead><tr><th>Mes</th><th>Total Comprado</th><th>Diferencia ($)</th><th>Variación (%)</th></tr></thead><tbody>"
-
-    for _, row in df.iterrows():
-        clase_color = (
-            "subida" if "⬆" in row["Diferencia ($)"] else
-            "bajada" if "⬇" in row["Diferencia ($)"] else
-            "neutra"
-        )
-        html += f"<tr><td>{row['Mes']}</td>"
-        html += f"<td class='{clase_color}'>{row['Total Comprado']}</td>"
-        html += f"<td class='{clase_color}'>{row['Diferencia ($)']}</td>"
-        html += f"<td class='{clase_color}'>{row['Variación (%)']}</td></tr>"
+            .tabla-comparativa {
+                min-width: 100%;
+                width: max-content;
+                border-collapse: collapse;
+                table-layout: auto;
+            }
+
+            .tabla-comparativa thead th {
+                background-color: #0B083D;
+                color: white;
+                padding: 8px;
+                white-space: nowrap;
+                position: sticky;
+                top: 0;
+                z-index: 3;
+                border: 1px solid white;
+            }
+
+            .tabla-comparativa thead th:first-child {
+                text-align: right;
+                left: 0;
+                position: sticky;
+                z-index: 5;
+            }
+
+            .tabla-comparativa thead th:not(:first-child) {
+                text-align: left;
+            }
 
+            .tabla-comparativa td, .tabla-comparativa th {
+                padding: 8px;
+                font-size: 14px;
+                white-space: nowrap;
+                border: 1px solid white;
+            }
+
+            .tabla-comparativa tbody td:first-child,
+            .tabla-comparativa tfoot td:first-child {
+                position: sticky;
+                left: 0;
+                background-color: #0B083D;
+                color: white;
+                font-weight: bold;
+                text-align: right;
+                z-index: 4;
+            }
+
+            .tabla-comparativa tbody td:not(:first-child) {
+                text-align: left;
+            }
+
+            .subida {
+                background-color: #7D1F08;
+                color: white;
+            }
+
+            .bajada {
+                background-color: #184E08;
+                color: white;
+            }
+
+            .neutra {
+                color: white;
+            }
+        </style>
+        """
+
+    # Clase de color de todo el renglón según la flecha de la diferencia
+    diferencia = df_comp["Diferencia ($)"].astype(str)
+    clase_color = np.select(
+        [diferencia.str.contains("⬆", regex=False), diferencia.str.contains("⬇", regex=False)],
+        ["subida", "bajada"],
+        "neutra"
+    ).astype(object)
+
+    html = f"{estilos_css}<div class='tabla-wrapper'><table class='tabla-comparativa'>"
+    html += encabezado(["Mes", "Total Comprado", "Diferencia ($)", "Variación (%)"]) + "<tbody>"
+    html += renglones(
+        celdas(df_comp["Mes"]),
+        celdas(df_comp["Total Comprado"], clase_color),
+        celdas(df_comp["Diferencia ($)"], clase_color),
+        celdas(df_comp["Variación (%)"], clase_color),
+    )
     html += "</tbody></table></div>"
     return html